@@ -148,9 +148,14 @@ def main(
 
     model_factory = ChatModelFactory(config)
     chat_model: ChatModel = model_factory.create_model(provider)
+    # NOTE: A single prompt is answered without rendering the stream. The
+    # model is pooled and shared, so this is passed with each completion.
+    headless = bool(input)
 
     function_factory = FunctionFactory(config)
-    function_manager = FunctionManager(function_factory, config, chat_model)
+    function_manager = FunctionManager(
+        function_factory, config, chat_model, headless=headless
+    )
 
     vector_store = None
 
@@ -191,7 +196,7 @@ def main(
 
             # Get assistant's response
             assistant_message = chat_model.get_chat_completion(
-                messages=session_manager.output()
+                messages=session_manager.output(), headless=headless
             )
 
             if "function_call" in assistant_message:
@@ -199,6 +204,9 @@ def main(
             else:
                 session_manager.enqueue(assistant_message)
 
+            # NOTE: The response was not rendered while it was streamed.
+            print(session_manager.context_window[-1].get("content") or "")
+
             # NOTE: We only write messages after the assistants response.
             # The context, transcript, and embedding spaces are encapsulated.
             # The context and transcript are written to JSON.
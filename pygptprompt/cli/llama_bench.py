@@ -0,0 +1,158 @@
+"""
+pygptprompt/cli/llama_bench.py
+
+Micro-benchmark of the PyTorch Llama Transformer on the CPU.
+
+Builds a randomly initialized Transformer and reports the latency per token
+of prefilling a prompt and of decoding one token after it, at each of the
+given context lengths. No checkpoint is needed, only the model dimensions.
+The linear layers may be quantized to 8 or 4 bits to compare their memory
+and speed with the floating point model.
+"""
+import time
+from typing import Tuple
+
+import click
+import torch
+
+from pygptprompt.model.llama.model import ModelArgs, Transformer
+from pygptprompt.model.llama.quantize import quantize_model
+
+
+def create_transformer(args: ModelArgs) -> Transformer:
+    """
+    Create a randomly initialized Transformer in a single process.
+
+    Args:
+        args (ModelArgs): The dimensions of the model, with model_parallel disabled.
+
+    Returns:
+        Transformer: The model.
+    """
+    torch.manual_seed(0)
+    model = Transformer(args)
+    for parameter in model.parameters():
+        if parameter.ndim > 1:
+            torch.nn.init.normal_(parameter, std=0.02)
+    return model
+
+
+def measure(
+    model: Transformer, context: int, batch_size: int, steps: int
+) -> Tuple[float, float]:
+    """
+    Measure the latency per token of prefilling and decoding at a context length.
+
+    Args:
+        model (Transformer): The model.
+        context (int): The number of prompt tokens.
+        batch_size (int): The number of sequences decoded at once.
+        steps (int): The number of decode steps to average.
+
+    Returns:
+        Tuple[float, float]: The seconds per prompt token and per decode step.
+    """
+    tokens = torch.randint(0, model.vocab_size, (batch_size, context))
+    start = time.perf_counter()
+    model.forward(tokens, 0)
+    prefill = (time.perf_counter() - start) / context
+
+    token = tokens[:, -1:]
+    start = time.perf_counter()
+    for step in range(steps):
+        model.forward(token, context + step)
+    decode = (time.perf_counter() - start) / steps
+    return prefill, decode
+
+
+@click.command()
+@click.option("--dim", type=int, default=1024, help="Model dimension.")
+@click.option("--n-layers", type=int, default=8, help="Number of layers.")
+@click.option("--n-heads", type=int, default=16, help="Number of query heads.")
+@click.option("--n-kv-heads", type=int, default=4, help="Number of key/value heads.")
+@click.option("--vocab-size", type=int, default=32000, help="Vocabulary size.")
+@click.option(
+    "--context",
+    "-c",
+    type=int,
+    multiple=True,
+    default=(128, 512, 1024, 2048),
+    help="Context lengths to measure, may be repeated.",
+)
+@click.option("--batch-size", type=int, default=1, help="Sequences per step.")
+@click.option("--steps", type=int, default=16, help="Decode steps to average.")
+@click.option(
+    "--kv-block-size",
+    type=int,
+    default=0,
+    help="Page the KV cache in blocks of this many tokens, 0 pre-allocates it.",
+)
+@click.option(
+    "--quantize-bits",
+    type=click.Choice(["8", "4"]),
+    default=None,
+    help="Quantize the linear layers to this many bits.",
+)
+@click.option(
+    "--group-size",
+    type=int,
+    default=64,
+    help="Input channels sharing a scale for 4 bits.",
+)
+@click.option(
+    "--threads", type=int, default=0, help="Torch threads, 0 keeps the default."
+)
+def main(
+    dim,
+    n_layers,
+    n_heads,
+    n_kv_heads,
+    vocab_size,
+    context,
+    batch_size,
+    steps,
+    kv_block_size,
+    quantize_bits,
+    group_size,
+    threads,
+):
+    if threads:
+        torch.set_num_threads(threads)
+
+    args = ModelArgs(
+        dim=dim,
+        n_layers=n_layers,
+        n_heads=n_heads,
+        n_kv_heads=n_kv_heads,
+        vocab_size=vocab_size,
+        max_batch_size=batch_size,
+        max_seq_len=max(context) + steps,
+        kv_block_size=kv_block_size,
+        model_parallel=False,
+    )
+    model = create_transformer(args)
+    if quantize_bits is not None:
+        quantize_model(model, int(quantize_bits), group_size)
+    weights = sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in list(model.parameters()) + list(model.buffers())
+    )
+    print(f"weights: {weights / 2**20:.1f} MiB")
+
+    # NOTE: The first forward pass warms up the kernels and allocations.
+    measure(model, min(context), batch_size, 1)
+
+    print(
+        f"{'context':>8} {'prefill ms/token':>18} {'decode ms/token':>17} "
+        f"{'decode tokens/s':>17}"
+    )
+    for length in sorted(context):
+        prefill, decode = measure(model, length, batch_size, steps)
+        print(
+            f"{length:>8} {prefill * 1e3 / batch_size:>18.3f} "
+            f"{decode * 1e3 / batch_size:>17.3f} {batch_size / decode:>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,10 +13,13 @@ class FunctionManager:
         function_factory: FunctionFactory,
         config: ConfigurationManager,
         chat_model: ChatModel,
+        headless: bool = False,
     ):
         self.function_factory = function_factory
         self.logger = config.get_logger("general", self.__class__.__name__)
         self.chat_model = chat_model
+        # NOTE: The chat model may be shared, so rendering is chosen per call.
+        self.headless = headless
 
     def process_function(
         self,
@@ -44,7 +47,7 @@ class FunctionManager:
 
         # 4. Generate a new prompt to the model based on the updated session state
         new_message = self.chat_model.get_chat_completion(
-            messages=session_manager.output()
+            messages=session_manager.output(), headless=self.headless
         )
         self.logger.debug(f"New message: {new_message}")
         if new_message is None:
@@ -81,7 +84,9 @@ class FunctionManager:
         prompt_message = ChatModelResponse(role="user", content=prompt_template)
         session_manager.enqueue(prompt_message)
 
-        message = self.chat_model.get_chat_completion(messages=session_manager.output())
+        message = self.chat_model.get_chat_completion(
+            messages=session_manager.output(), headless=self.headless
+        )
 
         if not message:
             return False
@@ -0,0 +1,153 @@
+"""
+pygptprompt/json/lines.py
+
+REFERENCE:
+    https://jsonlines.org/
+"""
+import json
+import os
+from logging import Logger
+from typing import Optional
+
+from pygptprompt.json.base import DecodeError, EncodeError, JSONList
+from pygptprompt.pattern.logger import get_default_logger
+
+
+class JSONLinesTemplate:
+    """
+    A template class for managing a list of dictionaries in JSON Lines files.
+
+    Each record is stored as a single line of compact JSON, so records may be
+    appended without rewriting the file.
+
+    Attributes:
+        _file_path (str): The path to the JSON Lines source file.
+        _data (JSONList): The records read by the last load.
+        _logger (Optional[Logger]): Optional logger for error-handling.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        logger: Optional[Logger] = None,
+    ):
+        """
+        Initializes the JSONLinesTemplate.
+
+        Args:
+            file_path (str): The path to the JSON Lines file.
+            logger (Optional[Logger]): Optional logger for error-handling.
+        """
+        self._file_path = str(file_path)
+        self._data: JSONList = []
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+    @property
+    def file_path(self) -> str:
+        """Return the path to the JSON Lines file."""
+        return self._file_path
+
+    @property
+    def data(self) -> JSONList:
+        """Return the records read by the last load."""
+        return self._data
+
+    def exists(self) -> bool:
+        """Return True if the JSON Lines file exists."""
+        return os.path.isfile(self._file_path)
+
+    def load_jsonl(self) -> bool:
+        """
+        Load the records from the file into the _data attribute.
+
+        A truncated final line, e.g. left behind by a crash during an append, is skipped.
+
+        Returns:
+            bool: True if the records were loaded successfully, False otherwise.
+        """
+        try:
+            with open(self._file_path, "r") as file:
+                lines = file.read().split("\n")
+        except DecodeError as e:
+            self._logger.error(f"Error loading JSON Lines from {self._file_path}: {e}")
+            return False
+
+        data = []
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                data.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                if number < len(lines) - 1:
+                    self._logger.error(
+                        f"Error decoding line {number} of {self._file_path}: {e}"
+                    )
+                    return False
+                self._logger.warning(
+                    f"Skipping truncated final line of {self._file_path}"
+                )
+
+        self._data = data
+        self._logger.debug(f"JSON Lines successfully loaded from {self._file_path}")
+        return True
+
+    def append_jsonl(self, records: JSONList, fsync: bool = True) -> bool:
+        """
+        Append records to the end of the file.
+
+        Args:
+            records (JSONList): The records to append.
+            fsync (bool): Whether to flush the records to disk before returning. Defaults to True.
+
+        Returns:
+            bool: True if the records were appended successfully, False otherwise.
+        """
+        try:
+            lines = "".join(json.dumps(record) + "\n" for record in records)
+            with open(self._file_path, "a") as file:
+                file.write(lines)
+                file.flush()
+                if fsync:
+                    os.fsync(file.fileno())
+            self._logger.debug(
+                f"Appended {len(records)} JSON Lines to {self._file_path}"
+            )
+            return True
+        except EncodeError as e:
+            self._logger.error(f"Error appending JSON Lines to {self._file_path}: {e}")
+            return False
+
+    def save_jsonl(self, records: JSONList, fsync: bool = True) -> bool:
+        """
+        Atomically replace the file with the given records.
+
+        The records are written to a temporary file which then replaces the
+        original, so a crash never leaves a partially written file behind.
+
+        Args:
+            records (JSONList): The records to save.
+            fsync (bool): Whether to flush the records to disk before replacing. Defaults to True.
+
+        Returns:
+            bool: True if the records were saved successfully, False otherwise.
+        """
+        temp_path = f"{self._file_path}.tmp"
+
+        try:
+            with open(temp_path, "w") as file:
+                for record in records:
+                    file.write(json.dumps(record) + "\n")
+                file.flush()
+                if fsync:
+                    os.fsync(file.fileno())
+            os.replace(temp_path, self._file_path)
+            self._logger.debug(f"JSON Lines successfully saved to {self._file_path}")
+            return True
+        except EncodeError as e:
+            self._logger.error(f"Error saving JSON Lines to {self._file_path}: {e}")
+            return False
@@ -1,11 +1,16 @@
 """
 pygptprompt/model/base.py
 """
+import time
 from abc import ABC, abstractmethod
+from functools import partial
 from typing import (
+    AsyncIterator,
+    Callable,
     List,
     Literal,
     NotRequired,
+    Optional,
     Protocol,
     Required,
     TypedDict,
@@ -22,8 +27,9 @@ ChatModelVector = Union[List[int], List[float]]
 # Alias for a vector encoding in the chat model.
 ChatModelEncoding = ChatModelVector
 
-# Represents an embedding as a list of ChatModelVectors.
-ChatModelEmbedding = List[ChatModelVector]
+# Represents the embeddings of a batch of inputs as a float32 (or float16)
+# matrix of shape (inputs, dimensions), one row per input.
+ChatModelEmbedding = np.ndarray
 
 # Represents a document or string in the chat model.
 ChatModelDocument = str
@@ -54,7 +60,7 @@ class DeltaContent(TypedDict, total=False):
     """
 
     content: NotRequired[str]
-    function_call: NotRequired[str]
+    function_call: NotRequired["FunctionCall"]
 
 
 class FunctionCall(TypedDict):
@@ -104,14 +110,41 @@ class ChatModelResponse(ChatCompletionMessage):
     user: NotRequired[str]
 
 
+class ChatModelResult(TypedDict):
+    """
+    Represents the outcome of a single conversation in a batch of chat completions.
+
+    Attributes:
+        - index: The position of the conversation in the batch.
+        - response: The model's response, or None if the completion failed.
+        - error: The error message, or None if the completion succeeded.
+        - elapsed: The number of seconds spent generating the completion.
+    """
+
+    index: int
+    response: Optional[ChatModelResponse]
+    error: Optional[str]
+    elapsed: float
+
+
 class ChatModel(ABC):
     """
     Abstract base class for a ChatModel.
 
     Attributes:
         config (ConfigurationManager): The configuration template for the model.
+        last_used (float): The monotonic time the model was last used.
+        on_event (Optional[Callable[[str, float], None]]): Called with the event and its duration when the model loads or unloads its weights.
+
+    Properties:
+        loaded (bool): Whether the model's weights are resident.
+        resident_bytes (int): The approximate memory held by the model's weights and contexts.
     """
 
+    # NOTE: Set by the ModelPool that shares the model.
+    last_used: float = 0.0
+    on_event: Optional[Callable[[str, float], None]] = None
+
     @abstractmethod
     def __init__(self, config: object):
         """
@@ -140,13 +173,14 @@ class ChatModel(ABC):
 
     @abstractmethod
     def get_chat_completion(
-        self, messages: List[ChatModelResponse]
+        self, messages: List[ChatModelResponse], headless: bool = False
     ) -> ChatModelResponse:
         """
         Get a text completion for a conversation based on the provided messages.
 
         Args:
             messages (List[ChatModelResponse]): The list of ChatModelResponse objects representing the conversation.
+            headless (bool): Whether to generate the completion without rendering it. Default is False.
 
         Returns:
             ChatModelResponse (Dict[LiteralString, str]): The text completion for the conversation.
@@ -162,7 +196,7 @@ class ChatModel(ABC):
             input (Union[str, List[str]]): The input text or list of texts to get embeddings for.
 
         Returns:
-            ChatModelEmbedding (List[List[float]]): The embedding representation of the input.
+            ChatModelEmbedding (np.ndarray): The embedding of each input, one row per input.
         """
         raise NotImplementedError
 
@@ -179,6 +213,203 @@ class ChatModel(ABC):
         """
         raise NotImplementedError
 
+    @property
+    def encoding_id(self) -> str:
+        """
+        Get an identifier for the model's tokenizer.
+
+        Models sharing a tokenizer should return the same identifier so their
+        token counts can be shared. The default is unique to this instance.
+
+        Returns:
+            str: The tokenizer identifier.
+        """
+        return f"{self.__class__.__name__}:{id(self)}"
+
+    @property
+    def embedding_id(self) -> str:
+        """
+        Get an identifier for the model producing the embeddings.
+
+        Models producing the same embeddings should return the same identifier
+        so their embeddings can be cached across instances and processes. The
+        default is unique to this instance.
+
+        Returns:
+            str: The embedding model identifier.
+        """
+        return f"{self.__class__.__name__}:{id(self)}"
+
+    def get_chat_completions(
+        self, batch: List[List[ChatModelResponse]]
+    ) -> List[ChatModelResult]:
+        """
+        Get a text completion for each conversation in a batch without rendering them.
+
+        The default completes the conversations one at a time. Models able to
+        generate several completions at once should override this method.
+
+        Args:
+            batch (List[List[ChatModelResponse]]): The conversations to complete.
+
+        Returns:
+            List[ChatModelResult]: The result of each conversation, in the same order as the batch.
+        """
+        complete = partial(self.get_chat_completion, headless=True)
+        return [
+            self._get_chat_completion_result(index, messages, complete)
+            for index, messages in enumerate(batch)
+        ]
+
+    @staticmethod
+    def _get_chat_completion_result(
+        index: int,
+        messages: List[ChatModelResponse],
+        complete: Callable[[List[ChatModelResponse]], ChatModelResponse],
+    ) -> ChatModelResult:
+        """
+        Complete a single conversation of a batch, capturing its error and timing.
+
+        Args:
+            index (int): The position of the conversation in the batch.
+            messages (List[ChatModelResponse]): The conversation to complete.
+            complete (Callable): Generates the completion, raising on failure.
+
+        Returns:
+            ChatModelResult: The result of the conversation.
+        """
+        start = time.perf_counter()
+        try:
+            response, error = complete(messages), None
+        except Exception as e:
+            response, error = None, str(e)
+        return ChatModelResult(
+            index=index,
+            response=response,
+            error=error,
+            elapsed=time.perf_counter() - start,
+        )
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Check whether the model's weights are resident.
+
+        Returns:
+            bool: True if the weights are resident. Remote models are always loaded.
+        """
+        return True
+
+    @property
+    def resident_bytes(self) -> int:
+        """
+        Get the approximate memory held by the model's weights and contexts.
+
+        Returns:
+            int: The number of resident bytes. Remote models hold none.
+        """
+        return 0
+
+    def load(self) -> bool:
+        """
+        Load the model's weights. Models load them lazily on first use.
+
+        Returns:
+            bool: True if the weights are resident, False otherwise.
+        """
+        return True
+
+    def unload(self) -> bool:
+        """
+        Release the model's weights. They are loaded again on the model's next use.
+
+        Returns:
+            bool: True if the weights were released, False otherwise.
+        """
+        return False
+
+    def save_prompt_state(self, name: str) -> bool:
+        """
+        Persist the evaluated prompt state of the named session, if the model keeps one.
+
+        Models able to resume a session without evaluating its prompt again
+        should override this method.
+
+        Args:
+            name (str): The name of the session.
+
+        Returns:
+            bool: True if the state was persisted, False otherwise.
+        """
+        return False
+
+    def get_encodings(self, texts: List[str]) -> List[ChatModelEncoding]:
+        """
+        Get the encodings for a batch of texts.
+
+        Models with a native batch tokenizer should override this method.
+
+        Args:
+            texts (List[str]): The strings of text to encode.
+
+        Returns:
+            List[ChatModelEncoding] (List[List[int]]): The encodings in the same order as the texts.
+        """
+        return [self.get_encoding(text=text) for text in texts]
+
+
+class AsyncChatModel(ABC):
+    """
+    Abstract base class for the asynchronous counterpart of a ChatModel.
+
+    The asynchronous methods never render their output, so many requests can
+    be awaited concurrently, e.g. with `asyncio.gather`. Implementations are
+    expected to bound the number of requests in flight.
+    """
+
+    @abstractmethod
+    async def aget_chat_completion(
+        self, messages: List[ChatModelResponse]
+    ) -> ChatModelResponse:
+        """
+        Get a text completion for a conversation based on the provided messages.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of ChatModelResponse objects representing the conversation.
+
+        Returns:
+            ChatModelResponse (Dict[LiteralString, str]): The text completion for the conversation.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def astream_chat_completion(
+        self, messages: List[ChatModelResponse]
+    ) -> AsyncIterator[DeltaContent]:
+        """
+        Stream the deltas of a text completion for a conversation as they are generated.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of ChatModelResponse objects representing the conversation.
+
+        Returns:
+            AsyncIterator[DeltaContent]: The deltas of the text completion.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def aget_embedding(self, input: Union[str, List[str]]) -> ChatModelEmbedding:
+        """
+        Get the embedding for a given input.
+
+        Args:
+            input (Union[str, List[str]]): The input text or list of texts to get embeddings for.
+
+        Returns:
+            ChatModelEmbedding (np.ndarray): The embedding of each input, one row per input.
+        """
+        raise NotImplementedError
+
 
 class EmbeddingFunction(Protocol[D]):
     @abstractmethod
@@ -190,6 +421,6 @@ class EmbeddingFunction(Protocol[D]):
             texts (List[str]): A list of text documents.
 
         Returns:
-            ChatModelEmbedding (List[List[float]]): The resulting embedding for the given text documents.
+            ChatModelEmbedding (np.ndarray): The embedding of each text document, one row per document.
         """
         raise NotImplementedError
@@ -0,0 +1,154 @@
+"""
+pygptprompt/model/embedding.py
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from pygptprompt.model.base import ChatModelDocuments, ChatModelEmbedding
+from pygptprompt.pattern.logger import get_default_logger
+
+
+class EmbeddingScheduler:
+    """
+    Splits embedding requests into micro-batches and runs them concurrently.
+
+    Inputs are sorted by token count so each batch holds inputs of similar
+    length, which reduces padding. A batch holds at most `max_batch_size`
+    inputs and `max_batch_tokens` tokens. An input exceeding the token budget
+    is sent as a batch of its own. The batches are run by `workers` threads,
+    and their embeddings are gathered into one contiguous float32 array in
+    input order.
+
+    Args:
+        max_batch_size (int): The maximum number of inputs per batch. Default is 64.
+        max_batch_tokens (int): The maximum number of tokens per batch. Default is 8192.
+        workers (int): The number of batches embedded concurrently. Default is 1.
+        logger (Optional[Logger]): Optional logger for reporting throughput.
+
+    Methods:
+        plan(token_counts): Group the inputs into batches.
+        assemble(batches, results, count): Gather the embeddings of the batches in input order.
+        run(texts, token_counts, embed): Embed the inputs batch by batch.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 64,
+        max_batch_tokens: int = 8192,
+        workers: int = 1,
+        logger: Optional[Logger] = None,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.workers = max(1, workers)
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+    def plan(self, token_counts: List[int]) -> List[List[int]]:
+        """
+        Group the inputs into batches of similar length.
+
+        Args:
+            token_counts (List[int]): The token count of each input.
+
+        Returns:
+            List[List[int]]: The positions of the inputs in each batch, longest first.
+        """
+        order = sorted(
+            range(len(token_counts)), key=lambda i: token_counts[i], reverse=True
+        )
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        tokens = 0
+        for position in order:
+            count = token_counts[position]
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or tokens + count > self.max_batch_tokens
+            ):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(position)
+            tokens += count
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def assemble(
+        batches: List[List[int]], results: List[ChatModelEmbedding], count: int
+    ) -> np.ndarray:
+        """
+        Gather the embeddings of the batches into one array in input order.
+
+        Args:
+            batches (List[List[int]]): The positions of the inputs in each batch.
+            results (List[ChatModelEmbedding]): The embeddings of each batch.
+            count (int): The number of inputs.
+
+        Returns:
+            np.ndarray: The float32 embeddings of shape (count, dimensions).
+
+        Raises:
+            ValueError: If a batch does not have one embedding per input.
+        """
+        embeddings = None
+        for batch, result in zip(batches, results):
+            vectors = np.asarray(result, dtype=np.float32)
+            if vectors.ndim != 2 or len(vectors) != len(batch):
+                raise ValueError("Expected one embedding vector per input")
+            if embeddings is None:
+                embeddings = np.empty((count, vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+        if embeddings is None:
+            return np.empty((count, 0), dtype=np.float32)
+        return embeddings
+
+    def run(
+        self,
+        texts: ChatModelDocuments,
+        token_counts: List[int],
+        embed: Callable[[ChatModelDocuments], ChatModelEmbedding],
+    ) -> np.ndarray:
+        """
+        Embed the inputs batch by batch.
+
+        Args:
+            texts (ChatModelDocuments): The inputs to embed.
+            token_counts (List[int]): The token count of each input.
+            embed (Callable[[ChatModelDocuments], ChatModelEmbedding]): Embeds a batch of inputs in order. It must be safe to call from `workers` threads at once.
+
+        Returns:
+            np.ndarray: The float32 embeddings of shape (len(texts), dimensions).
+
+        Raises:
+            ValueError: If a batch does not return one embedding per input.
+        """
+        start = time.perf_counter()
+        batches = self.plan(token_counts)
+
+        def embed_batch(batch: List[int]) -> ChatModelEmbedding:
+            return embed([texts[position] for position in batch])
+
+        if self.workers == 1 or len(batches) == 1:
+            results = [embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(embed_batch, batches))
+
+        embeddings = self.assemble(batches, results, len(texts))
+        self._logger.debug(
+            "Embedded %d inputs (%d tokens) in %d batches in %.2fs",
+            len(texts),
+            sum(token_counts),
+            len(batches),
+            time.perf_counter() - start,
+        )
+        return embeddings
@@ -1,19 +1,30 @@
 """
 pygptprompt/model/factory.py
 """
+import hashlib
+import json
+
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import ChatModel
 from pygptprompt.model.llama_cpp import LlamaCppModel
 from pygptprompt.model.openai import OpenAIModel
+from pygptprompt.model.pool import ModelPool
 
 
 class ChatModelFactory:
     """
     A factory for creating chat model instances based on the provider.
 
+    Models are pooled by their provider's configuration, so every caller asking
+    for the same provider shares one model. Models load their weights on first
+    use. They are unloaded after `app.model_pool.ttl` idle seconds, and the
+    least recently used ones are unloaded once the pool holds more than
+    `app.model_pool.max_resident_bytes`. Both are disabled by default.
+
     Attributes:
         config (ConfigurationManager): The configuration manager instance.
         provider_map (dict): A dictionary mapping provider keys to their corresponding classes.
+        pool (ModelPool): The pool of shared models, exposing load and unload events.
     """
 
     def __init__(self, config: ConfigurationManager):
@@ -28,10 +39,15 @@ class ChatModelFactory:
             "openai": OpenAIModel,
             "llama_cpp": LlamaCppModel,
         }
+        self.pool = ModelPool(
+            ttl=config.get_value("app.model_pool.ttl", 0),
+            max_resident_bytes=config.get_value("app.model_pool.max_resident_bytes", 0),
+            logger=config.get_logger("general", ModelPool.__name__),
+        )
 
     def create_model(self, provider: str) -> ChatModel:
         """
-        Creates and returns a chat model instance based on the provider.
+        Returns the shared chat model instance for the provider, creating it on first use.
 
         Args:
             provider (str): The provider key.
@@ -52,4 +68,12 @@ class ChatModelFactory:
         if provider_key not in self.provider_map:
             raise ValueError(f"Unknown provider: {provider}")
 
-        return self.provider_map[provider_key](self.config)
+        # NOTE: Providers with the same configuration share a model.
+        digest = hashlib.blake2b(
+            json.dumps(provider_config, sort_keys=True, default=str).encode("utf-8"),
+            digest_size=8,
+        ).hexdigest()
+        return self.pool.get(
+            f"{provider_key}:{digest}",
+            lambda: self.provider_map[provider_key](self.config),
+        )
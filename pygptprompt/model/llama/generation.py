@@ -17,6 +17,7 @@ from fairscale.nn.model_parallel.initialize import (
 )
 
 from pygptprompt.model.llama.model import ModelArgs, Transformer
+from pygptprompt.model.llama.quantize import prepare_model, quantize_state_dict
 from pygptprompt.model.llama.tokenizer import Tokenizer
 
 Role = Literal["system", "user", "assistant"]
@@ -39,6 +40,15 @@ class ChatPrediction(TypedDict, total=False):
     logprobs: List[float]  # not required
 
 
+class SpeculativeStats(TypedDict):
+    drafted: int  # tokens proposed by the draft model
+    accepted: int  # draft tokens accepted by the target model
+    generated: int  # tokens generated in total
+    seconds: float
+    acceptance_rate: float
+    tokens_per_second: float
+
+
 Dialog = List[Message]
 
 B_INST, E_INST = "[INST]", "[/INST]"
@@ -54,13 +64,23 @@ class Llama:
         max_seq_len: int,
         max_batch_size: int,
         model_parallel_size: Optional[int] = None,
+        draft_ckpt_dir: Optional[str] = None,
+        n_draft: int = 4,
+        kv_block_size: int = 0,
+        quantize_bits: Optional[int] = None,
+        group_size: int = 64,
+        single_process: bool = False,
     ) -> "Llama":
-        if not torch.distributed.is_initialized():
-            torch.distributed.init_process_group("nccl")
-        if not model_parallel_is_initialized():
-            if model_parallel_size is None:
-                model_parallel_size = int(os.environ.get("WORLD_SIZE", 1))
-            initialize_model_parallel(model_parallel_size)
+        if single_process:
+            # plain torch layers on the cpu, without torch.distributed or fairscale
+            model_parallel_size = 1
+        else:
+            if not torch.distributed.is_initialized():
+                torch.distributed.init_process_group("nccl")
+            if not model_parallel_is_initialized():
+                if model_parallel_size is None:
+                    model_parallel_size = int(os.environ.get("WORLD_SIZE", 1))
+                initialize_model_parallel(model_parallel_size)
 
         local_rank = int(os.environ.get("LOCAL_RANK", 0))
         # torch.cuda.set_device(local_rank)
@@ -72,33 +92,108 @@ class Llama:
             sys.stdout = open(os.devnull, "w")
 
         start_time = time.time()
+        tokenizer = Tokenizer(model_path=tokenizer_path)
+        torch.set_default_tensor_type(torch.FloatTensor)
+        model = Llama._load_transformer(
+            ckpt_dir,
+            model_parallel_size,
+            vocab_size=tokenizer.n_words,
+            max_seq_len=max_seq_len,
+            max_batch_size=max_batch_size,
+            kv_block_size=kv_block_size,
+            quantize_bits=quantize_bits,
+            group_size=group_size,
+            single_process=single_process,
+        )
+        draft_model = None
+        if draft_ckpt_dir is not None:
+            # the draft model decodes one sequence at a time
+            draft_model = Llama._load_transformer(
+                draft_ckpt_dir,
+                model_parallel_size,
+                vocab_size=tokenizer.n_words,
+                max_seq_len=max_seq_len,
+                max_batch_size=1,
+                kv_block_size=kv_block_size,
+                quantize_bits=quantize_bits,
+                group_size=group_size,
+                single_process=single_process,
+            )
+        print(f"Loaded in {time.time() - start_time:.2f} seconds")
+
+        return Llama(model, tokenizer, draft_model=draft_model, n_draft=n_draft)
+
+    @staticmethod
+    def _load_transformer(
+        ckpt_dir: str,
+        model_parallel_size: int,
+        vocab_size: int,
+        max_seq_len: int,
+        max_batch_size: int,
+        kv_block_size: int = 0,
+        quantize_bits: Optional[int] = None,
+        group_size: int = 64,
+        single_process: bool = False,
+    ) -> Transformer:
         checkpoints = sorted(Path(ckpt_dir).glob("*.pth"))
         assert len(checkpoints) > 0, f"no checkpoint files found in {ckpt_dir}"
         assert model_parallel_size == len(
             checkpoints
         ), f"Loading a checkpoint for MP={len(checkpoints)} but world size is {model_parallel_size}"
-        ckpt_path = checkpoints[get_model_parallel_rank()]
-        checkpoint = torch.load(ckpt_path, map_location="cpu")
+        if single_process:
+            # map the checkpoint instead of reading it, its tensors are assigned
+            # to the model without a copy and paged in on first use
+            checkpoint = torch.load(
+                checkpoints[0], map_location="cpu", mmap=True, weights_only=True
+            )
+        else:
+            ckpt_path = checkpoints[get_model_parallel_rank()]
+            checkpoint = torch.load(ckpt_path, map_location="cpu")
         with open(Path(ckpt_dir) / "params.json", "r") as f:
             params = json.loads(f.read())
+        # checkpoints written by quantize_checkpoint are already quantized
+        quantization = params.pop("quantization", None)
+        if quantization is None and quantize_bits is not None:
+            quantization = {"bits": quantize_bits, "group_size": group_size}
+            quantize_state_dict(checkpoint, **quantization)
+        if quantization is not None:
+            assert (
+                model_parallel_size == 1
+            ), f"Quantized models run in a single process, but world size is {model_parallel_size}"
 
         model_args: ModelArgs = ModelArgs(
             max_seq_len=max_seq_len,
             max_batch_size=max_batch_size,
+            kv_block_size=kv_block_size,
+            model_parallel=not single_process,
             **params,
         )
-        tokenizer = Tokenizer(model_path=tokenizer_path)
-        model_args.vocab_size = tokenizer.n_words
-        torch.set_default_tensor_type(torch.FloatTensor)
+        model_args.vocab_size = vocab_size
         model = Transformer(model_args)
-        model.load_state_dict(checkpoint, strict=False)
-        print(f"Loaded in {time.time() - start_time:.2f} seconds")
-
-        return Llama(model, tokenizer)
+        if quantization is not None:
+            prepare_model(model, **quantization)
+        # the model holds the tensors of the checkpoint in their dtype when they are assigned
+        model.load_state_dict(checkpoint, strict=False, assign=single_process)
+        return model
 
-    def __init__(self, model: Transformer, tokenizer: Tokenizer):
+    def __init__(
+        self,
+        model: Transformer,
+        tokenizer: Tokenizer,
+        draft_model: Optional[Transformer] = None,
+        n_draft: int = 4,
+    ):
         self.model = model
         self.tokenizer = tokenizer
+        # speculative decoding is enabled by a draft model sharing the tokenizer
+        self.draft_model = draft_model
+        self.n_draft = n_draft
+        self.speculative_stats: Optional[SpeculativeStats] = None
+        if draft_model is not None:
+            assert draft_model.vocab_size == model.vocab_size, (
+                draft_model.vocab_size,
+                model.vocab_size,
+            )
 
     @torch.inference_mode()
     def generate(
@@ -110,6 +205,16 @@ class Llama:
         logprobs: bool = False,
         echo: bool = False,
     ) -> Tuple[List[List[int]], Optional[List[List[float]]]]:
+        if self.draft_model is not None and not logprobs:
+            out_tokens, self.speculative_stats = self.speculative_generate(
+                prompt_tokens=prompt_tokens,
+                max_gen_len=max_gen_len,
+                temperature=temperature,
+                top_p=top_p,
+                echo=echo,
+            )
+            return (out_tokens, None)
+
         params = self.model.params
         bsz = len(prompt_tokens)
         assert bsz <= params.max_batch_size, (bsz, params.max_batch_size)
@@ -156,6 +261,7 @@ class Llama:
             prev_pos = cur_pos
             if all(eos_reached):
                 break
+        self.model.release_cache(range(bsz))
 
         if logprobs:
             token_logprobs = token_logprobs.tolist()
@@ -176,6 +282,131 @@ class Llama:
             out_logprobs.append(probs)
         return (out_tokens, out_logprobs if logprobs else None)
 
+    @torch.inference_mode()
+    def speculative_generate(
+        self,
+        prompt_tokens: List[List[int]],
+        max_gen_len: int,
+        temperature: float = 0.6,
+        top_p: float = 0.9,
+        echo: bool = False,
+    ) -> Tuple[List[List[int]], SpeculativeStats]:
+        """
+        Generate tokens with speculative decoding.
+
+        The draft model proposes `n_draft` tokens, which the target model
+        verifies in a single forward pass over its KV cache. Draft tokens are
+        accepted by rejection sampling, so the output follows the target
+        model's distribution; with temperature 0 it is the target model's
+        greedy output. Rejected positions are overwritten in the KV caches by
+        the next step. Prompts are decoded one at a time.
+
+        Args:
+            prompt_tokens (List[List[int]]): The tokens of each prompt.
+            max_gen_len (int): The maximum number of generated tokens per prompt.
+            temperature (float): The sampling temperature, 0 for greedy decoding.
+            top_p (float): The top-p probability threshold for sampling.
+            echo (bool): Whether to include the prompt tokens in the output.
+
+        Returns:
+            Tuple[List[List[int]], SpeculativeStats]: The generated tokens of each prompt and the decoding statistics.
+        """
+        assert self.draft_model is not None, "speculative decoding needs a draft model"
+        start_time = time.perf_counter()
+        out_tokens = []
+        drafted = accepted = generated = 0
+        for prompt in prompt_tokens:
+            toks, n_drafted, n_accepted = self._speculate(
+                prompt, max_gen_len, temperature, top_p
+            )
+            drafted += n_drafted
+            accepted += n_accepted
+            generated += len(toks) - len(prompt)
+            start = 0 if echo else len(prompt)
+            toks = toks[start:]
+            # cut to eos tok if any
+            if self.tokenizer.eos_id in toks:
+                toks = toks[: toks.index(self.tokenizer.eos_id)]
+            out_tokens.append(toks)
+
+        seconds = time.perf_counter() - start_time
+        stats = SpeculativeStats(
+            drafted=drafted,
+            accepted=accepted,
+            generated=generated,
+            seconds=seconds,
+            acceptance_rate=accepted / drafted if drafted else 0.0,
+            tokens_per_second=generated / seconds if seconds else 0.0,
+        )
+        return (out_tokens, stats)
+
+    def _speculate(
+        self,
+        prompt: List[int],
+        max_gen_len: int,
+        temperature: float,
+        top_p: float,
+    ) -> Tuple[List[int], int, int]:
+        max_seq_len = min(
+            self.model.params.max_seq_len, self.draft_model.params.max_seq_len
+        )
+        assert len(prompt) < max_seq_len, (len(prompt), max_seq_len)
+        total_len = min(max_seq_len, len(prompt) + max_gen_len)
+
+        tokens = list(prompt)
+        # the number of leading tokens held by the KV cache of each model
+        target_pos = draft_pos = 0
+        drafted = accepted = 0
+        while len(tokens) < total_len:
+            # each step emits at most k + 1 tokens
+            k = min(self.n_draft, total_len - len(tokens) - 1)
+            draft_tokens, draft_probs = [], []
+            for _ in range(k):
+                seq = tokens + draft_tokens
+                logits = self.draft_model.forward(
+                    torch.tensor([seq[draft_pos:]], dtype=torch.long), draft_pos
+                )
+                draft_pos = len(seq)
+                probs = sampling_probs(logits[0, -1], temperature, top_p)
+                draft_tokens.append(torch.multinomial(probs, num_samples=1).item())
+                draft_probs.append(probs)
+
+            seq = tokens + draft_tokens
+            logits = self.model.forward(
+                torch.tensor([seq[target_pos:]], dtype=torch.long), target_pos
+            )[0, -(k + 1) :]
+
+            n, next_token, eos_reached = 0, None, False
+            for draft_token, q in zip(draft_tokens, draft_probs):
+                p = sampling_probs(logits[n], temperature, top_p)
+                if torch.rand(()) * q[draft_token] >= p[draft_token]:
+                    # rejected, resample from the residual distribution
+                    residual = (p - q).clamp_(min=0.0)
+                    next_token = torch.multinomial(residual, num_samples=1).item()
+                    break
+                n += 1
+                if draft_token == self.tokenizer.eos_id:
+                    eos_reached = True
+                    break
+            drafted += k
+            accepted += n
+
+            tokens += draft_tokens[:n]
+            if eos_reached:
+                break
+            if next_token is None:
+                # every draft token was accepted, sample one more for free
+                p = sampling_probs(logits[n], temperature, top_p)
+                next_token = torch.multinomial(p, num_samples=1).item()
+            tokens.append(next_token)
+            target_pos = len(tokens) - 1
+            draft_pos = min(draft_pos, len(tokens) - 1)
+            if next_token == self.tokenizer.eos_id:
+                break
+        self.model.release_cache([0])
+        self.draft_model.release_cache([0])
+        return (tokens, drafted, accepted)
+
     def text_completion(
         self,
         prompts: List[str],
@@ -299,3 +530,16 @@ def sample_top_p(probs, p):
     next_token = torch.multinomial(probs_sort, num_samples=1)
     next_token = torch.gather(probs_idx, -1, next_token)
     return next_token
+
+
+def sampling_probs(logits: torch.Tensor, temperature: float, top_p: float):
+    """The distribution sampled by `generate`, one-hot at the argmax for temperature 0."""
+    if temperature > 0:
+        probs = torch.softmax(logits / temperature, dim=-1)
+        probs_sort, probs_idx = torch.sort(probs, dim=-1, descending=True)
+        probs_sum = torch.cumsum(probs_sort, dim=-1)
+        mask = probs_sum - probs_sort > top_p
+        probs_sort[mask] = 0.0
+        probs_sort.div_(probs_sort.sum(dim=-1, keepdim=True))
+        return torch.zeros_like(probs).scatter_(-1, probs_idx, probs_sort)
+    return F.one_hot(torch.argmax(logits, dim=-1), logits.shape[-1]).float()
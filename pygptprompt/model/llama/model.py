@@ -3,7 +3,8 @@
 
 import math
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple, Union
 
 import fairscale.nn.model_parallel.initialize as fs_init
 import torch
@@ -14,6 +15,9 @@ from fairscale.nn.model_parallel.layers import (
     RowParallelLinear,
 )
 from torch import nn
+from torch.nn.utils import skip_init
+
+from pygptprompt.model.llama.paged_cache import PagedKVCache
 
 
 @dataclass
@@ -29,6 +33,10 @@ class ModelArgs:
 
     max_batch_size: int = 32
     max_seq_len: int = 2048
+    # page the KV cache in blocks of this many tokens, 0 pre-allocates it
+    kv_block_size: int = 0
+    # shard the layers with fairscale, or use plain torch layers in a single process
+    model_parallel: bool = True
 
 
 class RMSNorm(torch.nn.Module):
@@ -45,6 +53,39 @@ class RMSNorm(torch.nn.Module):
         return output * self.weight
 
 
+# the weights are left uninitialized for a checkpoint to be loaded into
+def column_linear(
+    in_features: int, out_features: int, model_parallel: bool, gather_output: bool
+) -> nn.Module:
+    if not model_parallel:
+        return skip_init(nn.Linear, in_features, out_features, bias=False)
+    return ColumnParallelLinear(
+        in_features,
+        out_features,
+        bias=False,
+        gather_output=gather_output,
+        init_method=lambda x: x,
+    )
+
+
+def row_linear(in_features: int, out_features: int, model_parallel: bool) -> nn.Module:
+    if not model_parallel:
+        return skip_init(nn.Linear, in_features, out_features, bias=False)
+    return RowParallelLinear(
+        in_features,
+        out_features,
+        bias=False,
+        input_is_parallel=True,
+        init_method=lambda x: x,
+    )
+
+
+def embedding(num_embeddings: int, dim: int, model_parallel: bool) -> nn.Module:
+    if not model_parallel:
+        return skip_init(nn.Embedding, num_embeddings, dim)
+    return ParallelEmbedding(num_embeddings, dim, init_method=lambda x: x)
+
+
 def precompute_freqs_cis(dim: int, end: int, theta: float = 10000.0):
     freqs = 1.0 / (theta ** (torch.arange(0, dim, 2)[: (dim // 2)].float() / dim))
     t = torch.arange(end, device=freqs.device)  # type: ignore
@@ -56,6 +97,10 @@ def precompute_freqs_cis(dim: int, end: int, theta: float = 10000.0):
 def reshape_for_broadcast(freqs_cis: torch.Tensor, x: torch.Tensor):
     ndim = x.ndim
     assert 0 <= 1 < ndim
+    if freqs_cis.ndim == 3:
+        # per-row positions, (bs, seqlen, head_dim // 2)
+        assert freqs_cis.shape == (x.shape[0], x.shape[1], x.shape[-1])
+        return freqs_cis[:, :, None, :]
     assert freqs_cis.shape == (x.shape[1], x.shape[-1])
     shape = [d if i == 1 or i == ndim - 1 else 1 for i, d in enumerate(x.shape)]
     return freqs_cis.view(*shape)
@@ -74,57 +119,66 @@ def apply_rotary_emb(
     return xq_out.type_as(xq), xk_out.type_as(xk)
 
 
-def repeat_kv(x: torch.Tensor, n_rep: int) -> torch.Tensor:
-    """torch.repeat_interleave(x, dim=2, repeats=n_rep)"""
-    bs, slen, n_kv_heads, head_dim = x.shape
-    if n_rep == 1:
-        return x
-    return (
-        x[:, :, :, None, :]
-        .expand(bs, slen, n_kv_heads, n_rep, head_dim)
-        .reshape(bs, slen, n_kv_heads * n_rep, head_dim)
-    )
+def grouped_attention(
+    xq: torch.Tensor,
+    keys: torch.Tensor,
+    values: torch.Tensor,
+    mask: Optional[torch.Tensor],
+) -> torch.Tensor:
+    # xq is (bs, n_kv_heads, n_rep * seqlen, head_dim), keys and values are
+    # (bs, n_kv_heads, cache_len + seqlen, head_dim), mask is True where a query
+    # may attend a key, or None to attend every key
+    if hasattr(F, "scaled_dot_product_attention"):
+        return F.scaled_dot_product_attention(xq, keys, values, attn_mask=mask)
+    scores = torch.matmul(xq, keys.transpose(2, 3)) / math.sqrt(xq.shape[-1])
+    if mask is not None:
+        scores = scores.masked_fill(~mask, float("-inf"))
+    scores = F.softmax(scores.float(), dim=-1).type_as(xq)
+    return torch.matmul(scores, values)
+
+
+@lru_cache(maxsize=32)
+def causal_mask(
+    seqlen: int, start_pos: int, n_rep: int, device: Optional[torch.device] = None
+) -> torch.Tensor:
+    # (n_rep * seqlen, start_pos + seqlen), the new tokens attend to every cached
+    # token and to themselves, repeated for the n_rep query heads of each k/v head
+    queries = torch.arange(start_pos, start_pos + seqlen, device=device)
+    keys = torch.arange(start_pos + seqlen, device=device)
+    return (keys <= queries[:, None]).repeat(n_rep, 1)
 
 
 class Attention(nn.Module):
-    def __init__(self, args: ModelArgs):
+    def __init__(self, args: ModelArgs, layer_id: int = 0):
         super().__init__()
+        self.layer_id = layer_id
         self.n_kv_heads = args.n_heads if args.n_kv_heads is None else args.n_kv_heads
-        model_parallel_size = fs_init.get_model_parallel_world_size()
+        model_parallel_size = 1
+        if args.model_parallel:
+            model_parallel_size = fs_init.get_model_parallel_world_size()
         self.n_local_heads = args.n_heads // model_parallel_size
         self.n_local_kv_heads = self.n_kv_heads // model_parallel_size
         self.n_rep = self.n_local_heads // self.n_local_kv_heads
         self.head_dim = args.dim // args.n_heads
 
-        self.wq = ColumnParallelLinear(
-            args.dim,
-            args.n_heads * self.head_dim,
-            bias=False,
-            gather_output=False,
-            init_method=lambda x: x,
+        self.wq = column_linear(
+            args.dim, args.n_heads * self.head_dim, args.model_parallel, False
         )
-        self.wk = ColumnParallelLinear(
-            args.dim,
-            self.n_kv_heads * self.head_dim,
-            bias=False,
-            gather_output=False,
-            init_method=lambda x: x,
+        self.wk = column_linear(
+            args.dim, self.n_kv_heads * self.head_dim, args.model_parallel, False
         )
-        self.wv = ColumnParallelLinear(
-            args.dim,
-            self.n_kv_heads * self.head_dim,
-            bias=False,
-            gather_output=False,
-            init_method=lambda x: x,
+        self.wv = column_linear(
+            args.dim, self.n_kv_heads * self.head_dim, args.model_parallel, False
         )
-        self.wo = RowParallelLinear(
-            args.n_heads * self.head_dim,
-            args.dim,
-            bias=False,
-            input_is_parallel=True,
-            init_method=lambda x: x,
+        self.wo = row_linear(
+            args.n_heads * self.head_dim, args.dim, args.model_parallel
         )
 
+        # set by the Transformer when the KV cache is paged
+        self.paged_cache: Optional[PagedKVCache] = None
+        if args.kv_block_size > 0:
+            return
+
         self.cache_k = torch.zeros(
             (
                 args.max_batch_size,
@@ -145,9 +199,10 @@ class Attention(nn.Module):
     def forward(
         self,
         x: torch.Tensor,
-        start_pos: int,
+        start_pos: Union[int, torch.Tensor],
         freqs_cis: torch.Tensor,
         mask: Optional[torch.Tensor],
+        slots: Optional[torch.Tensor] = None,
     ):
         bsz, seqlen, _ = x.shape
         xq, xk, xv = self.wq(x), self.wk(x), self.wv(x)
@@ -158,28 +213,48 @@ class Attention(nn.Module):
 
         xq, xk = apply_rotary_emb(xq, xk, freqs_cis=freqs_cis)
 
-        self.cache_k = self.cache_k.to(xq)
-        self.cache_v = self.cache_v.to(xq)
-
-        self.cache_k[:bsz, start_pos : start_pos + seqlen] = xk
-        self.cache_v[:bsz, start_pos : start_pos + seqlen] = xv
-
-        keys = self.cache_k[:bsz, : start_pos + seqlen]
-        values = self.cache_v[:bsz, : start_pos + seqlen]
-
-        # repeat k/v heads if n_kv_heads < n_heads
-        keys = repeat_kv(keys, self.n_rep)  # (bs, seqlen, n_local_heads, head_dim)
-        values = repeat_kv(values, self.n_rep)  # (bs, seqlen, n_local_heads, head_dim)
-
-        xq = xq.transpose(1, 2)  # (bs, n_local_heads, seqlen, head_dim)
-        keys = keys.transpose(1, 2)
+        if self.paged_cache is not None:
+            # the Transformer allocated the blocks of this forward pass
+            keys, values = self.paged_cache.update(self.layer_id, xk, xv)
+        else:
+            if self.cache_k.dtype != xq.dtype:
+                self.cache_k = self.cache_k.to(xq)
+                self.cache_v = self.cache_v.to(xq)
+
+            if isinstance(start_pos, int):
+                rows = slice(None, bsz) if slots is None else slots
+                self.cache_k[rows, start_pos : start_pos + seqlen] = xk
+                self.cache_v[rows, start_pos : start_pos + seqlen] = xv
+
+                keys = self.cache_k[rows, : start_pos + seqlen]
+                values = self.cache_v[rows, : start_pos + seqlen]
+            else:
+                # each row continues its own cache slot from its own position
+                rows = torch.arange(bsz) if slots is None else slots
+                positions = start_pos[:, None] + torch.arange(seqlen)
+                self.cache_k[rows[:, None], positions] = xk
+                self.cache_v[rows[:, None], positions] = xv
+
+                end = int(positions.max()) + 1
+                keys = self.cache_k[rows, :end]
+                values = self.cache_v[rows, :end]
+
+        # stack the n_rep query heads sharing each k/v head instead of repeating k/v
+        xq = (
+            xq.view(bsz, seqlen, self.n_local_kv_heads, self.n_rep, self.head_dim)
+            .permute(0, 2, 3, 1, 4)
+            .reshape(bsz, self.n_local_kv_heads, self.n_rep * seqlen, self.head_dim)
+        )
+        keys = keys.transpose(
+            1, 2
+        )  # (bs, n_local_kv_heads, cache_len + seqlen, head_dim)
         values = values.transpose(1, 2)
-        scores = torch.matmul(xq, keys.transpose(2, 3)) / math.sqrt(self.head_dim)
-        if mask is not None:
-            scores = scores + mask  # (bs, n_local_heads, seqlen, cache_len + seqlen)
-        scores = F.softmax(scores.float(), dim=-1).type_as(xq)
-        output = torch.matmul(scores, values)  # (bs, n_local_heads, seqlen, head_dim)
-        output = output.transpose(1, 2).contiguous().view(bsz, seqlen, -1)
+        output = grouped_attention(xq, keys, values, mask)
+        output = (
+            output.view(bsz, self.n_local_kv_heads, self.n_rep, seqlen, self.head_dim)
+            .permute(0, 3, 1, 2, 4)
+            .reshape(bsz, seqlen, -1)
+        )
         return self.wo(output)
 
 
@@ -190,6 +265,7 @@ class FeedForward(nn.Module):
         hidden_dim: int,
         multiple_of: int,
         ffn_dim_multiplier: Optional[float],
+        model_parallel: bool = True,
     ):
         super().__init__()
         hidden_dim = int(2 * hidden_dim / 3)
@@ -198,15 +274,9 @@ class FeedForward(nn.Module):
             hidden_dim = int(ffn_dim_multiplier * hidden_dim)
         hidden_dim = multiple_of * ((hidden_dim + multiple_of - 1) // multiple_of)
 
-        self.w1 = ColumnParallelLinear(
-            dim, hidden_dim, bias=False, gather_output=False, init_method=lambda x: x
-        )
-        self.w2 = RowParallelLinear(
-            hidden_dim, dim, bias=False, input_is_parallel=True, init_method=lambda x: x
-        )
-        self.w3 = ColumnParallelLinear(
-            dim, hidden_dim, bias=False, gather_output=False, init_method=lambda x: x
-        )
+        self.w1 = column_linear(dim, hidden_dim, model_parallel, False)
+        self.w2 = row_linear(hidden_dim, dim, model_parallel)
+        self.w3 = column_linear(dim, hidden_dim, model_parallel, False)
 
     def forward(self, x):
         return self.w2(F.silu(self.w1(x)) * self.w3(x))
@@ -218,12 +288,13 @@ class TransformerBlock(nn.Module):
         self.n_heads = args.n_heads
         self.dim = args.dim
         self.head_dim = args.dim // args.n_heads
-        self.attention = Attention(args)
+        self.attention = Attention(args, layer_id)
         self.feed_forward = FeedForward(
             dim=args.dim,
             hidden_dim=4 * args.dim,
             multiple_of=args.multiple_of,
             ffn_dim_multiplier=args.ffn_dim_multiplier,
+            model_parallel=args.model_parallel,
         )
         self.layer_id = layer_id
         self.attention_norm = RMSNorm(args.dim, eps=args.norm_eps)
@@ -232,12 +303,13 @@ class TransformerBlock(nn.Module):
     def forward(
         self,
         x: torch.Tensor,
-        start_pos: int,
+        start_pos: Union[int, torch.Tensor],
         freqs_cis: torch.Tensor,
         mask: Optional[torch.Tensor],
+        slots: Optional[torch.Tensor] = None,
     ):
         h = x + self.attention.forward(
-            self.attention_norm(x), start_pos, freqs_cis, mask
+            self.attention_norm(x), start_pos, freqs_cis, mask, slots
         )
         out = h + self.feed_forward.forward(self.ffn_norm(h))
         return out
@@ -250,8 +322,8 @@ class Transformer(nn.Module):
         self.vocab_size = params.vocab_size
         self.n_layers = params.n_layers
 
-        self.tok_embeddings = ParallelEmbedding(
-            params.vocab_size, params.dim, init_method=lambda x: x
+        self.tok_embeddings = embedding(
+            params.vocab_size, params.dim, params.model_parallel
         )
 
         self.layers = torch.nn.ModuleList()
@@ -259,30 +331,72 @@ class Transformer(nn.Module):
             self.layers.append(TransformerBlock(layer_id, params))
 
         self.norm = RMSNorm(params.dim, eps=params.norm_eps)
-        self.output = ColumnParallelLinear(
-            params.dim, params.vocab_size, bias=False, init_method=lambda x: x
+        self.output = column_linear(
+            params.dim, params.vocab_size, params.model_parallel, True
         )
 
         self.freqs_cis = precompute_freqs_cis(
             self.params.dim // self.params.n_heads, self.params.max_seq_len * 2
         )
 
+        self.kv_cache = None
+        if params.kv_block_size > 0:
+            attention = self.layers[0].attention
+            self.kv_cache = PagedKVCache(
+                n_layers=params.n_layers,
+                n_kv_heads=attention.n_local_kv_heads,
+                head_dim=attention.head_dim,
+                block_size=params.kv_block_size,
+                max_slots=params.max_batch_size,
+                max_seq_len=params.max_seq_len,
+            )
+            for layer in self.layers:
+                layer.attention.paged_cache = self.kv_cache
+
+    def release_cache(self, slots: Iterable[int]) -> None:
+        # free the KV cache blocks of finished sequences, a no-op unless paged
+        if self.kv_cache is not None:
+            for slot in slots:
+                self.kv_cache.release(slot)
+
     @torch.inference_mode()
-    def forward(self, tokens: torch.Tensor, start_pos: int):
-        _bsz, seqlen = tokens.shape
+    def forward(
+        self,
+        tokens: torch.Tensor,
+        start_pos: Union[int, torch.Tensor],
+        slots: Optional[torch.Tensor] = None,
+    ):
+        # start_pos is shared by every row, or one position per row, with slots
+        # naming the KV cache slot of each row (by default the first bsz slots)
+        bsz, seqlen = tokens.shape
         h = self.tok_embeddings(tokens)
         self.freqs_cis = self.freqs_cis.to(h.device)
-        freqs_cis = self.freqs_cis[start_pos : start_pos + seqlen]
 
-        mask = None
-        if seqlen > 1:
-            mask = torch.full(
-                (1, 1, seqlen, seqlen), float("-inf"), device=tokens.device
+        n_rep = self.layers[0].attention.n_rep
+        if isinstance(start_pos, torch.Tensor):
+            positions = start_pos[:, None] + torch.arange(seqlen, device=h.device)
+            freqs_cis = self.freqs_cis[positions]
+            # rows hold prefixes of different lengths, mask every key after each query
+            keys = torch.arange(int(positions.max()) + 1, device=h.device)
+            mask = (keys <= positions[:, :, None])[:, None, None]
+            mask = mask.expand(bsz, 1, n_rep, seqlen, len(keys)).reshape(
+                bsz, 1, n_rep * seqlen, len(keys)
+            )
+        else:
+            freqs_cis = self.freqs_cis[start_pos : start_pos + seqlen]
+            mask = None
+            if seqlen > 1:
+                mask = causal_mask(seqlen, start_pos, n_rep, h.device)
+
+        if self.kv_cache is not None:
+            self.kv_cache.prepare(
+                range(bsz) if slots is None else slots.tolist(),
+                torch.as_tensor(start_pos).reshape(-1, 1).expand(bsz, 1)
+                + torch.arange(seqlen),
             )
-            mask = torch.triu(mask, diagonal=start_pos + 1).type_as(h)
 
         for layer in self.layers:
-            h = layer(h, start_pos, freqs_cis, mask)
+            h = layer(h, start_pos, freqs_cis, mask, slots)
         h = self.norm(h)
         output = self.output(h).float()
         return output
@@ -0,0 +1,260 @@
+"""
+pygptprompt/model/llama/paged_cache.py
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+
+class PagedKVCache:
+    """
+    A KV cache paged in fixed-size blocks, shared by the attention layers of a Transformer.
+
+    Each batch slot owns a block table mapping its token positions to physical
+    blocks, which are allocated on demand as the slot's sequence grows and
+    returned to a free list when the slot is released or starts a new
+    sequence at position 0. The block storage of every layer grows by
+    doubling, so memory follows the number of live tokens instead of
+    `max_batch_size * max_seq_len`.
+
+    Full blocks of a prompt may be registered and shared by later prompts
+    with the same prefix. Shared blocks are reference counted and never
+    written again, since a sequence only writes past its matched prefix.
+
+    Args:
+        n_layers (int): The number of attention layers.
+        n_kv_heads (int): The number of key and value heads per layer.
+        head_dim (int): The dimension of each head.
+        block_size (int): The number of tokens per block.
+        max_slots (int): The number of batch slots.
+        max_seq_len (int): The maximum number of tokens per slot.
+        dtype (Optional[torch.dtype]): The dtype of the cache. Default is the dtype of the first keys written.
+
+    Attributes:
+        tables (List[List[int]]): The block table of each slot.
+
+    Properties:
+        num_blocks (int): The number of blocks in the storage of each layer.
+        used_blocks (int): The number of blocks held by at least one slot.
+        resident_bytes (int): The memory of the block storage of every layer.
+
+    Methods:
+        prepare(slots, positions): Allocate the blocks written by a forward pass.
+        update(layer_id, xk, xv): Write the new keys and values of a layer and gather its cached ones.
+        match_prefix(slot, tokens): Start a sequence from the registered blocks of its prefix.
+        register_prefix(slot, tokens): Share the full blocks of a prefilled prompt.
+        release(slot): Free the blocks of a slot.
+    """
+
+    def __init__(
+        self,
+        n_layers: int,
+        n_kv_heads: int,
+        head_dim: int,
+        block_size: int,
+        max_slots: int,
+        max_seq_len: int,
+        dtype: Optional[torch.dtype] = None,
+    ):
+        self.block_size = block_size
+        self.max_blocks = max_slots * -(-max_seq_len // block_size)
+        self.tables: List[List[int]] = [[] for _ in range(max_slots)]
+
+        self._shape = (block_size, n_kv_heads, head_dim)
+        # NOTE: Without a dtype, the storage is converted on the first update.
+        self._dtype = dtype
+        self._keys = [self._empty(0) for _ in range(n_layers)]
+        self._values = [self._empty(0) for _ in range(n_layers)]
+        self._refs: List[int] = []
+        self._free: List[int] = []
+        # NOTE: Registered blocks are keyed by the hash of every token up to their end.
+        self._prefixes: Dict[int, int] = {}
+        self._block_prefix: Dict[int, int] = {}
+
+        # The indices of the forward pass being run, see `prepare`.
+        self._table: Optional[torch.Tensor] = None
+        self._write: Tuple[torch.Tensor, torch.Tensor] = ()
+        self._end = 0
+
+    @property
+    def num_blocks(self) -> int:
+        """Get the number of blocks in the storage of each layer."""
+        return len(self._refs)
+
+    @property
+    def used_blocks(self) -> int:
+        """Get the number of blocks held by at least one slot."""
+        return len(self._refs) - len(self._free)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Get the memory of the block storage of every layer."""
+        return sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in self._keys + self._values
+        )
+
+    def prepare(self, slots: Sequence[int], positions: torch.Tensor) -> None:
+        """
+        Allocate the blocks written by a forward pass and index them for `update`.
+
+        A slot writing position 0 starts a new sequence, releasing its blocks first.
+
+        Args:
+            slots (Sequence[int]): The slot of each row.
+            positions (torch.Tensor): The positions written by each row, (bs, seqlen).
+        """
+        slots = [int(slot) for slot in slots]
+        for slot, row in zip(slots, positions.tolist()):
+            if row[0] == 0:
+                self.release(slot)
+            table = self.tables[slot]
+            while len(table) * self.block_size <= row[-1]:
+                table.append(self._allocate())
+
+        self._end = int(positions.max()) + 1
+        width = -(-self._end // self.block_size)
+        # NOTE: Shorter tables are padded with block 0, which is masked out.
+        self._table = torch.tensor(
+            [
+                self.tables[slot][:width] + [0] * (width - len(self.tables[slot]))
+                for slot in slots
+            ],
+            dtype=torch.long,
+        )
+        blocks = self._table.gather(1, positions // self.block_size)
+        self._write = (blocks, positions % self.block_size)
+
+    def update(
+        self, layer_id: int, xk: torch.Tensor, xv: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Write the new keys and values of a layer and gather its cached ones.
+
+        Args:
+            layer_id (int): The index of the attention layer.
+            xk (torch.Tensor): The new keys, (bs, seqlen, n_kv_heads, head_dim).
+            xv (torch.Tensor): The new values, (bs, seqlen, n_kv_heads, head_dim).
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: The keys and values of each row up to the last written position, (bs, end, n_kv_heads, head_dim).
+        """
+        if self._dtype is None:
+            self._dtype = xk.dtype
+            self._keys = [tensor.to(self._dtype) for tensor in self._keys]
+            self._values = [tensor.to(self._dtype) for tensor in self._values]
+
+        keys, values = self._keys[layer_id], self._values[layer_id]
+        keys[self._write] = xk.to(self._dtype)
+        values[self._write] = xv.to(self._dtype)
+        return (
+            keys[self._table].flatten(1, 2)[:, : self._end].to(xk),
+            values[self._table].flatten(1, 2)[:, : self._end].to(xv),
+        )
+
+    def match_prefix(self, slot: int, tokens: List[int]) -> int:
+        """
+        Start a new sequence in a slot from the registered blocks of its prefix.
+
+        The last token is never matched, so its logits are always computed.
+
+        Args:
+            slot (int): The slot of the sequence.
+            tokens (List[int]): The tokens of the prompt.
+
+        Returns:
+            int: The number of leading tokens already in the cache.
+        """
+        self.release(slot)
+        table = self.tables[slot]
+        prefix = None
+        for start in range(0, len(tokens) - self.block_size, self.block_size):
+            prefix = hash((prefix, tuple(tokens[start : start + self.block_size])))
+            block = self._prefixes.get(prefix)
+            if block is None:
+                break
+            self._refs[block] += 1
+            table.append(block)
+        return len(table) * self.block_size
+
+    def register_prefix(self, slot: int, tokens: List[int]) -> None:
+        """
+        Share the full blocks of a prompt that was prefilled in a slot.
+
+        Args:
+            slot (int): The slot of the sequence.
+            tokens (List[int]): The tokens of the prompt.
+        """
+        table = self.tables[slot]
+        prefix = None
+        for index in range(min(len(tokens) // self.block_size, len(table))):
+            start = index * self.block_size
+            prefix = hash((prefix, tuple(tokens[start : start + self.block_size])))
+            block = table[index]
+            if prefix not in self._prefixes and block not in self._block_prefix:
+                self._prefixes[prefix] = block
+                self._block_prefix[block] = prefix
+
+    def release(self, slot: int) -> None:
+        """
+        Free the blocks of a slot, keeping the ones still shared by other slots.
+
+        Args:
+            slot (int): The slot to release.
+        """
+        for block in self.tables[slot]:
+            self._refs[block] -= 1
+            if self._refs[block] == 0:
+                prefix = self._block_prefix.pop(block, None)
+                if prefix is not None:
+                    del self._prefixes[prefix]
+                self._free.append(block)
+        self.tables[slot] = []
+
+    def _allocate(self) -> int:
+        """
+        Get a free block, growing the storage of every layer if needed.
+
+        Returns:
+            int: The index of the block.
+
+        Raises:
+            RuntimeError: If every block is in use.
+        """
+        if not self._free:
+            if self.num_blocks >= self.max_blocks:
+                raise RuntimeError(f"All {self.max_blocks} KV cache blocks are in use")
+            self._grow(min(self.max_blocks, max(1, self.num_blocks * 2)))
+        block = self._free.pop()
+        self._refs[block] = 1
+        return block
+
+    def _grow(self, num_blocks: int) -> None:
+        """
+        Grow the block storage of every layer.
+
+        Args:
+            num_blocks (int): The new number of blocks.
+        """
+        for storage in (self._keys, self._values):
+            for layer_id, tensor in enumerate(storage):
+                grown = self._empty(num_blocks)
+                grown[: len(tensor)] = tensor
+                storage[layer_id] = grown
+        # NOTE: The lowest blocks are handed out first.
+        self._free.extend(reversed(range(self.num_blocks, num_blocks)))
+        self._refs.extend([0] * (num_blocks - self.num_blocks))
+
+    def _empty(self, num_blocks: int) -> torch.Tensor:
+        """
+        Create an empty block storage.
+
+        Args:
+            num_blocks (int): The number of blocks.
+
+        Returns:
+            torch.Tensor: The storage, (num_blocks, block_size, n_kv_heads, head_dim).
+        """
+        return torch.zeros(
+            (num_blocks, *self._shape), dtype=self._dtype or torch.get_default_dtype()
+        )
@@ -0,0 +1,404 @@
+"""
+pygptprompt/model/llama/quantize.py
+
+Weight-only quantization of the linear layers of the PyTorch Llama Transformer.
+
+Weights are stored as 8-bit integers with one scale per output channel, or
+as 4-bit integers packed two per byte with a scale and zero point per group
+of `group_size` input channels. Activations stay in floating point, so the
+layers trade a small loss of accuracy for 4 to 8 times less weight memory
+and bandwidth than float32.
+
+On the CPU, the layers run the fused int8 and int4 matrix multiplication
+kernels of torch when they are available, which take bfloat16 activations.
+Otherwise the weights are dequantized on the fly.
+"""
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Tuple
+
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+# The linear layers of the Transformer, named after their modules.
+QUANTIZED_LAYERS = ("wq", "wk", "wv", "wo", "w1", "w2", "w3", "output")
+
+# The group sizes supported by the int4 kernel.
+INT4_GROUP_SIZES = (32, 64, 128, 256)
+
+
+def _has_kernel(name: str) -> bool:
+    """
+    Check whether torch provides an aten operator.
+
+    Args:
+        name (str): The name of the operator.
+
+    Returns:
+        bool: True if the operator is available.
+    """
+    return hasattr(torch.ops.aten, name)
+
+
+def quantize_weight(
+    weight: torch.Tensor, bits: int = 8, group_size: int = 64
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Quantize the weight of a linear layer.
+
+    Args:
+        weight (torch.Tensor): The weight, (out_features, in_features).
+        bits (int): The number of bits per weight, 8 or 4. Default is 8.
+        group_size (int): The number of input channels sharing a scale for 4 bits. Default is 64.
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor]: The quantized weight and its scales. For 8 bits, the weight is int8 and
+        the scales are float32, (out_features,). For 4 bits, the weight is uint8 with two values per byte,
+        (out_features, in_features // 2), and the scales are the bfloat16 scale and zero point of each group,
+        (in_features // group_size, out_features, 2).
+
+    Raises:
+        ValueError: If bits is not 8 or 4, or the weight cannot be split in groups.
+    """
+    weight = weight.detach().float()
+    out_features, in_features = weight.shape
+
+    if bits == 8:
+        scales = weight.abs().amax(dim=1).clamp(min=1e-8) / 127
+        quantized = torch.round(weight / scales[:, None]).clamp(-127, 127)
+        return quantized.to(torch.int8), scales
+
+    if bits != 4:
+        raise ValueError(f"Expected 8 or 4 bits, got {bits}")
+    if group_size not in INT4_GROUP_SIZES or in_features % group_size:
+        raise ValueError(
+            f"Expected a group size in {INT4_GROUP_SIZES} dividing {in_features}, got {group_size}"
+        )
+
+    groups = weight.view(out_features, -1, group_size)
+    minimum = groups.amin(dim=-1, keepdim=True)
+    scale = ((groups.amax(dim=-1, keepdim=True) - minimum) / 15).clamp(min=1e-8)
+    quantized = torch.round((groups - minimum) / scale).clamp(0, 15).to(torch.uint8)
+    quantized = quantized.view(out_features, in_features)
+    # NOTE: A value q dequantizes to (q - 8) * scale + zero, as in the int4 kernel.
+    zero = minimum + 8 * scale
+    scales = torch.cat([scale, zero], dim=-1).transpose(0, 1).to(torch.bfloat16)
+    return quantized[:, ::2] | (quantized[:, 1::2] << 4), scales.contiguous()
+
+
+def dequantize_weight(
+    weight: torch.Tensor, scales: torch.Tensor, bits: int = 8
+) -> torch.Tensor:
+    """
+    Dequantize the weight of a linear layer, see `quantize_weight`.
+
+    Args:
+        weight (torch.Tensor): The quantized weight.
+        scales (torch.Tensor): Its scales.
+        bits (int): The number of bits per weight, 8 or 4. Default is 8.
+
+    Returns:
+        torch.Tensor: The float32 weight, (out_features, in_features).
+    """
+    if bits == 8:
+        return weight.float() * scales.float()[:, None]
+
+    quantized = torch.stack([weight & 0xF, weight >> 4], dim=-1)
+    quantized = quantized.view(weight.shape[0], scales.shape[0], -1).float() - 8
+    scale, zero = scales.float().transpose(0, 1).unbind(-1)
+    return (quantized * scale[..., None] + zero[..., None]).flatten(1)
+
+
+def _pack_int4(weight: torch.Tensor) -> torch.Tensor:
+    """
+    Convert a 4-bit weight to the layout of the int4 kernel.
+
+    Args:
+        weight (torch.Tensor): The uint8 weight with two values per byte, (out_features, in_features // 2).
+
+    Returns:
+        torch.Tensor: The packed weight, specific to the version of torch and the device.
+    """
+    in_features = weight.shape[1] * 2
+    inner_k_tiles = next(
+        tiles for tiles in (8, 4, 2) if in_features % (tiles * 16) == 0
+    )
+    quantized = torch.stack([weight & 0xF, weight >> 4], dim=-1).flatten(1)
+    try:
+        return torch.ops.aten._convert_weight_to_int4pack(
+            quantized.to(torch.int32), inner_k_tiles
+        )
+    except RuntimeError:
+        # newer versions of torch take two values per byte, high nibble first
+        packed = (quantized[:, ::2] << 4) | quantized[:, 1::2]
+        return torch.ops.aten._convert_weight_to_int4pack(packed, inner_k_tiles)
+
+
+class QuantizedLinear(nn.Module):
+    """
+    A linear layer without bias whose weight is quantized, see `quantize_weight`.
+
+    The layer replaces a `ColumnParallelLinear`, `RowParallelLinear` or `nn.Linear`
+    of a single process, so it holds the full weight.
+
+    Args:
+        in_features (int): The number of input channels.
+        out_features (int): The number of output channels.
+        bits (int): The number of bits per weight, 8 or 4. Default is 8.
+        group_size (int): The number of input channels sharing a scale for 4 bits. Default is 64.
+
+    Attributes:
+        weight (torch.Tensor): The quantized weight buffer.
+        scales (torch.Tensor): The scales buffer.
+        packed (bool): Whether the 4-bit weight is in the layout of the int4 kernel.
+
+    Methods:
+        from_float(linear, bits, group_size): Quantize a floating point linear layer.
+        forward(x): Multiply the input by the transposed weight.
+    """
+
+    def __init__(
+        self, in_features: int, out_features: int, bits: int = 8, group_size: int = 64
+    ):
+        super().__init__()
+        if bits not in (8, 4):
+            raise ValueError(f"Expected 8 or 4 bits, got {bits}")
+        self.in_features = in_features
+        self.out_features = out_features
+        self.bits = bits
+        self.group_size = group_size
+        self.packed = False
+
+        if bits == 8:
+            weight = torch.empty((out_features, in_features), dtype=torch.int8)
+            scales = torch.empty(out_features)
+        else:
+            weight = torch.empty((out_features, in_features // 2), dtype=torch.uint8)
+            scales = torch.empty(
+                (in_features // group_size, out_features, 2), dtype=torch.bfloat16
+            )
+        self.register_buffer("weight", weight)
+        self.register_buffer("scales", scales)
+
+    @classmethod
+    def from_float(
+        cls, linear: nn.Module, bits: int = 8, group_size: int = 64
+    ) -> "QuantizedLinear":
+        """
+        Quantize a floating point linear layer without bias.
+
+        Args:
+            linear (nn.Module): The layer, holding its full weight.
+            bits (int): The number of bits per weight, 8 or 4. Default is 8.
+            group_size (int): The number of input channels sharing a scale for 4 bits. Default is 64.
+
+        Returns:
+            QuantizedLinear: The quantized layer.
+        """
+        out_features, in_features = linear.weight.shape
+        layer = cls(in_features, out_features, bits, group_size)
+        layer.weight, layer.scales = quantize_weight(linear.weight, bits, group_size)
+        layer._pack()
+        return layer
+
+    def _pack(self) -> None:
+        """Convert a 4-bit weight to the layout of the int4 kernel if the kernel supports it."""
+        if (
+            self.bits == 4
+            and not self.packed
+            and self.weight.device.type == "cpu"
+            # NOTE: The CPU kernel needs whole tiles of 16 output and 32 input channels.
+            and self.out_features % 16 == 0
+            and self.in_features % 32 == 0
+            and _has_kernel("_weight_int4pack_mm")
+        ):
+            self.weight = _pack_int4(self.weight)
+            self.packed = True
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # a state dict may hold the portable 4-bit weight or the packed one
+        weight = state_dict.get(prefix + "weight")
+        if self.bits == 4 and weight is not None:
+            if weight.dtype == torch.uint8 and self.packed:
+                self.weight = torch.empty_like(weight)
+                self.packed = False
+            elif weight.dtype != torch.uint8 and not self.packed:
+                self.weight = torch.empty_like(weight)
+                self.packed = True
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+        self._pack()
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Multiply the input by the transposed weight.
+
+        Args:
+            x (torch.Tensor): The input, (..., in_features).
+
+        Returns:
+            torch.Tensor: The output, (..., out_features), in the dtype of the input.
+        """
+        shape = x.shape[:-1] + (self.out_features,)
+        if self.bits == 4 and self.packed:
+            output = torch.ops.aten._weight_int4pack_mm(
+                x.reshape(-1, self.in_features).to(torch.bfloat16),
+                self.weight,
+                self.group_size,
+                self.scales,
+            )
+            return output.to(x.dtype).view(shape)
+        if (
+            self.bits == 8
+            and self.weight.device.type == "cpu"
+            and _has_kernel("_weight_int8pack_mm")
+        ):
+            output = torch.ops.aten._weight_int8pack_mm(
+                x.reshape(-1, self.in_features).to(torch.bfloat16),
+                self.weight,
+                self.scales.to(torch.bfloat16),
+            )
+            return output.to(x.dtype).view(shape)
+        if self.bits == 8:
+            return F.linear(x, self.weight.to(x.dtype)) * self.scales.to(x.dtype)
+        weight = dequantize_weight(self.weight, self.scales, self.bits)
+        return F.linear(x, weight.to(x.dtype))
+
+    def extra_repr(self) -> str:
+        return (
+            f"in_features={self.in_features}, out_features={self.out_features}, "
+            f"bits={self.bits}, group_size={self.group_size}"
+        )
+
+
+def _replace_layers(
+    model: nn.Module, bits: int, group_size: int, quantize: bool
+) -> nn.Module:
+    """
+    Replace the linear layers of a Transformer with quantized layers.
+
+    Args:
+        model (nn.Module): The Transformer.
+        bits (int): The number of bits per weight, 8 or 4.
+        group_size (int): The number of input channels sharing a scale for 4 bits.
+        quantize (bool): Whether to quantize the current weights, or leave the layers empty for loading.
+
+    Returns:
+        nn.Module: The Transformer, modified in place.
+    """
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if name not in QUANTIZED_LAYERS or isinstance(child, QuantizedLinear):
+                continue
+            if quantize:
+                layer = QuantizedLinear.from_float(child, bits, group_size)
+            else:
+                out_features, in_features = child.weight.shape
+                layer = QuantizedLinear(in_features, out_features, bits, group_size)
+            setattr(module, name, layer)
+    return model
+
+
+def quantize_model(model: nn.Module, bits: int = 8, group_size: int = 64) -> nn.Module:
+    """
+    Quantize the linear layers of a Transformer in place.
+
+    Args:
+        model (nn.Module): The Transformer, in a single process.
+        bits (int): The number of bits per weight, 8 or 4. Default is 8.
+        group_size (int): The number of input channels sharing a scale for 4 bits. Default is 64.
+
+    Returns:
+        nn.Module: The quantized Transformer.
+    """
+    return _replace_layers(model, bits, group_size, quantize=True)
+
+
+def prepare_model(model: nn.Module, bits: int = 8, group_size: int = 64) -> nn.Module:
+    """
+    Replace the linear layers of a Transformer with empty quantized layers, to load a quantized state dict into.
+
+    The floating point weights of the replaced layers are released, so a
+    Transformer whose weights were never initialized never holds them.
+
+    Args:
+        model (nn.Module): The Transformer, in a single process.
+        bits (int): The number of bits per weight, 8 or 4. Default is 8.
+        group_size (int): The number of input channels sharing a scale for 4 bits. Default is 64.
+
+    Returns:
+        nn.Module: The Transformer, modified in place.
+    """
+    return _replace_layers(model, bits, group_size, quantize=False)
+
+
+def quantize_state_dict(
+    state_dict: Dict[str, torch.Tensor], bits: int = 8, group_size: int = 64
+) -> Dict[str, torch.Tensor]:
+    """
+    Quantize the linear weights of a Transformer checkpoint in place.
+
+    Each weight is released as soon as it is quantized, so the peak memory
+    stays close to the size of the checkpoint.
+
+    Args:
+        state_dict (Dict[str, torch.Tensor]): The checkpoint of a single process.
+        bits (int): The number of bits per weight, 8 or 4. Default is 8.
+        group_size (int): The number of input channels sharing a scale for 4 bits. Default is 64.
+
+    Returns:
+        Dict[str, torch.Tensor]: The checkpoint, with a `scales` entry next to each quantized weight.
+    """
+    for key in list(state_dict):
+        parts = key.split(".")
+        if parts[-1] != "weight" or len(parts) < 2 or parts[-2] not in QUANTIZED_LAYERS:
+            continue
+        weight, scales = quantize_weight(state_dict.pop(key), bits, group_size)
+        state_dict[key] = weight
+        state_dict[key[: -len("weight")] + "scales"] = scales
+    return state_dict
+
+
+def quantize_checkpoint(
+    ckpt_dir: str, output_dir: str, bits: int = 8, group_size: int = 64
+) -> bool:
+    """
+    Write a quantized copy of a single process Llama checkpoint.
+
+    The `params.json` of the copy records the quantization, which
+    `Llama.build` reads to load the checkpoint without quantizing it again.
+
+    Args:
+        ckpt_dir (str): The directory of the checkpoint.
+        output_dir (str): The directory of the quantized checkpoint.
+        bits (int): The number of bits per weight, 8 or 4. Default is 8.
+        group_size (int): The number of input channels sharing a scale for 4 bits. Default is 64.
+
+    Returns:
+        bool: True if the checkpoint was written, False otherwise.
+    """
+    checkpoints = sorted(Path(ckpt_dir).glob("*.pth"))
+    if len(checkpoints) != 1:
+        print(f"Expected one checkpoint file in {ckpt_dir}, got {len(checkpoints)}")
+        return False
+
+    with open(Path(ckpt_dir) / "params.json", "r") as f:
+        params = json.loads(f.read())
+    if "quantization" in params:
+        print(f"The checkpoint in {ckpt_dir} is already quantized")
+        return False
+
+    state_dict = torch.load(checkpoints[0], map_location="cpu")
+    quantize_state_dict(state_dict, bits, group_size)
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    torch.save(state_dict, output / checkpoints[0].name)
+    params["quantization"] = {"bits": bits, "group_size": group_size}
+    with open(output / "params.json", "w") as f:
+        json.dump(params, f, indent=2)
+    tokenizer = Path(ckpt_dir) / "tokenizer.model"
+    if tokenizer.exists():
+        shutil.copy(tokenizer, output / tokenizer.name)
+    return True
@@ -0,0 +1,278 @@
+"""
+pygptprompt/model/llama/scheduler.py
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, TypedDict
+
+import torch
+
+from pygptprompt.model.llama.generation import Llama, sample_top_p
+
+
+@dataclass
+class GenerationRequest:
+    """
+    A prompt decoded by the continuous batching scheduler.
+
+    Attributes:
+        request_id (int): The identifier of the request.
+        prompt_tokens (List[int]): The tokens of the prompt.
+        max_gen_len (int): The maximum number of generated tokens.
+        temperature (float): The sampling temperature, 0 for greedy decoding.
+        top_p (float): The top-p probability threshold for sampling.
+        tokens (List[int]): The generated tokens, excluding the eos token.
+        finished (bool): Whether the request has been retired.
+        slot (Optional[int]): The KV cache slot of the request while it is decoded.
+        position (int): The number of tokens of the request in its KV cache slot.
+    """
+
+    request_id: int
+    prompt_tokens: List[int]
+    max_gen_len: int
+    temperature: float = 0.6
+    top_p: float = 0.9
+    tokens: List[int] = field(default_factory=list)
+    finished: bool = False
+    slot: Optional[int] = None
+    position: int = 0
+
+
+class BatchStats(TypedDict):
+    """
+    Represents the throughput of the continuous batching scheduler.
+
+    Attributes:
+        - requests: The number of retired requests.
+        - generated: The number of generated tokens.
+        - steps: The number of decode steps.
+        - seconds: The number of seconds spent prefilling and decoding.
+        - tokens_per_second: The aggregate number of generated tokens per second.
+    """
+
+    requests: int
+    generated: int
+    steps: int
+    seconds: float
+    tokens_per_second: float
+
+
+class ContinuousBatchScheduler:
+    """
+    Decodes requests in flight, sharing the KV cache slots of a Llama model.
+
+    Each of the model's `max_batch_size` cache slots holds one request. Waiting
+    requests are admitted into free slots between decode steps and prefilled
+    on their own, and every active request then advances by one token per
+    step from its own cache position. A request is retired as soon as it
+    generates the eos token or reaches its `max_gen_len`, freeing its slot for
+    the next waiting request, so finished rows cost no compute and new
+    requests need not wait for the batch to drain. With a paged KV cache,
+    prompts sharing a prefix with a prompt in flight skip prefilling the
+    shared blocks.
+
+    The scheduler and `Llama.generate` write to the same KV cache, so they
+    must not decode at the same time.
+
+    Args:
+        llama (Llama): The model and tokenizer to decode with.
+
+    Attributes:
+        waiting (Deque[GenerationRequest]): The requests waiting for a free slot.
+        active (Dict[int, GenerationRequest]): The requests being decoded by slot.
+
+    Properties:
+        stats (BatchStats): The throughput of the scheduler so far.
+
+    Methods:
+        submit(prompt_tokens, max_gen_len, temperature, top_p): Queue a prompt for decoding.
+        step(): Admit waiting requests and decode one token of every active request.
+        stream(): Decode until no request is left, yielding each token as it is generated.
+    """
+
+    def __init__(self, llama: Llama):
+        self.model = llama.model
+        self.tokenizer = llama.tokenizer
+        self.waiting: Deque[GenerationRequest] = deque()
+        self.active: Dict[int, GenerationRequest] = {}
+        self._free_slots = list(range(self.model.params.max_batch_size))
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._retired = 0
+        self._generated = 0
+        self._steps = 0
+        self._seconds = 0.0
+
+    @property
+    def stats(self) -> BatchStats:
+        """Get the throughput of the scheduler so far."""
+        return BatchStats(
+            requests=self._retired,
+            generated=self._generated,
+            steps=self._steps,
+            seconds=self._seconds,
+            tokens_per_second=self._generated / self._seconds if self._seconds else 0.0,
+        )
+
+    def submit(
+        self,
+        prompt_tokens: List[int],
+        max_gen_len: int,
+        temperature: float = 0.6,
+        top_p: float = 0.9,
+    ) -> GenerationRequest:
+        """
+        Queue a prompt for decoding. It is safe to call while another thread streams.
+
+        Args:
+            prompt_tokens (List[int]): The tokens of the prompt.
+            max_gen_len (int): The maximum number of generated tokens.
+            temperature (float): The sampling temperature, 0 for greedy decoding. Default is 0.6.
+            top_p (float): The top-p probability threshold for sampling. Default is 0.9.
+
+        Returns:
+            GenerationRequest: The queued request.
+
+        Raises:
+            ValueError: If the prompt is empty or does not fit the KV cache, or max_gen_len is not positive.
+        """
+        if max_gen_len < 1:
+            raise ValueError(f"Expected a positive max_gen_len, got {max_gen_len}")
+        if not 0 < len(prompt_tokens) < self.model.params.max_seq_len:
+            raise ValueError(
+                f"Expected a prompt of 1 to {self.model.params.max_seq_len - 1} tokens, "
+                f"got {len(prompt_tokens)}"
+            )
+        with self._lock:
+            request = GenerationRequest(
+                request_id=self._next_id,
+                prompt_tokens=list(prompt_tokens),
+                max_gen_len=max_gen_len,
+                temperature=temperature,
+                top_p=top_p,
+            )
+            self._next_id += 1
+            self.waiting.append(request)
+        return request
+
+    @torch.inference_mode()
+    def step(self) -> List[Tuple[GenerationRequest, int]]:
+        """
+        Admit waiting requests into free slots and decode one token of every active request.
+
+        Returns:
+            List[Tuple[GenerationRequest, int]]: Each request and the token it generated, including eos.
+        """
+        start = time.perf_counter()
+        events = self._admit()
+
+        # NOTE: Requests admitted this step already sampled their first token.
+        admitted = {id(request) for request, _ in events}
+        decoding = [
+            request for request in self.active.values() if id(request) not in admitted
+        ]
+        if decoding:
+            tokens = torch.tensor(
+                [[request.tokens[-1]] for request in decoding], dtype=torch.long
+            )
+            positions = torch.tensor(
+                [request.position for request in decoding], dtype=torch.long
+            )
+            slots = torch.tensor(
+                [request.slot for request in decoding], dtype=torch.long
+            )
+            logits = self.model.forward(tokens, positions, slots)[:, -1]
+            for request, row in zip(decoding, logits):
+                request.position += 1
+                events.append((request, self._sample(request, row)))
+            self._steps += 1
+
+        for request, token in events:
+            self._advance(request, token)
+        self._seconds += time.perf_counter() - start
+        return events
+
+    def stream(self) -> Iterator[Tuple[GenerationRequest, int]]:
+        """
+        Decode until no request is left, yielding each token as it is generated.
+
+        Yields:
+            Tuple[GenerationRequest, int]: A request and its next token. The eos token is not yielded.
+        """
+        while self.waiting or self.active:
+            for request, token in self.step():
+                if token != self.tokenizer.eos_id:
+                    yield request, token
+
+    def _admit(self) -> List[Tuple[GenerationRequest, int]]:
+        """
+        Prefill waiting requests into free slots and sample their first token.
+
+        Returns:
+            List[Tuple[GenerationRequest, int]]: Each admitted request and its first token.
+        """
+        events = []
+        while self._free_slots:
+            with self._lock:
+                if not self.waiting:
+                    break
+                request = self.waiting.popleft()
+            request.slot = self._free_slots.pop()
+            self.active[request.slot] = request
+
+            # NOTE: A paged KV cache skips the blocks shared with earlier prompts.
+            cached = 0
+            if self.model.kv_cache is not None:
+                cached = self.model.kv_cache.match_prefix(
+                    request.slot, request.prompt_tokens
+                )
+            tokens = torch.tensor([request.prompt_tokens[cached:]], dtype=torch.long)
+            slots = torch.tensor([request.slot], dtype=torch.long)
+            logits = self.model.forward(tokens, cached, slots)[0, -1]
+            if self.model.kv_cache is not None:
+                self.model.kv_cache.register_prefix(request.slot, request.prompt_tokens)
+            request.position = len(request.prompt_tokens)
+            events.append((request, self._sample(request, logits)))
+        return events
+
+    def _sample(self, request: GenerationRequest, logits: torch.Tensor) -> int:
+        """
+        Sample the next token of a request.
+
+        Args:
+            request (GenerationRequest): The request being decoded.
+            logits (torch.Tensor): The logits of its next token.
+
+        Returns:
+            int: The next token.
+        """
+        if request.temperature > 0:
+            probs = torch.softmax(logits[None] / request.temperature, dim=-1)
+            return int(sample_top_p(probs, request.top_p))
+        return int(torch.argmax(logits))
+
+    def _advance(self, request: GenerationRequest, token: int) -> None:
+        """
+        Append a generated token to a request and retire the request once it is done.
+
+        Args:
+            request (GenerationRequest): The request being decoded.
+            token (int): Its generated token.
+        """
+        if token != self.tokenizer.eos_id:
+            request.tokens.append(token)
+            self._generated += 1
+        if (
+            token == self.tokenizer.eos_id
+            or len(request.tokens) >= request.max_gen_len
+            # NOTE: The next token would not fit the KV cache slot.
+            or request.position >= self.model.params.max_seq_len
+        ):
+            request.finished = True
+            self.model.release_cache([request.slot])
+            del self.active[request.slot]
+            self._free_slots.append(request.slot)
+            request.slot = None
+            self._retired += 1
@@ -2,10 +2,27 @@
 pygptprompt/model/llama_cpp.py
 """
 
+import gc
+import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Any, Dict, Iterator, List, Tuple, Union
+from queue import Queue
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import llama_cpp
+import numpy as np
 from huggingface_hub import hf_hub_download
 from huggingface_hub.hf_api import HfApi
 from huggingface_hub.utils import (
@@ -15,9 +32,6 @@ from huggingface_hub.utils import (
 )
 from llama_cpp import ChatCompletionChunk, Llama
 from rich.console import Console
-from rich.live import Live
-from rich.markdown import Markdown
-from rich.panel import Panel
 
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import (
@@ -25,10 +39,17 @@ from pygptprompt.model.base import (
     ChatModelEmbedding,
     ChatModelEncoding,
     ChatModelResponse,
+    ChatModelResult,
     ChatModelTextCompletion,
     DeltaContent,
     FunctionCall,
 )
+from pygptprompt.model.embedding import EmbeddingScheduler
+from pygptprompt.model.prompt_cache import (
+    PersistentPrefixStateCache,
+    PrefixStateCache,
+)
+from pygptprompt.model.render import StreamRenderer
 
 
 # NOTE: llama-cpp-python is now out of sync with
@@ -46,11 +67,16 @@ class LlamaCppModel(ChatModel):
         filename (str): The name of the model file.
         cache_dir (str): The directory to cache the downloaded model.
         model_path (str): The path to the downloaded model file.
-        model (Llama): The Llama language model instance.
+        model (Llama): The Llama language model instance, loaded on first use.
+        lock (threading.RLock): Serializes access to the model's evaluation context and the creation of batch contexts.
+        prompt_cache (Optional[PrefixStateCache]): The cache of evaluated prompt states, if enabled.
     """
 
     def __init__(self, config: ConfigurationManager):
         self.config = config
+        # NOTE: The llama.cpp context is not thread-safe. Embeddings may be
+        # generated by a background thread, e.g. the EmbeddingQueue.
+        self.lock = threading.RLock()
         self.logger = config.get_logger("general", self.__class__.__name__)
         self.repo_id = config.get_value(
             "llama_cpp.model.repo_id", "TheBloke/Llama-2-7B-Chat-GGML"
@@ -60,32 +86,18 @@ class LlamaCppModel(ChatModel):
         )
         self.cache_dir = Path(Path.home(), ".cache", "huggingface", "hub")
         self.model_path = self._discover_model()
-        self.model = Llama(
-            model_path=self.model_path,
-            n_ctx=config.get_value("llama_cpp.model.n_ctx", 4096),
-            n_batch=config.get_value("llama_cpp.model.n_batch", 512),
-            n_gpu_layers=config.get_value("llama_cpp.model.n_gpu_layers", 0),
-            low_vram=config.get_value("llama_cpp.model.low_vram", False),
-            chat_format=config.get_value("llama_cpp.model.chat_format", "llama-2"),
-            verbose=config.get_value("llama_cpp.model.verbose", False),
-            n_parts=config.get_value("llama_cpp.model.n_parts", -1),
-            seed=config.get_value("llama_cpp.model.seed", 1337),
-            f16_kv=config.get_value("llama_cpp.model.f16_kv", True),
-            logits_all=config.get_value("llama_cpp.model.logits_all", False),
-            vocab_only=config.get_value("llama_cpp.model.vocab_only", False),
-            use_mmap=config.get_value("llama_cpp.model.use_mmap", True),
-            use_mlock=config.get_value("llama_cpp.model.use_mlock", False),
-            embedding=config.get_value("llama_cpp.model.embedding", True),
-            n_threads=config.get_value("llama_cpp.model.n_threads", None),
-            last_n_tokens_size=config.get_value(
-                "llama_cpp.model.last_n_tokens_size", 64
-            ),
-            lora_base=config.get_value("llama_cpp.model.lora_base", None),
-            lora_path=config.get_value("llama_cpp.model.lora_path", None),
-            tensor_split=config.get_value("llama_cpp.model.tensor_split", None),
-            rope_freq_base=config.get_value("llama_cpp.model.rope_freq_base", 10000.0),
-            rope_freq_scale=config.get_value("llama_cpp.model.rope_freq_scale", 1.0),
-        )
+        # NOTE: The weights are loaded on first use and may be unloaded by a ModelPool.
+        self._model: Optional[Llama] = None
+        # NOTE: Llama reuses the cached state sharing the longest prefix with
+        # each prompt, e.g. the system prompt after the context window evicts
+        # a message, or the whole conversation after an embedding reset the context.
+        self.prompt_cache = self._create_prompt_cache()
+        # NOTE: Additional contexts for batches are created on first use. Every
+        # context, including the model's own, is checked out of one queue.
+        self._batch_contexts: List[Llama] = []
+        self._contexts: Queue = Queue()
+        self._contexts_lock = threading.Lock()
+        self._checked_out = 0
 
         self.console = Console(
             color_system=self.config.get_value(
@@ -94,6 +106,182 @@ class LlamaCppModel(ChatModel):
             ),
         )
 
+    def _create_llama(self) -> Llama:
+        """
+        Creates a Llama evaluation context for the model file.
+
+        Contexts created from the same memory-mapped file share its weights.
+
+        Returns:
+            Llama: The Llama language model instance.
+        """
+        return Llama(
+            model_path=self.model_path,
+            n_ctx=self.config.get_value("llama_cpp.model.n_ctx", 4096),
+            n_batch=self.config.get_value("llama_cpp.model.n_batch", 512),
+            n_gpu_layers=self.config.get_value("llama_cpp.model.n_gpu_layers", 0),
+            low_vram=self.config.get_value("llama_cpp.model.low_vram", False),
+            chat_format=self.config.get_value("llama_cpp.model.chat_format", "llama-2"),
+            verbose=self.config.get_value("llama_cpp.model.verbose", False),
+            n_parts=self.config.get_value("llama_cpp.model.n_parts", -1),
+            seed=self.config.get_value("llama_cpp.model.seed", 1337),
+            f16_kv=self.config.get_value("llama_cpp.model.f16_kv", True),
+            logits_all=self.config.get_value("llama_cpp.model.logits_all", False),
+            vocab_only=self.config.get_value("llama_cpp.model.vocab_only", False),
+            use_mmap=self.config.get_value("llama_cpp.model.use_mmap", True),
+            use_mlock=self.config.get_value("llama_cpp.model.use_mlock", False),
+            embedding=self.config.get_value("llama_cpp.model.embedding", True),
+            n_threads=self.config.get_value("llama_cpp.model.n_threads", None),
+            last_n_tokens_size=self.config.get_value(
+                "llama_cpp.model.last_n_tokens_size", 64
+            ),
+            lora_base=self.config.get_value("llama_cpp.model.lora_base", None),
+            lora_path=self.config.get_value("llama_cpp.model.lora_path", None),
+            tensor_split=self.config.get_value("llama_cpp.model.tensor_split", None),
+            rope_freq_base=self.config.get_value(
+                "llama_cpp.model.rope_freq_base", 10000.0
+            ),
+            rope_freq_scale=self.config.get_value(
+                "llama_cpp.model.rope_freq_scale", 1.0
+            ),
+        )
+
+    @property
+    def model(self) -> Llama:
+        """
+        Get the Llama language model instance, loading its weights if needed.
+
+        Returns:
+            Llama: The Llama language model instance.
+
+        Raises:
+            RuntimeError: If the weights fail to load.
+        """
+        self.last_used = time.monotonic()
+        if self._model is None and not self.load():
+            raise RuntimeError(f"Failed to load model {self.model_path}")
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Check whether the model's weights are resident.
+
+        Returns:
+            bool: True if the weights are resident.
+        """
+        return self._model is not None
+
+    @property
+    def resident_bytes(self) -> int:
+        """
+        Get the approximate memory held by the weights and the evaluation contexts.
+
+        The memory-mapped weights are counted once, since every context shares them.
+
+        Returns:
+            int: The number of resident bytes.
+        """
+        model = self._model
+        if model is None:
+            return 0
+        contexts = [model] + list(self._batch_contexts)
+        return os.path.getsize(self.model_path) + sum(
+            llama_cpp.llama_get_state_size(context._ctx.ctx) for context in contexts
+        )
+
+    def load(self) -> bool:
+        """
+        Load the model's weights into an evaluation context.
+
+        Returns:
+            bool: True if the weights are resident, False otherwise.
+        """
+        with self.lock:
+            if self._model is not None:
+                return True
+            start = time.perf_counter()
+            try:
+                model = self._create_llama()
+            except Exception as e:
+                self.logger.error(f"Error loading model {self.model_path}: {e}")
+                return False
+            if self.prompt_cache is not None:
+                model.set_cache(self.prompt_cache)
+            with self._contexts_lock:
+                self._model = model
+                self._contexts = Queue()
+                for context in [model] + self._batch_contexts:
+                    self._contexts.put(context)
+            seconds = time.perf_counter() - start
+
+        self.logger.info("Loaded %s in %.2fs", self.model_path, seconds)
+        # NOTE: Listeners are notified without holding the lock.
+        if self.on_event:
+            self.on_event("load", seconds)
+        return True
+
+    def unload(self) -> bool:
+        """
+        Release the model's weights and evaluation contexts.
+
+        The prompt cache is kept, so the next load resumes cached prompts. The
+        weights are kept while any context is checked out, e.g. by a batch.
+
+        Returns:
+            bool: True if the weights were released, False otherwise.
+        """
+        with self.lock:
+            if self._model is None:
+                return False
+            start = time.perf_counter()
+            with self._contexts_lock:
+                if self._checked_out:
+                    self.logger.debug("Kept %s for a running batch", self.model_path)
+                    return False
+                # NOTE: The contexts are freed once the last reference is dropped.
+                self._model = None
+                self._batch_contexts = []
+                self._contexts = Queue()
+            gc.collect()
+            seconds = time.perf_counter() - start
+
+        self.logger.info("Unloaded %s in %.2fs", self.model_path, seconds)
+        if self.on_event:
+            self.on_event("unload", seconds)
+        return True
+
+    def _create_prompt_cache(self) -> Optional[PrefixStateCache]:
+        """
+        Creates the prompt state cache bounded by `llama_cpp.cache.capacity_bytes`.
+
+        The "disk" cache type (default) also persists session states to `app.cache`,
+        bounded by `llama_cpp.cache.disk_capacity_bytes`. The "ram" type keeps
+        them in memory only.
+
+        Returns:
+            Optional[PrefixStateCache]: The prompt state cache, or None if it is disabled.
+        """
+        # NOTE: False values fall back to the default, so the cache is opted out of.
+        if self.config.get_value("llama_cpp.cache.disabled", False):
+            return None
+        capacity_bytes = self.config.get_value(
+            "llama_cpp.cache.capacity_bytes", 2 << 30
+        )
+        cache_type = self.config.get_value("llama_cpp.cache.type", "disk")
+        # NOTE: Only the logits of the last token are persisted.
+        logits_all = self.config.get_value("llama_cpp.model.logits_all", False)
+        if cache_type == "disk" and not logits_all:
+            return PersistentPrefixStateCache(
+                directory=self.config.evaluate_path("app.cache"),
+                capacity_bytes=capacity_bytes,
+                disk_capacity_bytes=self.config.get_value(
+                    "llama_cpp.cache.disk_capacity_bytes", 4 << 30
+                ),
+                logger=self.logger,
+            )
+        return PrefixStateCache(capacity_bytes=capacity_bytes)
+
     def _discover_model(self) -> str:
         """
         Discovers the model path based on configuration or downloads it if necessary.
@@ -170,9 +358,6 @@ class LlamaCppModel(ChatModel):
         Returns:
             str: The updated content after appending the new token.
         """
-        self.logger.debug("Entering _extract_content method.")
-        self.logger.debug(f"Initial delta: {delta}, content: {content}")
-
         if delta and "content" in delta and delta["content"]:
             token = delta["content"]
             content += token
@@ -196,13 +381,6 @@ class LlamaCppModel(ChatModel):
         Returns:
             Tuple[str, str]: A tuple containing the updated function call name and arguments.
         """
-        self.logger.debug("Entering _extract_function_call method.")
-        self.logger.debug(
-            f"Initial delta: {delta}, "
-            f"function_call_name: {function_call_name}, "
-            f"function_call_args: {function_call_args}, "
-        )
-
         if delta and "function_call" in delta and delta["function_call"]:
             function_call = delta["function_call"]
             if not function_call_name:
@@ -229,14 +407,6 @@ class LlamaCppModel(ChatModel):
         Returns:
             ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
         """
-        self.logger.debug("Entering _handle_finish_reason method.")
-        self.logger.debug(
-            f"Initial finish_reason: {finish_reason}, "
-            f"function_call_name: {function_call_name}, "
-            f"function_call_args: {function_call_args}, "
-            f"content: {content}"
-        )
-
         if finish_reason:
             if finish_reason == "function_call":
                 return ChatModelResponse(
@@ -254,13 +424,16 @@ class LlamaCppModel(ChatModel):
                 raise ValueError(f"Warning: Unexpected finish_reason '{finish_reason}'")
 
     def _stream_chat_completion(
-        self, response_generator: Iterator[ChatCompletionChunk]
+        self,
+        response_generator: Iterator[ChatCompletionChunk],
+        headless: bool = False,
     ) -> ChatModelResponse:
         """
         Streams the chat completion response and handles the content and function call information.
 
         Args:
             response_generator (Iterator[ChatCompletionChunk]): An iterator of ChatCompletionChunk objects.
+            headless (bool): Whether to skip rendering. Default is False.
 
         Returns:
             ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
@@ -269,31 +442,26 @@ class LlamaCppModel(ChatModel):
         function_call_args = ""
         content = ""
 
-        self.logger.debug("Entering _stream_chat_completion method.")
-        self.logger.debug(
-            f"Initial function_call_name: {function_call_name}, function_call_args: {function_call_args}, content: {content}"
+        renderer = StreamRenderer(
+            console=self.console,
+            title=self.config.get_value("llama_cpp.provider"),
+            config=self.config,
+            headless=headless,
+            logger=self.logger,
         )
 
-        with Live(console=self.console) as stream:
+        with renderer:
             for chunk in response_generator:
-                self.logger.debug(f"Processing chunk: {chunk}")
-
                 delta = chunk["choices"][0]["delta"]
-                self.logger.debug(f"Extracted delta: {delta}")
+                # NOTE: Arguments are only formatted if DEBUG is enabled.
+                self.logger.debug("Extracted delta: %s", delta)
 
                 content = self._extract_content(delta, content)
                 function_call_name, function_call_args = self._extract_function_call(
                     delta, function_call_name, function_call_args
                 )
 
-                self.logger.debug(f"Current content: {content}")
-                self.logger.debug(
-                    f"Current function_call_name: {function_call_name}, function_call_args: {function_call_args}"
-                )
-
                 finish_reason = chunk["choices"][0]["finish_reason"]
-                self.logger.debug(f"Finish reason: {finish_reason}")
-
                 message = self._handle_finish_reason(
                     finish_reason,
                     function_call_name,
@@ -301,29 +469,14 @@ class LlamaCppModel(ChatModel):
                     content,
                 )
 
-                self.logger.debug(f"Generated message: {message}")
-
-                panel = Panel(
-                    Markdown(content),
-                    title=self.config.get_value("llama_cpp.provider"),
-                    title_align=self.config.get_value(
-                        "app.ui.rich.panel.title_align",
-                        "left",
-                    ),
-                    border_style=self.config.get_value(
-                        "app.ui.rich.panel.border_color",
-                        "none",
-                    ),
-                )
-                stream.update(panel, refresh=True)
+                renderer.update(content)
 
                 if message:  # NOTE: Exit early if a finish reason is given.
-                    self.logger.debug(f"Returning message: {message}")
+                    self.logger.debug("Finish reason: %s", finish_reason)
                     return message
 
         # NOTE: The finish reason should be present.
         # If the finish reason vanishes, then something unexpected happened.
-        self.logger.debug(f"Generated content: {content}")
         self.logger.debug("Exiting _stream_chat_completion without a finish_reason.")
         # NOTE: There is no message, but content is always generated.
         # Return the generated content even though no finish reason was given.
@@ -339,13 +492,14 @@ class LlamaCppModel(ChatModel):
         raise NotImplementedError
 
     def get_chat_completion(
-        self, messages: List[ChatModelResponse]
+        self, messages: List[ChatModelResponse], headless: bool = False
     ) -> ChatModelResponse:
         """
         Generate chat completions using the Llama language model.
 
         Args:
             messages (List[ChatModelResponse]): List of chat completion messages.
+            headless (bool): Whether to generate the completion without rendering it. Default is False.
 
         Returns:
             ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
@@ -358,49 +512,234 @@ class LlamaCppModel(ChatModel):
 
         # NOTE: Larger sequence lengths, or context windows, will delay
         # load times. The load time varies from model to model.
+        with self.lock:
+            try:
+                return self._generate_chat_completion(
+                    self.model, messages, headless=headless
+                )
+            except Exception as e:
+                self.logger.error(f"Error generating chat completions: {e}")
+                return ChatModelResponse(role="assistant", content=str(e))
+
+    def _generate_chat_completion(
+        self,
+        model: Llama,
+        messages: List[ChatModelResponse],
+        headless: bool = False,
+    ) -> ChatModelResponse:
+        """
+        Generates a chat completion with the given evaluation context.
+
+        The caller must hold the context exclusively.
+
+        Args:
+            model (Llama): The evaluation context to generate with.
+            messages (List[ChatModelResponse]): List of chat completion messages.
+            headless (bool): Whether to skip rendering. Default is False.
+
+        Returns:
+            ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
+
+        Raises:
+            ValueError: If the 'messages' argument is empty or None.
+        """
+        if not messages:
+            raise ValueError("'messages' argument cannot be empty or None")
+
+        response = model.create_chat_completion(
+            messages=messages,
+            functions=self.config.get_value("function.definitions", []),
+            function_call=self.config.get_value("function.call", "auto"),
+            top_k=self.config.get_value("llama_cpp.chat_completions.top_k", 50),
+            top_p=self.config.get_value("llama_cpp.chat_completions.top_p", 0.9),
+            min_p=self.config.get_value("llama_cpp.chat_completions.min_p", 0.1),
+            temperature=self.config.get_value(
+                "llama_cpp.chat_completions.temperature", 0.7
+            ),
+            presence_penalty=self.config.get_value(
+                "llama_cpp.chat_completions.presence_penalty", 0.0
+            ),
+            frequency_penalty=self.config.get_value(
+                "llama_cpp.chat_completions.frequency_penalty", 0.0
+            ),
+            repeat_penalty=self.config.get_value(
+                "llama_cpp.chat_completions.repeat_penalty", 1.1
+            ),
+            logit_bias=self.config.get_value(
+                "llama_cpp.chat_completions.logit_bias", None
+            ),
+            max_tokens=self.config.get_value(
+                "llama_cpp.chat_completions.max_tokens", -1
+            ),
+            stop=self.config.get_value("llama_cpp.chat_completions.stop", []),
+            stream=True,
+        )
+        llama_cpp.llama_reset_timings(model._ctx.ctx)
+        message = self._stream_chat_completion(response, headless=headless)
+        self._report_prompt_evaluation(model)
+        return message
+
+    def _report_prompt_evaluation(self, model: Llama) -> None:
+        """
+        Logs the prompt evaluation of the last completion generated with the given context.
+
+        Args:
+            model (Llama): The evaluation context that generated the completion.
+        """
+        timings = llama_cpp.llama_get_timings(model._ctx.ctx)
+        # NOTE: The context holds the prompt and the generated tokens.
+        reused = max(0, model.n_tokens - timings.n_p_eval - timings.n_eval)
+        self.logger.info(
+            "Evaluated %d prompt tokens in %.2fs (%d reused from the cache)",
+            timings.n_p_eval,
+            timings.t_p_eval_ms / 1000,
+            reused,
+        )
+        if self.prompt_cache is not None and model is self._model:
+            self.logger.debug(
+                "Prompt cache: %d states, %d bytes, %d hits, %d misses",
+                len(self.prompt_cache),
+                self.prompt_cache.cache_size,
+                self.prompt_cache.hits,
+                self.prompt_cache.misses,
+            )
+
+    def _count_workers(self, items: int) -> int:
+        """
+        Get the number of workers for a batch, bounded by `llama_cpp.batch.workers`.
+
+        Args:
+            items (int): The number of items in the batch.
+
+        Returns:
+            int: The number of workers.
+        """
+        return max(1, min(items, self.config.get_value("llama_cpp.batch.workers", 1)))
+
+    def _create_contexts(self, workers: int) -> None:
+        """
+        Grow the pool of evaluation contexts to the number of workers of a batch.
+
+        The model's own context is one of them. The other contexts are created
+        once and map the same model file.
+
+        Args:
+            workers (int): The number of contexts in the pool.
+        """
+        if len(self._batch_contexts) >= workers - 1 and self._model is not None:
+            return
+        # NOTE: Loading the weights refills the pool with every context.
+        self.load()
+        with self.lock:
+            while len(self._batch_contexts) < workers - 1:
+                self.logger.info(
+                    "Creating batch context %d", len(self._batch_contexts) + 1
+                )
+                context = self._create_llama()
+                with self._contexts_lock:
+                    self._batch_contexts.append(context)
+                    self._contexts.put(context)
+
+    @contextmanager
+    def _checkout_context(self) -> Iterator[Llama]:
+        """
+        Check out an evaluation context of the pool for exclusive use.
+
+        Every caller shares the pool, so concurrent batches never evaluate the
+        same context. The model's own context is also locked while in use,
+        since it is used outside the pool, e.g. by `get_chat_completion`.
+
+        Yields:
+            Llama: The evaluation context.
+        """
+        while True:
+            main = self.model
+            with self._contexts_lock:
+                # NOTE: The weights may be unloaded before the checkout is counted.
+                if self._model is main:
+                    contexts = self._contexts
+                    self._checked_out += 1
+                    break
         try:
-            response = self.model.create_chat_completion(
-                messages=messages,
-                functions=self.config.get_value("function.definitions", []),
-                function_call=self.config.get_value("function.call", "auto"),
-                top_k=self.config.get_value("llama_cpp.chat_completions.top_k", 50),
-                top_p=self.config.get_value("llama_cpp.chat_completions.top_p", 0.9),
-                min_p=self.config.get_value("llama_cpp.chat_completions.min_p", 0.1),
-                temperature=self.config.get_value(
-                    "llama_cpp.chat_completions.temperature", 0.7
-                ),
-                presence_penalty=self.config.get_value(
-                    "llama_cpp.chat_completions.presence_penalty", 0.0
-                ),
-                frequency_penalty=self.config.get_value(
-                    "llama_cpp.chat_completions.frequency_penalty", 0.0
-                ),
-                repeat_penalty=self.config.get_value(
-                    "llama_cpp.chat_completions.repeat_penalty", 1.1
-                ),
-                logit_bias=self.config.get_value(
-                    "llama_cpp.chat_completions.logit_bias", None
-                ),
-                max_tokens=self.config.get_value(
-                    "llama_cpp.chat_completions.max_tokens", -1
-                ),
-                stop=self.config.get_value("llama_cpp.chat_completions.stop", []),
-                stream=True,
+            context = contexts.get()
+            try:
+                with self.lock if context is main else nullcontext():
+                    yield context
+            finally:
+                contexts.put(context)
+        finally:
+            with self._contexts_lock:
+                self._checked_out -= 1
+
+    def get_chat_completions(
+        self, batch: List[List[ChatModelResponse]]
+    ) -> List[ChatModelResult]:
+        """
+        Generate a chat completion for each conversation in a batch without rendering them.
+
+        The conversations are shared by a pool of `llama_cpp.batch.workers`
+        worker threads, each generating with its own evaluation context. The
+        model's own context is one of them and is locked while in use.
+
+        Args:
+            batch (List[List[ChatModelResponse]]): The conversations to complete.
+
+        Returns:
+            List[ChatModelResult]: The result of each conversation, in the same order as the batch.
+        """
+        workers = self._count_workers(len(batch))
+        self._create_contexts(workers)
+
+        def complete(messages: List[ChatModelResponse]) -> ChatModelResponse:
+            with self._checkout_context() as model:
+                return self._generate_chat_completion(model, messages, headless=True)
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(
+                    lambda item: self._get_chat_completion_result(*item, complete),
+                    enumerate(batch),
+                )
             )
-            return self._stream_chat_completion(response)
-        except Exception as e:
-            self.logger.error(f"Error generating chat completions: {e}")
-            return ChatModelResponse(role="assistant", content=str(e))
+        self.logger.info(
+            "Completed %d conversations in %.2fs with %d workers (%d failed)",
+            len(results),
+            time.perf_counter() - started_at,
+            workers,
+            sum(1 for result in results if result["error"]),
+        )
+        return results
+
+    def save_prompt_state(self, name: str) -> bool:
+        """
+        Persist the prompt state of the latest completion for the named session.
+
+        Args:
+            name (str): The name of the session.
+
+        Returns:
+            bool: True if the state was persisted, False otherwise.
+        """
+        if not isinstance(self.prompt_cache, PersistentPrefixStateCache):
+            return False
+        with self.lock:
+            return self.prompt_cache.persist(name)
 
     def get_embedding(self, input: Union[str, List[str]]) -> ChatModelEmbedding:
         """
         Generate embeddings using the Llama language model.
 
+        The inputs are split into micro-batches by the embedding scheduler and
+        shared by a pool of `llama_cpp.batch.workers` evaluation contexts. It
+        is safe to call from background threads, e.g. the EmbeddingQueue, since
+        every caller checks its contexts out of the model's single pool.
+
         Args:
             input (Union[str, List[str]]): The input string or list of strings.
 
         Returns:
-            ChatModelEmbedding (List[List[float]]): The generated embedding vector.
+            ChatModelEmbedding (np.ndarray): The float32 embeddings in input order, or an empty array on error.
 
         Raises:
             ValueError: If the 'input' argument is empty or None.
@@ -408,17 +747,60 @@ class LlamaCppModel(ChatModel):
         if not input:
             raise ValueError("'input' argument cannot be empty or None")
 
+        texts = [input] if isinstance(input, str) else list(input)
         try:
-            embedding: Dict[str, Any] = self.model.create_embedding(input=input)
-            sorted_embeddings: List[Dict[str, Any]] = sorted(
-                embedding["data"],
-                key=lambda e: e["index"],
+            workers = self._count_workers(len(texts))
+            self._create_contexts(workers)
+
+            def embed(batch: List[str]) -> ChatModelEmbedding:
+                with self._checkout_context() as model:
+                    embedding: Dict[str, Any] = model.create_embedding(input=batch)
+                sorted_embeddings: List[Dict[str, Any]] = sorted(
+                    embedding["data"],
+                    key=lambda e: e["index"],
+                )
+                return np.array(
+                    [result["embedding"] for result in sorted_embeddings],
+                    dtype=np.float32,
+                )
+
+            token_counts = [
+                len(self.model.tokenize(text.encode("utf-8"))) for text in texts
+            ]
+            scheduler = EmbeddingScheduler(
+                max_batch_size=self.config.get_value(
+                    "llama_cpp.embedding.max_batch_size", 32
+                ),
+                max_batch_tokens=self.config.get_value(
+                    "llama_cpp.embedding.max_batch_tokens", 4096
+                ),
+                workers=workers,
+                logger=self.logger,
             )
-            # Return Embedding Vectors as List[float]
-            return [result["embedding"] for result in sorted_embeddings]
+            return scheduler.run(texts, token_counts, embed)
         except Exception as e:
             self.logger.error(f"Error generating embeddings: {e}")
-            return []
+            return np.empty((0, 0), dtype=np.float32)
+
+    @property
+    def encoding_id(self) -> str:
+        """
+        Get an identifier for the tokenizer of the loaded model file.
+
+        Returns:
+            str: The tokenizer identifier.
+        """
+        return f"llama_cpp:{self.model_path}"
+
+    @property
+    def embedding_id(self) -> str:
+        """
+        Get an identifier for the embeddings of the loaded model file.
+
+        Returns:
+            str: The embedding model identifier.
+        """
+        return f"llama_cpp:{self.model_path}"
 
     def get_encoding(self, text: str) -> ChatModelEncoding:
         """
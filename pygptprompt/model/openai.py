@@ -5,37 +5,53 @@ pygptprompt/model/openai.py
     - OpenAI's GPT-3.5
 """
 
-from typing import Any, Dict, Iterator, List, Tuple, Union
-
+import asyncio
+import base64
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+import httpx
+import numpy as np
 import openai
 from llama_cpp import ChatCompletionChunk
 from rich.console import Console
-from rich.live import Live
-from rich.markdown import Markdown
-from rich.panel import Panel
 from tiktoken import Encoding, encoding_for_model
 
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import (
+    AsyncChatModel,
     ChatModel,
     ChatModelEmbedding,
     ChatModelEncoding,
     ChatModelResponse,
+    ChatModelResult,
     ChatModelTextCompletion,
     DeltaContent,
     FunctionCall,
 )
+from pygptprompt.model.embedding import EmbeddingScheduler
+from pygptprompt.model.render import StreamRenderer
 
 
-class OpenAIModel(ChatModel):
+class OpenAIModel(ChatModel, AsyncChatModel):
     """
     ChatModel class for interacting with the OpenAI language models.
 
+    The asynchronous methods share a pooled `AsyncOpenAI` client per event loop.
+    At most `openai.concurrency.max_requests` requests are in flight at once,
+    and the connection pool is sized to match. The API endpoint may be
+    overridden with `openai.base_url`.
+
     Args:
         config (ConfigurationManager): The configuration manager instance.
 
     Attributes:
         config (ConfigurationManager): The configuration manager instance.
+        max_requests (int): The maximum number of concurrent asynchronous requests.
+
+    Properties:
+        async_client (openai.AsyncOpenAI): The asynchronous client of the running event loop.
     """
 
     def __init__(self, config: ConfigurationManager):
@@ -47,10 +63,27 @@ class OpenAIModel(ChatModel):
         """
         self.config = config
         self.logger = config.get_logger("general", self.__class__.__name__)
+        # NOTE: The encoding is resolved on first use, and never again, since
+        # tokens are counted on the hot path.
+        self._encoding_model = config.get_value(
+            "openai.chat_completions.model", "gpt-3.5-turbo"
+        )
+        self._encoding: Optional[Encoding] = None
+        self._api_key = config.get_environment()
+        self._base_url = config.get_value("openai.base_url")
         self.client = openai.OpenAI(
-            api_key=config.get_environment(),
+            api_key=self._api_key,
+            base_url=self._base_url,
         )
 
+        self.max_requests = max(
+            1, config.get_value("openai.concurrency.max_requests", 8)
+        )
+        # NOTE: The async client and semaphore are bound to the loop that created them.
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_client: Optional[openai.AsyncOpenAI] = None
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+
         self.console = Console(
             color_system=self.config.get_value(
                 "app.ui.rich.console.color_system",
@@ -69,9 +102,6 @@ class OpenAIModel(ChatModel):
         Returns:
             str: The updated content after appending the new token.
         """
-        self.logger.debug("Entering _extract_content method.")
-        self.logger.debug(f"Initial delta: {delta}, content: {content}")
-
         if delta and delta.content:
             token = delta.content
             content += token
@@ -95,13 +125,6 @@ class OpenAIModel(ChatModel):
         Returns:
             Tuple[str, str]: A tuple containing the updated function call name and arguments.
         """
-        self.logger.debug("Entering _extract_function_call method.")
-        self.logger.debug(
-            f"Initial delta: {delta}, "
-            f"function_call_name: {function_call_name}, "
-            f"function_call_args: {function_call_args}, "
-        )
-
         if delta and delta.function_call:
             function_call = delta.function_call
             if not function_call_name:
@@ -129,14 +152,6 @@ class OpenAIModel(ChatModel):
         Returns:
             ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
         """
-        self.logger.debug("Entering _handle_finish_reason method.")
-        self.logger.debug(
-            f"Initial finish_reason: {finish_reason}, "
-            f"function_call_name: {function_call_name}, "
-            f"function_call_args: {function_call_args}, "
-            f"content: {content}"
-        )
-
         if finish_reason:
             if finish_reason == "function_call":
                 return ChatModelResponse(
@@ -154,13 +169,16 @@ class OpenAIModel(ChatModel):
                 raise ValueError(f"Warning: Unexpected finish_reason '{finish_reason}'")
 
     def _stream_chat_completion(
-        self, response_generator: Iterator[ChatCompletionChunk]
+        self,
+        response_generator: Iterator[ChatCompletionChunk],
+        headless: bool = False,
     ) -> ChatModelResponse:
         """
         Streams the chat completion response and handles the content and function call information.
 
         Args:
             response_generator (Iterator[ChatCompletionChunk]): An iterator of ChatCompletionChunk objects.
+            headless (bool): Whether to skip rendering. Default is False.
 
         Returns:
             ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
@@ -169,30 +187,26 @@ class OpenAIModel(ChatModel):
         function_call_args = ""
         content = ""
 
-        self.logger.debug("Entering _stream_chat_completion method.")
-        self.logger.debug(
-            f"Initial function_call_name: {function_call_name}, function_call_args: {function_call_args}, content: {content}"
+        renderer = StreamRenderer(
+            console=self.console,
+            title=self.config.get_value("openai.provider"),
+            config=self.config,
+            headless=headless,
+            logger=self.logger,
         )
 
-        with Live(console=self.console) as stream:
+        with renderer:
             for chunk in response_generator:
-                self.logger.debug(f"Processing chunk: {chunk}")
-
                 delta = chunk.choices[0].delta
+                # NOTE: Arguments are only formatted if DEBUG is enabled.
+                self.logger.debug("Extracted delta: %s", delta)
+
                 content = self._extract_content(delta, content)
                 function_call_name, function_call_args = self._extract_function_call(
                     delta, function_call_name, function_call_args
                 )
 
-                self.logger.debug(f"Extracted delta: {delta}")
-                self.logger.debug(f"Current content: {content}")
-                self.logger.debug(
-                    f"Current function_call_name: {function_call_name}, function_call_args: {function_call_args}"
-                )
-
                 finish_reason = chunk.choices[0].finish_reason
-                self.logger.debug(f"Finish reason: {finish_reason}")
-
                 message = self._handle_finish_reason(
                     finish_reason,
                     function_call_name,
@@ -200,34 +214,83 @@ class OpenAIModel(ChatModel):
                     content,
                 )
 
-                self.logger.debug(f"Generated message: {message}")
-
-                panel = Panel(
-                    Markdown(content),
-                    title=self.config.get_value("openai.provider"),
-                    title_align=self.config.get_value(
-                        "app.ui.rich.panel.title_align",
-                        "left",
-                    ),
-                    border_style=self.config.get_value(
-                        "app.ui.rich.panel.border_color",
-                        "none",
-                    ),
-                )
-                stream.update(panel, refresh=True)
+                renderer.update(content)
 
                 if message:  # NOTE: Exit early if a finish reason is given.
-                    self.logger.debug(f"Returning message: {message}")
+                    self.logger.debug("Finish reason: %s", finish_reason)
                     return message
 
         # NOTE: The finish reason should be present.
         # If the finish reason vanishes, then something unexpected happened.
-        self.logger.debug(f"Generated content: {content}")
         self.logger.debug("Exiting _stream_chat_completion without a finish_reason.")
         # NOTE: There is no message, but content is always generated.
         # Return the generated content even though no finish reason was given.
         return ChatModelResponse(role="assistant", content=content)
 
+    def _chat_completion_parameters(
+        self, messages: List[ChatModelResponse]
+    ) -> Dict[str, Any]:
+        """
+        Get the parameters of a chat completions request from the configuration.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of chat completion messages.
+
+        Returns:
+            Dict[str, Any]: The keyword arguments for `chat.completions.create`.
+        """
+        return dict(
+            messages=messages,
+            functions=self.config.get_value("function.definitions", []),
+            function_call=self.config.get_value("function.call", "auto"),
+            model=self.config.get_value(
+                "openai.chat_completions.model", "gpt-3.5-turbo"
+            ),
+            temperature=self.config.get_value(
+                "openai.chat_completions.temperature", 0.8
+            ),
+            max_tokens=self.config.get_value(
+                "openai.chat_completions.max_tokens", 1024
+            ),
+            top_p=self.config.get_value("openai.chat_completions.top_p", 0.95),
+            n=self.config.get_value("openai.chat_completions.n", 1),
+            stop=self.config.get_value("openai.chat_completions.stop", []),
+            presence_penalty=self.config.get_value(
+                "openai.chat_completions.presence_penalty", 0
+            ),
+            frequency_penalty=self.config.get_value(
+                "openai.chat_completions.frequency_penalty", 0
+            ),
+            logit_bias=self.config.get_value("openai.chat_completions.logit_bias", {}),
+            stream=True,  # NOTE: Always coerce streaming
+        )
+
+    def _extract_embeddings(self, response: Any) -> ChatModelEmbedding:
+        """
+        Extracts the embedding vectors from an embeddings response in input order.
+
+        Embeddings are requested as base64 encoded float32 buffers, which are
+        decoded without boxing each value. Endpoints that ignore the encoding
+        format return lists of floats, which are converted instead.
+
+        Args:
+            response (CreateEmbeddingResponse): The response of the embeddings endpoint.
+
+        Returns:
+            ChatModelEmbedding (np.ndarray): The float32 embedding vectors.
+        """
+        results = sorted(response.data, key=lambda result: result.index)
+        return np.stack(
+            [
+                (
+                    np.frombuffer(base64.b64decode(result.embedding), dtype=np.float32)
+                    if isinstance(result.embedding, str)
+                    else np.asarray(result.embedding, dtype=np.float32)
+                )
+                for result in results
+            ]
+        )
+
     def get_completion(self, prompt: str) -> ChatModelTextCompletion:
         """
         Get completions from the OpenAI language models.
@@ -240,12 +303,14 @@ class OpenAIModel(ChatModel):
     def get_chat_completion(
         self,
         messages: List[ChatModelResponse],
+        headless: bool = False,
     ) -> ChatModelResponse:
         """
         Generate chat completions using the OpenAI language models.
 
         Args:
             messages (List[ChatModelResponse]): The list of chat completion messages.
+            headless (bool): Whether to generate the completion without rendering it. Default is False.
 
         Returns:
             ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
@@ -259,33 +324,9 @@ class OpenAIModel(ChatModel):
         try:
             # Call the OpenAI API's /v1/chat/completions endpoint
             response = self.client.chat.completions.create(
-                messages=messages,
-                functions=self.config.get_value("function.definitions", []),
-                function_call=self.config.get_value("function.call", "auto"),
-                model=self.config.get_value(
-                    "openai.chat_completions.model", "gpt-3.5-turbo"
-                ),
-                temperature=self.config.get_value(
-                    "openai.chat_completions.temperature", 0.8
-                ),
-                max_tokens=self.config.get_value(
-                    "openai.chat_completions.max_tokens", 1024
-                ),
-                top_p=self.config.get_value("openai.chat_completions.top_p", 0.95),
-                n=self.config.get_value("openai.chat_completions.n", 1),
-                stop=self.config.get_value("openai.chat_completions.stop", []),
-                presence_penalty=self.config.get_value(
-                    "openai.chat_completions.presence_penalty", 0
-                ),
-                frequency_penalty=self.config.get_value(
-                    "openai.chat_completions.frequency_penalty", 0
-                ),
-                logit_bias=self.config.get_value(
-                    "openai.chat_completions.logit_bias", {}
-                ),
-                stream=True,  # NOTE: Always coerce streaming
+                **self._chat_completion_parameters(messages)
             )
-            return self._stream_chat_completion(response)
+            return self._stream_chat_completion(response, headless=headless)
         except Exception as e:
             self.logger.error(f"Error generating chat completions: {e}")
             return ChatModelResponse(role="assistant", content=str(e))
@@ -294,11 +335,14 @@ class OpenAIModel(ChatModel):
         """
         Generate embeddings using the OpenAI language models.
 
+        The inputs are split into micro-batches by the embedding scheduler and
+        requested concurrently.
+
         Args:
             input (Union[str, List[str]]): The input text or list of texts to generate embeddings for.
 
         Returns:
-            ChatModelEmbedding (List[List[float]]): The generated embedding vector.
+            ChatModelEmbedding (np.ndarray): The float32 embeddings in input order, or an empty array on error.
 
         Raises:
             ValueError: If the 'input' argument is empty or None.
@@ -306,23 +350,331 @@ class OpenAIModel(ChatModel):
         if not input:
             raise ValueError("'input' argument cannot be empty or None")
 
+        texts = [input] if isinstance(input, str) else list(input)
         try:
-            # Call the OpenAI API's /v1/embeddings endpoint
-            embedding: Dict[str, Any] = self.client.embeddings.create(
-                input=input,
-                model=self.config.get_value(
-                    "openai.embedding.model", "text-embedding-ada-002"
-                ),
+            return self.embedding_scheduler.run(
+                texts, self._count_embedding_tokens(texts), self._create_embeddings
             )
-            sorted_embeddings: List[Dict[str, Any]] = sorted(
-                embedding["data"],
-                key=lambda e: e["index"],
+        except Exception as e:
+            self.logger.error(f"Error generating embeddings: {e}")
+            return np.empty((0, 0), dtype=np.float32)
+
+    @property
+    def embedding_scheduler(self) -> EmbeddingScheduler:
+        """
+        Get the embedding scheduler configured by `openai.embedding`.
+
+        Batches are requested concurrently, up to `openai.concurrency.max_requests` at once.
+
+        Returns:
+            EmbeddingScheduler: The embedding scheduler.
+        """
+        return EmbeddingScheduler(
+            max_batch_size=self.config.get_value(
+                "openai.embedding.max_batch_size", 256
+            ),
+            max_batch_tokens=self.config.get_value(
+                "openai.embedding.max_batch_tokens", 65536
+            ),
+            workers=self.max_requests,
+            logger=self.logger,
+        )
+
+    def _count_embedding_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Counts the tokens of each input to embed.
+
+        Args:
+            texts (List[str]): The inputs to embed.
+
+        Returns:
+            List[int]: The token count of each input.
+        """
+        return [len(encoding) for encoding in self.encoding.encode_batch(texts)]
+
+    def _create_embeddings(self, texts: List[str]) -> ChatModelEmbedding:
+        """
+        Requests the embeddings of a single batch.
+
+        Args:
+            texts (List[str]): The batch of inputs.
+
+        Returns:
+            ChatModelEmbedding (np.ndarray): The float32 embeddings in input order.
+        """
+        # Call the OpenAI API's /v1/embeddings endpoint
+        response = self.client.embeddings.create(
+            input=texts,
+            model=self.config.get_value(
+                "openai.embedding.model", "text-embedding-ada-002"
+            ),
+            encoding_format="base64",
+        )
+        return self._extract_embeddings(response)
+
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        """
+        Get the pooled asynchronous client of the running event loop.
+
+        The client is created on first use within each event loop, since its
+        connections cannot be shared across loops.
+
+        Returns:
+            openai.AsyncOpenAI: The asynchronous client.
+        """
+        self._bind_event_loop()
+        return self._async_client
+
+    def _bind_event_loop(self) -> asyncio.Semaphore:
+        """
+        Create the asynchronous client and semaphore for the running event loop if needed.
+
+        Returns:
+            asyncio.Semaphore: The semaphore bounding the requests in flight.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            limits = httpx.Limits(
+                max_connections=self.max_requests,
+                max_keepalive_connections=self.max_requests,
+            )
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=openai.DefaultAsyncHttpxClient(limits=limits),
+            )
+            self._async_semaphore = asyncio.Semaphore(self.max_requests)
+            self._async_loop = loop
+        return self._async_semaphore
+
+    async def _astream_chunks(
+        self, messages: List[ChatModelResponse]
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        """
+        Streams the chunks of a chat completion, holding a request slot until the stream ends.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of chat completion messages.
+
+        Yields:
+            ChatCompletionChunk: The chunks of the chat completion.
+        """
+        async with self._bind_event_loop():
+            response = await self.async_client.chat.completions.create(
+                **self._chat_completion_parameters(messages)
+            )
+            async with aclosing(response):
+                async for chunk in response:
+                    if chunk.choices:
+                        yield chunk
+
+    async def astream_chat_completion(
+        self, messages: List[ChatModelResponse]
+    ) -> AsyncIterator[DeltaContent]:
+        """
+        Stream the deltas of a chat completion using the OpenAI language models.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of chat completion messages.
+
+        Yields:
+            DeltaContent: The deltas of the chat completion.
+
+        Raises:
+            ValueError: If `messages` argument is empty or `None`.
+        """
+        if not messages:
+            raise ValueError("'messages' argument cannot be empty or None")
+
+        async with aclosing(self._astream_chunks(messages)) as chunks:
+            async for chunk in chunks:
+                yield chunk.choices[0].delta
+
+    async def aget_chat_completion(
+        self, messages: List[ChatModelResponse]
+    ) -> ChatModelResponse:
+        """
+        Generate chat completions asynchronously using the OpenAI language models.
+
+        The completion is accumulated from the stream without rendering it.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of chat completion messages.
+
+        Returns:
+            ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
+
+        Raises:
+            ValueError: If `messages` argument is empty or `None`.
+        """
+        if not messages:
+            raise ValueError("'messages' argument cannot be empty or None")
+
+        try:
+            return await self._acreate_chat_completion(messages)
+        except Exception as e:
+            self.logger.error(f"Error generating chat completions: {e}")
+            return ChatModelResponse(role="assistant", content=str(e))
+
+    async def _acreate_chat_completion(
+        self, messages: List[ChatModelResponse]
+    ) -> ChatModelResponse:
+        """
+        Accumulates a streamed chat completion into a message without rendering it.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of chat completion messages.
+
+        Returns:
+            ChatModelResponse (Dict[LiteralString, str]): The model's response as a message.
+
+        Raises:
+            ValueError: If `messages` argument is empty or `None`.
+            openai.OpenAIError: If the request fails.
+        """
+        if not messages:
+            raise ValueError("'messages' argument cannot be empty or None")
+
+        function_call_name = None
+        function_call_args = ""
+        content = ""
+
+        async with aclosing(self._astream_chunks(messages)) as chunks:
+            async for chunk in chunks:
+                delta = chunk.choices[0].delta
+                content = self._extract_content(delta, content)
+                function_call_name, function_call_args = self._extract_function_call(
+                    delta, function_call_name, function_call_args
+                )
+                message = self._handle_finish_reason(
+                    chunk.choices[0].finish_reason,
+                    function_call_name,
+                    function_call_args,
+                    content,
+                )
+                if message:
+                    return message
+
+        # NOTE: Return the generated content even though no finish reason was given.
+        return ChatModelResponse(role="assistant", content=content)
+
+    async def _aget_chat_completion_result(
+        self, index: int, messages: List[ChatModelResponse]
+    ) -> ChatModelResult:
+        """
+        Completes a single conversation of a batch, capturing its error and timing.
+
+        Args:
+            index (int): The position of the conversation in the batch.
+            messages (List[ChatModelResponse]): The conversation to complete.
+
+        Returns:
+            ChatModelResult: The result of the conversation.
+        """
+        start = time.perf_counter()
+        try:
+            response, error = await self._acreate_chat_completion(messages), None
+        except Exception as e:
+            self.logger.error(f"Error generating chat completion {index}: {e}")
+            response, error = None, str(e)
+        return ChatModelResult(
+            index=index,
+            response=response,
+            error=error,
+            elapsed=time.perf_counter() - start,
+        )
+
+    def get_chat_completions(
+        self, batch: List[List[ChatModelResponse]]
+    ) -> List[ChatModelResult]:
+        """
+        Generate a chat completion for each conversation in a batch without rendering them.
+
+        The conversations are requested concurrently, with at most
+        `openai.concurrency.max_requests` requests in flight at once.
+
+        Args:
+            batch (List[List[ChatModelResponse]]): The conversations to complete.
+
+        Returns:
+            List[ChatModelResult]: The result of each conversation, in the same order as the batch.
+        """
+
+        async def complete() -> List[ChatModelResult]:
+            try:
+                return await asyncio.gather(
+                    *[
+                        self._aget_chat_completion_result(index, messages)
+                        for index, messages in enumerate(batch)
+                    ]
+                )
+            finally:
+                # NOTE: The client is bound to this loop, which closes with the batch.
+                if self._async_loop is asyncio.get_running_loop():
+                    await self._async_client.close()
+                    self._async_loop = None
+
+        started_at = time.perf_counter()
+        results = asyncio.run(complete())
+        self.logger.info(
+            "Completed %d conversations in %.2fs (%d failed)",
+            len(results),
+            time.perf_counter() - started_at,
+            sum(1 for result in results if result["error"]),
+        )
+        return results
+
+    async def aget_embedding(self, input: Union[str, List[str]]) -> ChatModelEmbedding:
+        """
+        Generate embeddings asynchronously using the OpenAI language models.
+
+        Args:
+            input (Union[str, List[str]]): The input text or list of texts to generate embeddings for.
+
+        Returns:
+            ChatModelEmbedding (np.ndarray): The float32 embeddings in input order, or an empty array on error.
+
+        Raises:
+            ValueError: If the 'input' argument is empty or None.
+        """
+        if not input:
+            raise ValueError("'input' argument cannot be empty or None")
+
+        texts = [input] if isinstance(input, str) else list(input)
+        try:
+            scheduler = self.embedding_scheduler
+            batches = scheduler.plan(self._count_embedding_tokens(texts))
+            results = await asyncio.gather(
+                *[
+                    self._acreate_embeddings([texts[position] for position in batch])
+                    for batch in batches
+                ]
             )
-            # Return Embedding Vectors as List[float]
-            return [result["embedding"] for result in sorted_embeddings]
+            return scheduler.assemble(batches, results, len(texts))
         except Exception as e:
             self.logger.error(f"Error generating embeddings: {e}")
-            return []
+            return np.empty((0, 0), dtype=np.float32)
+
+    async def _acreate_embeddings(self, texts: List[str]) -> ChatModelEmbedding:
+        """
+        Requests the embeddings of a single batch asynchronously.
+
+        Args:
+            texts (List[str]): The batch of inputs.
+
+        Returns:
+            ChatModelEmbedding (np.ndarray): The float32 embeddings in input order.
+        """
+        async with self._bind_event_loop():
+            response = await self.async_client.embeddings.create(
+                input=texts,
+                model=self.config.get_value(
+                    "openai.embedding.model", "text-embedding-ada-002"
+                ),
+                encoding_format="base64",
+            )
+        return self._extract_embeddings(response)
 
     def get_encoding(self, text: str) -> ChatModelEncoding:
         """
@@ -340,10 +692,61 @@ class OpenAIModel(ChatModel):
         if not text:
             raise ValueError("'text' argument cannot be empty or None")
 
-        encoding: Encoding = encoding_for_model(
-            model_name=self.config.get_value(
-                "openai.chat_completions.model", "gpt-3.5-turbo"
-            )
+        return self.encoding.encode(text=text)
+
+    def get_encodings(self, texts: List[str]) -> List[ChatModelEncoding]:
+        """
+        Get the token encodings for a batch of texts using the OpenAI language model.
+
+        The batch is encoded by tiktoken's multithreaded encoder.
+
+        Args:
+            texts (List[str]): The input texts to encode.
+
+        Returns:
+            List[ChatModelEncoding] (List[List[int]]): The token encodings in the same order as the texts.
+
+        Raises:
+            ValueError: If the 'texts' argument is empty or None.
+        """
+        if not texts:
+            raise ValueError("'texts' argument cannot be empty or None")
+
+        return self.encoding.encode_batch(texts)
+
+    @property
+    def encoding_id(self) -> str:
+        """
+        Get an identifier for the tiktoken encoding of the configured model.
+
+        Returns:
+            str: The tokenizer identifier, e.g. "tiktoken:cl100k_base".
+        """
+        return f"tiktoken:{self.encoding.name}"
+
+    @property
+    def embedding_id(self) -> str:
+        """
+        Get an identifier for the configured embedding model.
+
+        Returns:
+            str: The embedding model identifier, e.g. "openai:text-embedding-ada-002".
+        """
+        model = self.config.get_value(
+            "openai.embedding.model", "text-embedding-ada-002"
         )
+        return f"openai:{model}"
+
+    @property
+    def encoding(self) -> Encoding:
+        """
+        Get the tiktoken encoding for the configured chat completions model.
 
-        return encoding.encode(text=text)
+        The model is read from the configuration when the instance is created.
+
+        Returns:
+            Encoding: The cached encoding for the model.
+        """
+        if self._encoding is None:
+            self._encoding = encoding_for_model(model_name=self._encoding_model)
+        return self._encoding
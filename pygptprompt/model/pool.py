@@ -0,0 +1,219 @@
+"""
+pygptprompt/model/pool.py
+"""
+import threading
+import time
+from collections import deque
+from logging import Logger
+from typing import Callable, Deque, Dict, List, Literal, Optional, TypedDict
+
+from pygptprompt.model.base import ChatModel
+from pygptprompt.pattern.logger import get_default_logger
+
+
+class ModelEvent(TypedDict):
+    """
+    Represents a model loading or unloading its weights.
+
+    Attributes:
+        - event: Either 'load' or 'unload'.
+        - key: The pool key of the model.
+        - seconds: The number of seconds the event took.
+        - resident_bytes: The resident memory of all pooled models after the event.
+        - timestamp: The time of the event, in seconds since the epoch.
+    """
+
+    event: Literal["load", "unload"]
+    key: str
+    seconds: float
+    resident_bytes: int
+    timestamp: float
+
+
+class ModelPool:
+    """
+    A registry of shared chat models that unloads idle models and caps resident memory.
+
+    Each key maps to a single model instance that is shared by every caller.
+    Models load their weights lazily on first use and report it to the pool.
+    A model unused for `ttl` seconds is unloaded, and the least recently used
+    models are unloaded whenever the resident memory of the pool exceeds
+    `max_resident_bytes`. An unloaded model loads its weights again on its
+    next use, so callers may keep their references. Since a model is shared,
+    per-caller options, e.g. `headless`, are passed with each call and never
+    set on the model.
+
+    Args:
+        ttl (float): The number of idle seconds before a model is unloaded. Zero disables it.
+        max_resident_bytes (int): The maximum resident memory of the loaded models. Zero disables it.
+        logger (Optional[Logger]): Optional logger for reporting events.
+
+    Attributes:
+        events (Deque[ModelEvent]): The most recent load and unload events.
+        listeners (List[Callable[[ModelEvent], None]]): Called with every event.
+
+    Properties:
+        resident_bytes (int): The resident memory of the loaded models.
+
+    Methods:
+        get(key, create): Get the model for a key, creating it on first use.
+        unload_idle(): Unload the models that have been idle longer than the ttl.
+        close(): Stop unloading idle models in the background.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 0,
+        max_resident_bytes: int = 0,
+        logger: Optional[Logger] = None,
+    ):
+        self.ttl = ttl
+        self.max_resident_bytes = max_resident_bytes
+        self.events: Deque[ModelEvent] = deque(maxlen=256)
+        self.listeners: List[Callable[[ModelEvent], None]] = []
+        self._models: Dict[str, ChatModel] = {}
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+        if self.ttl > 0:
+            # NOTE: Idle models are swept at a fraction of the ttl.
+            threading.Thread(
+                target=self._sweep, name="ModelPoolSweeper", daemon=True
+            ).start()
+
+    def __len__(self) -> int:
+        """Get the number of pooled models."""
+        return len(self._models)
+
+    def __contains__(self, key: str) -> bool:
+        """Check whether a model is pooled under the key."""
+        return key in self._models
+
+    @property
+    def resident_bytes(self) -> int:
+        """Get the resident memory of the loaded models."""
+        return sum(model.resident_bytes for model in list(self._models.values()))
+
+    def get(self, key: str, create: Callable[[], ChatModel]) -> ChatModel:
+        """
+        Get the model for a key, creating it on first use.
+
+        The model is created without holding the pool's lock, so a slow
+        constructor never blocks other keys. If another caller pooled a model
+        for the key in the meantime, that model is returned instead.
+
+        Args:
+            key (str): The pool key, e.g. derived from the provider's configuration.
+            create (Callable[[], ChatModel]): Creates the model if it is not pooled yet.
+
+        Returns:
+            ChatModel: The shared model.
+        """
+        with self._lock:
+            model = self._models.get(key)
+        if model is not None:
+            return model
+
+        created = create()
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                created.on_event = lambda event, seconds: self._record(
+                    key, event, seconds
+                )
+                self._models[key] = model = created
+        return model
+
+    def unload_idle(self) -> List[str]:
+        """
+        Unload the models that have been idle longer than the ttl.
+
+        Returns:
+            List[str]: The keys of the unloaded models.
+        """
+        if self.ttl <= 0:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                (key, model)
+                for key, model in self._models.items()
+                if model.loaded and now - model.last_used > self.ttl
+            ]
+        return [key for key, model in idle if model.unload()]
+
+    def close(self) -> None:
+        """Stop unloading idle models in the background."""
+        self._closed.set()
+
+    def _sweep(self) -> None:
+        """Unload idle models until the pool is closed."""
+        while not self._closed.wait(max(self.ttl / 4, 0.01)):
+            try:
+                self.unload_idle()
+            except Exception as e:
+                self._logger.error(f"Error unloading idle models: {e}")
+
+    def _record(self, key: str, event: str, seconds: float) -> None:
+        """
+        Record a model loading or unloading its weights.
+
+        Args:
+            key (str): The pool key of the model.
+            event (str): Either 'load' or 'unload'.
+            seconds (float): The number of seconds the event took.
+        """
+        model_event = ModelEvent(
+            event=event,
+            key=key,
+            seconds=seconds,
+            resident_bytes=self.resident_bytes,
+            timestamp=time.time(),
+        )
+        self.events.append(model_event)
+        self._logger.info(
+            "Model %s: %s in %.2fs (%d bytes resident)",
+            event,
+            key,
+            seconds,
+            model_event["resident_bytes"],
+        )
+        for listener in self.listeners:
+            listener(model_event)
+
+        if event == "load":
+            self._enforce_capacity(keep=key)
+
+    def _enforce_capacity(self, keep: str) -> None:
+        """
+        Unload the least recently used models until the resident memory fits the cap.
+
+        Args:
+            keep (str): The key of the model that is never unloaded.
+        """
+        if self.max_resident_bytes <= 0:
+            return
+        with self._lock:
+            candidates = sorted(
+                (
+                    (key, model)
+                    for key, model in self._models.items()
+                    if key != keep and model.loaded
+                ),
+                key=lambda candidate: candidate[1].last_used,
+            )
+        for _, model in candidates:
+            if self.resident_bytes <= self.max_resident_bytes:
+                break
+            model.unload()
+        if self.resident_bytes > self.max_resident_bytes:
+            self._logger.warning(
+                "Model %s exceeds the resident memory cap of %d bytes",
+                keep,
+                self.max_resident_bytes,
+            )
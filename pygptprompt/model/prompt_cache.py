@@ -0,0 +1,350 @@
+"""
+pygptprompt/model/prompt_cache.py
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from logging import Logger
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_cpp import Llama, LlamaRAMCache
+from llama_cpp.llama import LlamaState
+
+from pygptprompt.pattern.logger import get_default_logger
+
+
+class PrefixStateCache(LlamaRAMCache):
+    """
+    An in-memory cache of llama.cpp states, matched by their longest token prefix.
+
+    Llama stores its state under the prompt and completion tokens after every
+    completion, and loads the state sharing the longest prefix with the next
+    prompt, so only the tokens after the shared prefix are evaluated. A state
+    whose tokens are a prefix of a newer state's tokens can never match a
+    longer prefix than the newer one, so it is dropped when the newer state is
+    stored. The remaining states are evicted least recently used first once
+    their total size exceeds the capacity.
+
+    Args:
+        capacity_bytes (int): The maximum total size of the cached states. Default is 2 GiB.
+
+    Attributes:
+        hits (int): The number of lookups that found a state sharing a prefix.
+        misses (int): The number of lookups that found no state.
+    """
+
+    def __init__(self, capacity_bytes: int = (2 << 30)):
+        super(PrefixStateCache, self).__init__(capacity_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Get the number of cached states."""
+        return len(self.cache_state)
+
+    def __getitem__(self, key: Sequence[int]) -> LlamaState:
+        try:
+            state = super(PrefixStateCache, self).__getitem__(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        return state
+
+    def __setitem__(self, key: Sequence[int], value: LlamaState) -> None:
+        key = tuple(key)
+        for cached_key in list(self.cache_state):
+            if cached_key != key and self.is_prefix(cached_key, key):
+                del self.cache_state[cached_key]
+        super(PrefixStateCache, self).__setitem__(key, value)
+
+    @staticmethod
+    def is_prefix(prefix: Tuple[int, ...], tokens: Tuple[int, ...]) -> bool:
+        """
+        Check whether a token sequence starts with the given prefix.
+
+        Args:
+            prefix (Tuple[int, ...]): The candidate prefix.
+            tokens (Tuple[int, ...]): The token sequence.
+
+        Returns:
+            bool: True if `tokens` starts with `prefix`.
+        """
+        return len(prefix) <= len(tokens) and tokens[: len(prefix)] == prefix
+
+
+class PersistentPrefixStateCache(PrefixStateCache):
+    """
+    A PrefixStateCache that persists session states to disk and reloads them via mmap.
+
+    The newest state is written with `persist(name)` as `{name}_state_{digest}.bin`,
+    where the digest is a hash of the state's tokens, so the files sit next to
+    the session's `{name}_context.json` in the same directory. A lookup compares
+    the prompt with the tokens of every state file as well as the states in
+    memory, and maps the file sharing the longest prefix if it beats memory.
+    Files are evicted least recently used first once their total size exceeds
+    the disk capacity.
+
+    Only the logits of the last token are persisted, which is all sampling
+    needs unless the model was created with `logits_all`.
+
+    Args:
+        directory (str): The directory holding the state files.
+        capacity_bytes (int): The maximum total size of the states in memory. Default is 2 GiB.
+        disk_capacity_bytes (int): The maximum total size of the state files. Default is 4 GiB.
+        logger (Optional[Logger]): Optional logger for error-handling.
+
+    Methods:
+        persist(name): Write the newest state to disk for the named session.
+        read_state(path): Map a state file into a LlamaState.
+        write_state(path, state): Write a LlamaState into a state file.
+    """
+
+    MAGIC = b"PGPSTATE"
+    ALIGNMENT = 64
+
+    def __init__(
+        self,
+        directory: str,
+        capacity_bytes: int = (2 << 30),
+        disk_capacity_bytes: int = (4 << 30),
+        logger: Optional[Logger] = None,
+    ):
+        super(PersistentPrefixStateCache, self).__init__(capacity_bytes)
+        self.directory = Path(directory)
+        self.disk_capacity_bytes = disk_capacity_bytes
+        self._latest: Optional[Tuple[int, ...]] = None
+        # NOTE: The tokens of each state file, read once on the first lookup.
+        self._files: Optional[Dict[Path, Tuple[int, ...]]] = None
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+    def __getitem__(self, key: Sequence[int]) -> LlamaState:
+        key = tuple(key)
+        cached_key = self._find_longest_prefix_key(key)
+        cached_length = Llama.longest_token_prefix(cached_key, key) if cached_key else 0
+
+        path, length = self._find_longest_prefix_file(key)
+        if path is not None and length > cached_length:
+            try:
+                start = time.perf_counter()
+                state = self.read_state(path)
+                os.utime(path)  # NOTE: Marks the file as recently used
+                self._logger.info(
+                    "Mapped %d cached prompt tokens from %s in %.3fs",
+                    state.n_tokens,
+                    path.name,
+                    time.perf_counter() - start,
+                )
+                super(PersistentPrefixStateCache, self).__setitem__(
+                    self._files[path], state
+                )
+            except (OSError, ValueError) as e:
+                self._logger.error(f"Error reading prompt state {path}: {e}")
+                self._files.pop(path, None)
+
+        return super(PersistentPrefixStateCache, self).__getitem__(key)
+
+    def __setitem__(self, key: Sequence[int], value: LlamaState) -> None:
+        super(PersistentPrefixStateCache, self).__setitem__(key, value)
+        self._latest = tuple(key)
+
+    def _scan(self) -> Dict[Path, Tuple[int, ...]]:
+        """
+        Get the tokens of every state file in the directory.
+
+        Returns:
+            Dict[Path, Tuple[int, ...]]: The tokens of each state file.
+        """
+        if self._files is None:
+            self._files = {}
+            for path in self.directory.glob("*_state_*.bin"):
+                try:
+                    state = self.read_state(path)
+                    self._files[path] = tuple(
+                        state.input_ids[: state.n_tokens].tolist()
+                    )
+                except (OSError, ValueError) as e:
+                    self._logger.warning(f"Skipping prompt state {path}: {e}")
+        return self._files
+
+    def _find_longest_prefix_file(
+        self, key: Tuple[int, ...]
+    ) -> Tuple[Optional[Path], int]:
+        """
+        Find the state file sharing the longest prefix with the given tokens.
+
+        Args:
+            key (Tuple[int, ...]): The prompt tokens.
+
+        Returns:
+            Tuple[Optional[Path], int]: The path of the state file, if any, and the length of the shared prefix.
+        """
+        best_path, best_length = None, 0
+        for path, tokens in self._scan().items():
+            length = Llama.longest_token_prefix(tokens, key)
+            if length > best_length:
+                best_path, best_length = path, length
+        return best_path, best_length
+
+    def persist(self, name: str) -> bool:
+        """
+        Write the newest state to disk for the named session.
+
+        Older state files of the session whose tokens are a prefix of the newest
+        state are removed, and the least recently used files are evicted if the
+        disk capacity is exceeded.
+
+        Args:
+            name (str): The name of the session.
+
+        Returns:
+            bool: True if the newest state is on disk, False otherwise.
+        """
+        if self._latest is None or self._latest not in self.cache_state:
+            return False
+
+        files = self._scan()
+        digest = hashlib.blake2b(
+            np.asarray(self._latest, dtype=np.intc).tobytes(), digest_size=16
+        ).hexdigest()
+        path = self.directory / f"{name}_state_{digest}.bin"
+
+        try:
+            if path.exists():
+                os.utime(path)
+            else:
+                self.write_state(path, self.cache_state[self._latest])
+                files[path] = self._latest
+            for other in list(files):
+                if (
+                    other != path
+                    and other.name.startswith(f"{name}_state_")
+                    and self.is_prefix(files[other], self._latest)
+                ):
+                    self._remove(other)
+            self._evict(keep=path)
+            return True
+        except OSError as e:
+            self._logger.error(f"Error writing prompt state {path}: {e}")
+            return False
+
+    def _remove(self, path: Path) -> None:
+        """Remove a state file from disk and from the index."""
+        path.unlink(missing_ok=True)
+        self._files.pop(path, None)
+
+    def _evict(self, keep: Path) -> None:
+        """
+        Remove the least recently used state files until they fit the disk capacity.
+
+        Args:
+            keep (Path): The state file that is never evicted.
+        """
+        stats = {path: path.stat() for path in self._scan() if path.exists()}
+        total = sum(stat.st_size for stat in stats.values())
+        for path in sorted(stats, key=lambda path: stats[path].st_mtime_ns):
+            if total <= self.disk_capacity_bytes:
+                break
+            if path != keep:
+                self._remove(path)
+                total -= stats[path].st_size
+
+    @classmethod
+    def write_state(cls, path: Path, state: LlamaState) -> None:
+        """
+        Write a LlamaState into a state file.
+
+        The file holds a JSON header followed by the evaluated tokens, the logits
+        of the last token, and the llama.cpp state data, each aligned for mapping.
+        The header records the context size, since Llama keeps a token buffer
+        of `n_ctx` tokens and writes the next evaluated tokens into it. The
+        file is written to a temporary path and renamed into place.
+
+        Args:
+            path (Path): The path of the state file.
+            state (LlamaState): The state to write.
+        """
+        input_ids = np.ascontiguousarray(state.input_ids[: state.n_tokens], np.intc)
+        scores = np.asarray(state.scores, dtype=np.single)
+        logits = np.ascontiguousarray(
+            scores[state.n_tokens - 1] if state.n_tokens else scores[:0].ravel()
+        )
+        header = json.dumps(
+            {
+                "n_tokens": state.n_tokens,
+                "n_ctx": len(state.input_ids),
+                "n_vocab": int(scores.shape[-1]) if scores.ndim == 2 else 0,
+                "llama_state_size": state.llama_state_size,
+            }
+        ).encode("utf-8")
+
+        buffers = [input_ids.tobytes(), logits.tobytes(), state.llama_state]
+        temporary = path.with_suffix(".tmp")
+        with open(temporary, "wb") as file:
+            file.write(cls.MAGIC + struct.pack("<I", len(header)) + header)
+            for buffer in buffers:
+                file.write(bytes(-file.tell() % cls.ALIGNMENT))
+                file.write(buffer)
+        os.replace(temporary, path)
+
+    @classmethod
+    def read_state(cls, path: Path) -> LlamaState:
+        """
+        Map a state file into a LlamaState without reading the state data.
+
+        Args:
+            path (Path): The path of the state file.
+
+        Returns:
+            LlamaState: The state, whose state data is a view of the mapped file. Its tokens are padded with zeros to the context size, as in `Llama.save_state`.
+
+        Raises:
+            ValueError: If the file is not a state file or was written without its context size.
+        """
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if mapped[: len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError("Not a prompt state file")
+        (length,) = struct.unpack_from("<I", mapped, len(cls.MAGIC))
+        offset = len(cls.MAGIC) + 4
+        header = json.loads(mapped[offset : offset + length])
+        offset += length
+
+        def view(size: int) -> memoryview:
+            nonlocal offset
+            offset += -offset % cls.ALIGNMENT
+            if offset + size > len(mapped):
+                raise ValueError("Truncated prompt state file")
+            buffer = memoryview(mapped)[offset : offset + size]
+            offset += size
+            return buffer
+
+        if "n_ctx" not in header:
+            raise ValueError("Prompt state file without a context size")
+        n_tokens, n_vocab = header["n_tokens"], header["n_vocab"]
+        input_ids = np.zeros(header["n_ctx"], dtype=np.intc)
+        input_ids[:n_tokens] = np.frombuffer(view(n_tokens * 4), dtype=np.intc)
+        logits = np.frombuffer(view(n_vocab * 4 if n_tokens else 0), dtype=np.single)
+        llama_state = view(header["llama_state_size"])
+
+        # NOTE: Zeroed pages are only allocated once they are written.
+        scores = np.zeros((n_tokens, n_vocab), dtype=np.single)
+        if n_tokens:
+            scores[-1] = logits
+        return LlamaState(
+            input_ids=input_ids,
+            scores=scores,
+            n_tokens=n_tokens,
+            llama_state=llama_state,
+            llama_state_size=header["llama_state_size"],
+        )
@@ -0,0 +1,145 @@
+"""
+pygptprompt/model/render.py
+"""
+import time
+from logging import Logger
+from typing import Optional
+
+from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.panel import Panel
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.pattern.logger import get_default_logger
+
+
+class StreamRenderer:
+    """
+    Renders streamed content into a live panel at a bounded refresh rate.
+
+    Each streamed chunk only records the latest content. The content is parsed
+    as Markdown and drawn at most `app.ui.stream.refresh_per_second` times per
+    second, so the chunks between two refreshes are coalesced into a single
+    render. The complete content is always drawn once the stream is closed.
+
+    In headless mode nothing is rendered, which suits non-interactive use such
+    as `--input` and batch jobs.
+
+    Args:
+        console (Console): The console to render into.
+        title (str): The title of the panel.
+        config (ConfigurationManager): The configuration manager for accessing settings and configurations.
+        headless (bool): Whether to skip rendering. Default is False.
+        logger (Optional[Logger]): Optional logger for reporting throughput.
+
+    Attributes:
+        chunk_count (int): The number of chunks streamed so far.
+        render_count (int): The number of times the panel was drawn.
+
+    Properties:
+        elapsed (float): The number of seconds since the stream was opened.
+        chunks_per_second (float): The streaming throughput, in chunks (roughly tokens) per second.
+    """
+
+    def __init__(
+        self,
+        console: Console,
+        title: str,
+        config: ConfigurationManager,
+        headless: bool = False,
+        logger: Optional[Logger] = None,
+    ):
+        self.console = console
+        self.title = title
+        self.headless = headless
+        self.chunk_count = 0
+        self.render_count = 0
+
+        # NOTE: Settings are read once per stream instead of once per chunk.
+        refresh_per_second = config.get_value("app.ui.stream.refresh_per_second", 8.0)
+        self._interval = 1.0 / refresh_per_second if refresh_per_second > 0 else 0.0
+        self._title_align = config.get_value("app.ui.rich.panel.title_align", "left")
+        self._border_style = config.get_value("app.ui.rich.panel.border_color", "none")
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+        self._live: Optional[Live] = None
+        self._closed = False
+        self._content = ""
+        self._rendered = True
+        self._started_at = 0.0
+        self._rendered_at = 0.0
+
+    def __enter__(self) -> "StreamRenderer":
+        self._started_at = time.perf_counter()
+        if not self.headless:
+            self._live = Live(console=self.console, auto_refresh=False)
+            self._live.__enter__()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def elapsed(self) -> float:
+        """Get the number of seconds since the stream was opened."""
+        return time.perf_counter() - self._started_at
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Get the streaming throughput, in chunks (roughly tokens) per second."""
+        elapsed = self.elapsed
+        return self.chunk_count / elapsed if elapsed > 0 else 0.0
+
+    def update(self, content: str) -> None:
+        """
+        Record the content accumulated so far, rendering it if a refresh is due.
+
+        Args:
+            content (str): The complete content streamed so far.
+        """
+        self.chunk_count += 1
+        if content is not self._content:
+            self._content = content
+            self._rendered = False
+
+        if self._live is not None and not self._rendered:
+            if time.perf_counter() - self._rendered_at >= self._interval:
+                self._render()
+
+    def close(self) -> None:
+        """Render the complete content, stop the live display, and report the throughput."""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._live is not None:
+            if not self._rendered:
+                self._render()
+            self._live.__exit__(None, None, None)
+            self._live = None
+
+        self._logger.info(
+            "Streamed %d chunks in %.2fs (%.1f chunks/s, %d renders)",
+            self.chunk_count,
+            self.elapsed,
+            self.chunks_per_second,
+            self.render_count,
+        )
+
+    def _render(self) -> None:
+        """Draw the current content as a Markdown panel."""
+        panel = Panel(
+            Markdown(self._content),
+            title=self.title,
+            title_align=self._title_align,
+            border_style=self._border_style,
+        )
+        self._live.update(panel, refresh=True)
+        self._rendered = True
+        self._rendered_at = time.perf_counter()
+        self.render_count += 1
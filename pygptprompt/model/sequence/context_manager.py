@@ -1,12 +1,15 @@
 """
 pygptprompt/model/sequence/context.py
 """
-from typing import Optional
+from typing import Iterable, List, Optional
 
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.message import Message
+from pygptprompt.model.sequence.packing import PackingStrategy, create_packing_strategy
 from pygptprompt.model.sequence.sequence_manager import SequenceManager
 from pygptprompt.storage.chroma import ChromaVectorStore
+from pygptprompt.storage.queue import EmbeddingQueue
 
 
 # TODO: Consider making the system message optional for increased code reusability.
@@ -23,12 +26,16 @@ class ContextWindowManager(SequenceManager):
         provider (str): The provider or source of chat completions.
         config (ConfigurationManager): The configuration manager for accessing settings and configurations.
         chat_model (ChatModel): The chat model used for managing chat completions.
+        vector_store (Optional[ChromaVectorStore]): The vector store for evicted messages, if any.
+        packing_strategy (Optional[PackingStrategy]): Selects the messages kept on overflow. Set by `app.session.packing` if None.
 
     Attributes:
         logger (Logger): The logger instance for logging messages.
         list_template (JSONListTemplate): The template for working with JSON lists.
         token_manager (ContextWindowTokenManager): The token manager for handling chat tokens.
-        sequence (List[ChatModelResponse]): The list of ChatModelResponse objects.
+        sequence (List[Message]): The list of message records.
+        embedding_queue (Optional[EmbeddingQueue]): The background queue embedding evicted messages.
+        packing_strategy (PackingStrategy): Selects the messages kept on overflow.
 
     Properties:
         system_message (ChatModelResponse): The system message at the beginning of the sequence.
@@ -41,6 +48,9 @@ class ContextWindowManager(SequenceManager):
         _append_single_message(message): Append a single ChatModelResponse to the sequence.
         _append_multiple_messages(messages): Append multiple ChatModelResponse objects to the sequence.
         enqueue(message): Add a ChatModelResponse or a list of them to the sequence.
+        dequeue(): Dequeue the oldest non-system message from the context window.
+        evict(count): Dequeue the given number of oldest non-system messages at once.
+        flush_embeddings(): Block until every evicted message is embedded.
     """
 
     def __init__(
@@ -50,10 +60,25 @@ class ContextWindowManager(SequenceManager):
         config: ConfigurationManager,
         chat_model: ChatModel,
         vector_store: Optional[ChromaVectorStore] = None,
+        packing_strategy: Optional[PackingStrategy] = None,
     ):
         super().__init__(file_path, provider, config, chat_model)
 
         self.vector_store = vector_store
+        self.embedding_queue = None
+        self.packing_strategy = packing_strategy or create_packing_strategy(
+            config, vector_store, self.logger
+        )
+
+        if vector_store is not None:
+            self.embedding_queue = EmbeddingQueue(
+                vector_store=vector_store,
+                batch_size=config.get_value("app.database.chroma.batch_size", 32),
+                flush_interval=config.get_value(
+                    "app.database.chroma.flush_interval", 5.0
+                ),
+                logger=self.logger,
+            )
 
     @property
     def reserved_upper_bound(self) -> int:
@@ -68,7 +93,12 @@ class ContextWindowManager(SequenceManager):
         """
         return self.token_manager.reserved_upper_bound
 
-    def dequeue(self) -> ChatModelResponse:
+    @property
+    def _evictable_start(self) -> int:
+        """The index of the oldest message that may be evicted."""
+        return 1 if self.system_message["role"] == "system" else 0
+
+    def dequeue(self) -> Message:
         """
         Dequeues the oldest message from the context window.
 
@@ -77,23 +107,72 @@ class ContextWindowManager(SequenceManager):
         messages into vectors and storing them in the vector store if embedding is enabled.
 
         Returns:
-            None
+            Message: The dequeued message.
+        """
+        return self.evict(1)[0]
+
+    def evict(self, count: int) -> List[Message]:
+        """
+        Dequeues the given number of oldest messages from the context window at once.
+
+        The system message is always preserved. The evicted messages are removed with a
+        single slice operation and handed to the embedding queue as one batch if embedding
+        is enabled. The queue writes them to the vector store in the background.
+
+        Args:
+            count (int): The number of messages to evict.
+
+        Returns:
+            List[Message]: The evicted messages, oldest first.
+        """
+        start = self._evictable_start
+        return self._evict_indices(range(start, start + count))
+
+    def _evict_indices(self, indices: Iterable[int]) -> List[Message]:
         """
-        dequeued_message = self.sequence.pop(1)
+        Evicts the messages at the given positions at once.
+
+        Args:
+            indices (Iterable[int]): The positions of the messages to evict.
+
+        Returns:
+            List[Message]: The evicted messages, oldest first.
+        """
+        evicted_messages = self._pop_indices(indices)
 
         # Embedding messages is optional and is set by the user at runtime.
-        if self.vector_store is not None:
-            self.vector_store.add_message_to_collection(dequeued_message)
+        if self.embedding_queue is not None:
+            self.embedding_queue.put(evicted_messages)
+
+        return evicted_messages
 
-        return dequeued_message
+    def load_to_chat_completions(self) -> bool:
+        """
+        Load data from JSON into the sequence and hand the loaded messages to the packing strategy.
+
+        Returns:
+            bool: True if loading was successful, False on error.
+        """
+        loaded = super().load_to_chat_completions()
+        if loaded:
+            self.packing_strategy.observe(self._sequence[self._evictable_start :])
+        return loaded
+
+    def flush_embeddings(self) -> None:
+        """
+        Block until every evicted message is written to the vector store.
+        """
+        if self.embedding_queue is not None:
+            self.embedding_queue.flush()
 
     def _append_single_message(self, message: ChatModelResponse) -> None:
         """
         Appends a single message to the context window.
 
         This method appends a single message to the context window. It checks the token size
-        to determine if the message causes a chat sequence overflow and dequeues the oldest
-        message if necessary.
+        to determine if the message causes a chat sequence overflow and, if so, evicts every
+        message the packing strategy does not select to keep alongside it. The default FIFO
+        strategy evicts the minimal number of oldest messages necessary to make room for it.
 
         Args:
             message (ChatModelResponse): The message to append to the context window.
@@ -101,6 +180,27 @@ class ContextWindowManager(SequenceManager):
         Returns:
             None
         """
-        if self.token_manager.causes_chat_sequence_overflow(message, self.sequence):
-            self.dequeue()
-        self.sequence.append(message)
+        message = self._to_message(message)
+        token_count = message.token_count
+        self.packing_strategy.observe([message])
+
+        start = self._evictable_start
+        # NOTE: The running token total makes the check O(1) when nothing is evicted.
+        reserved_count = self._sequence[0].token_count if start else 0
+        evictable_count = self.token_count - reserved_count
+        budget = self.token_manager.calculate_token_budget(reserved_count + token_count)
+        if evictable_count > budget:
+            evictable = self._sequence[start:]
+            kept = set(self.packing_strategy.select(evictable, max(0, budget), message))
+            self._evict_indices(
+                start + position
+                for position in range(len(evictable))
+                if position not in kept
+            )
+        if self.token_manager.causes_token_count_overflow(
+            self.token_count + token_count
+        ):
+            self.logger.warning(
+                f"Message with {token_count} tokens overflows the context window."
+            )
+        self._insert_message(len(self), message)
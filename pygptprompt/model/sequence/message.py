@@ -0,0 +1,105 @@
+"""
+pygptprompt/model/sequence/message.py
+"""
+import sys
+from collections.abc import Mapping
+from typing import Any, Iterator, Optional
+
+from pygptprompt.model.base import ChatModelResponse, FunctionCall
+
+
+class Message(Mapping):
+    """
+    A compact, read-only record of a message held by a SequenceManager.
+
+    A Message stores the fields of a ChatModelResponse in slots instead of a
+    dict, interns its role, and caches its token count. It behaves as a
+    read-only mapping of the fields that are set, so it compares equal to the
+    equivalent ChatModelResponse, and it is converted back into a dict with
+    `to_dict()` before it is handed to a model.
+
+    Args:
+        role (str): The role of the message.
+        token_count (Optional[int]): The token count of the message, if known.
+        **fields: The remaining fields of the message, e.g. `content`, `function_call`, `name`, or `user`.
+
+    Attributes:
+        token_count (Optional[int]): The cached token count of the message.
+
+    Methods:
+        from_dict(message, token_count): Create a Message from a ChatModelResponse.
+        to_dict(): Convert the Message into a ChatModelResponse.
+    """
+
+    __slots__ = ("role", "content", "function_call", "name", "user", "token_count")
+
+    # NOTE: The fields of a ChatModelResponse, in the order they are serialized.
+    _fields = ("role", "content", "function_call", "name", "user")
+
+    def __init__(self, role: str, token_count: Optional[int] = None, **fields: Any):
+        object.__setattr__(self, "role", sys.intern(role))
+        object.__setattr__(self, "token_count", token_count)
+        for key, value in fields.items():
+            if key == "role" or key not in self._fields:
+                raise TypeError(f"Unexpected message field: {key}")
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        """Only the cached token count may be changed after creation."""
+        if key != "token_count":
+            raise AttributeError(f"{self.__class__.__name__} is read-only")
+        object.__setattr__(self, key, value)
+
+    def __getitem__(self, key: str) -> Any:
+        """Get the value of a field that is set."""
+        if key not in self._fields:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names of the fields that are set."""
+        return (key for key in self._fields if hasattr(self, key))
+
+    def __len__(self) -> int:
+        """Get the number of fields that are set."""
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
+
+    @classmethod
+    def from_dict(
+        cls, message: ChatModelResponse, token_count: Optional[int] = None
+    ) -> "Message":
+        """
+        Create a Message from a ChatModelResponse.
+
+        Args:
+            message (ChatModelResponse): The message to convert.
+            token_count (Optional[int]): The token count of the message, if known.
+
+        Returns:
+            Message: The message record. A Message is returned as is, with the
+                given token count if any.
+        """
+        if isinstance(message, Message):
+            if token_count is not None:
+                message.token_count = token_count
+            return message
+        return cls(token_count=token_count, **message)
+
+    def to_dict(self) -> ChatModelResponse:
+        """
+        Convert the Message into a ChatModelResponse.
+
+        Returns:
+            ChatModelResponse: The message as a dict.
+        """
+        message = ChatModelResponse(**self)
+        function_call = message.get("function_call")
+        if function_call is not None:
+            message["function_call"] = FunctionCall(**function_call)
+        return message
@@ -0,0 +1,364 @@
+"""
+pygptprompt/model/sequence/packing.py
+"""
+import atexit
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+from typing import Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.sequence.message import Message
+from pygptprompt.pattern.logger import get_default_logger
+from pygptprompt.storage.chroma import ChromaVectorStore
+
+# Scores the relevance of each message to the query message, higher is more relevant.
+RelevanceScorer = Callable[[Message, List[Message]], List[float]]
+
+# Prepares the relevance scores of messages entering the context window.
+RelevancePrefetcher = Callable[[List[Message]], None]
+
+
+class PackingStrategy(ABC):
+    """
+    Abstract base class for selecting which messages a context window keeps.
+
+    A strategy is given the evictable messages, oldest first, and the number of
+    tokens they may consume. It only reads the cached token counts of the
+    messages, so packing never requires tokenizing them again.
+
+    Methods:
+        select(messages, budget, query): Select the positions of the messages to keep.
+        observe(messages): Prepare for messages entering the context window.
+        fit_newest(messages, positions, budget): Keep the newest of the given messages that fit.
+    """
+
+    @abstractmethod
+    def select(self, messages: List[Message], budget: int, query: Message) -> List[int]:
+        """
+        Select the positions of the messages to keep.
+
+        Args:
+            messages (List[Message]): The evictable messages, oldest first.
+            budget (int): The maximum total token count of the kept messages.
+            query (Message): The message being appended to the context window.
+
+        Returns:
+            List[int]: The ascending positions of the messages to keep.
+        """
+        raise NotImplementedError
+
+    def observe(self, messages: List[Message]) -> None:
+        """
+        Prepare for messages entering the context window. Does nothing by default.
+
+        Args:
+            messages (List[Message]): The messages entering the context window.
+        """
+
+    @staticmethod
+    def fit_newest(
+        messages: List[Message], positions: List[int], budget: int
+    ) -> List[int]:
+        """
+        Keep the newest of the given messages, up to the first one that does not fit.
+
+        Args:
+            messages (List[Message]): The evictable messages, oldest first.
+            positions (List[int]): The ascending positions of the candidate messages.
+            budget (int): The maximum total token count of the kept messages.
+
+        Returns:
+            List[int]: The ascending positions of the kept messages.
+        """
+        kept = 0
+        for count, position in enumerate(reversed(positions)):
+            budget -= messages[position].token_count
+            if budget < 0:
+                break
+            kept = count + 1
+        return positions[len(positions) - kept :]
+
+
+class FIFOPacking(PackingStrategy):
+    """
+    Evicts the fewest oldest messages necessary, keeping the newest messages that fit.
+    """
+
+    def select(self, messages: List[Message], budget: int, query: Message) -> List[int]:
+        return self.fit_newest(messages, list(range(len(messages))), budget)
+
+
+class LastPairsPacking(PackingStrategy):
+    """
+    Keeps the newest exchanges, starting with the Nth most recent user message.
+
+    The message being appended opens a new exchange if it is a user message.
+    Older messages are evicted even if they would fit, which leaves room for
+    several appends before the next eviction.
+
+    Args:
+        pairs (int): The number of exchanges to keep. Default is 4.
+    """
+
+    def __init__(self, pairs: int = 4):
+        self.pairs = max(1, pairs)
+
+    def select(self, messages: List[Message], budget: int, query: Message) -> List[int]:
+        remaining = self.pairs - (query.role == "user")
+        start = len(messages)
+        while start > 0 and remaining > 0:
+            start -= 1
+            remaining -= messages[start].role == "user"
+        return self.fit_newest(messages, list(range(start, len(messages))), budget)
+
+
+class RelevancePacking(PackingStrategy):
+    """
+    Keeps the messages most relevant to the incoming message as a 0/1 knapsack.
+
+    The newest `keep_last` messages are always kept when they fit, so the current
+    exchange stays coherent. The remaining budget is filled greedily by relevance
+    per token, which approximates the knapsack in O(n log n) time. Messages
+    without a relevance score then fill what is left newest first, so packing
+    degrades to FIFO while no scores are available.
+
+    Args:
+        score (RelevanceScorer): Scores the relevance of each message to the query message.
+        keep_last (int): The number of newest messages that are always kept. Default is 2.
+        prefetch (Optional[RelevancePrefetcher]): Prepares the scores of messages entering the context window, if any.
+    """
+
+    def __init__(
+        self,
+        score: RelevanceScorer,
+        keep_last: int = 2,
+        prefetch: Optional[RelevancePrefetcher] = None,
+    ):
+        self.score = score
+        self.keep_last = max(0, keep_last)
+        self.prefetch = prefetch
+
+    def observe(self, messages: List[Message]) -> None:
+        if self.prefetch is not None:
+            self.prefetch(messages)
+
+    def select(self, messages: List[Message], budget: int, query: Message) -> List[int]:
+        recent = list(range(max(0, len(messages) - self.keep_last), len(messages)))
+        kept = self.fit_newest(messages, recent, budget)
+        budget -= sum(messages[position].token_count for position in kept)
+
+        candidates = list(range(len(messages) - len(recent)))
+        scores = self.score(query, [messages[position] for position in candidates])
+        # NOTE: Ties are broken in favor of newer messages.
+        ranked = sorted(
+            candidates,
+            key=lambda position: (
+                scores[position] / max(1, messages[position].token_count),
+                position,
+            ),
+            reverse=True,
+        )
+        for position in ranked:
+            token_count = messages[position].token_count
+            if scores[position] > 0 and token_count <= budget:
+                kept.append(position)
+                budget -= token_count
+
+        unscored = [position for position in candidates if scores[position] <= 0]
+        kept.extend(self.fit_newest(messages, unscored, budget))
+        return sorted(kept)
+
+
+class VectorStoreRelevance:
+    """
+    Scores messages by the cosine similarity of their embeddings to the query message.
+
+    Messages are embedded by a background thread as they enter the context
+    window, with the embedding function of the vector store, which reuses the
+    embeddings in its cache, e.g. those of messages embedded by the
+    EmbeddingQueue. Scoring only reads the embeddings that are ready, so it
+    never waits for the embedding model on the chat hot path. Messages whose
+    embedding is not ready score 0.0, and if the query message is not ready,
+    the newest message entering the context window with a ready embedding
+    stands in for it.
+
+    Args:
+        vector_store (ChromaVectorStore): The vector store providing the embedding function.
+        max_size (int): The maximum number of cached embeddings. Default is 4096.
+        logger (Optional[Logger]): Optional logger for error-handling.
+
+    Methods:
+        prefetch(messages): Embed messages in the background.
+    """
+
+    def __init__(
+        self,
+        vector_store: ChromaVectorStore,
+        max_size: int = 4096,
+        logger: Optional[Logger] = None,
+    ):
+        self.vector_store = vector_store
+        self.max_size = max_size
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._recent: Deque[str] = deque(maxlen=8)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=self.__class__.__name__
+        )
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+        # NOTE: Pending embeddings are dropped at shutdown.
+        atexit.register(self._executor.shutdown, wait=False, cancel_futures=True)
+
+    def __call__(self, query: Message, messages: List[Message]) -> List[float]:
+        """
+        Score the relevance of each message to the query message.
+
+        Args:
+            query (Message): The message being appended to the context window.
+            messages (List[Message]): The messages to score.
+
+        Returns:
+            List[float]: The cosine similarity of each message to the query, or 0.0
+                for messages without content or without a ready embedding.
+        """
+        texts = [message.get("content") or "" for message in messages]
+        query_text = query.get("content") or ""
+        if not query_text or not any(texts):
+            return [0.0] * len(messages)
+
+        with self._lock:
+            candidates = [query_text] + list(reversed(self._recent))
+            query_embedding = next(
+                (
+                    self._embeddings[text]
+                    for text in candidates
+                    if text in self._embeddings
+                ),
+                None,
+            )
+            embeddings = {
+                text: self._embeddings[text]
+                for text in texts
+                if text in self._embeddings
+            }
+        if query_embedding is None:
+            return [0.0] * len(messages)
+
+        return [
+            (
+                float(np.dot(query_embedding, embeddings[text]))
+                if text in embeddings
+                else 0.0
+            )
+            for text in texts
+        ]
+
+    def prefetch(self, messages: List[Message]) -> None:
+        """
+        Embed the content of messages entering the context window in the background.
+
+        Args:
+            messages (List[Message]): The messages entering the context window.
+        """
+        texts = [message.get("content") for message in messages]
+        texts = [text for text in texts if text]
+        if not texts:
+            return
+        with self._lock:
+            self._recent.extend(texts)
+        try:
+            self._executor.submit(self._embed, texts)
+        except RuntimeError:
+            pass  # NOTE: The executor is shut down at exit.
+
+    def _embed(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Embed the uncached texts as one batch and cache their normalized embeddings.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            Dict[str, np.ndarray]: The normalized embedding of each text embedded.
+        """
+        with self._lock:
+            missing = list(
+                dict.fromkeys(text for text in texts if text not in self._embeddings)
+            )
+        if not missing:
+            return {}
+
+        try:
+            vectors = np.asarray(
+                self.vector_store.embedding_function(missing), dtype=np.float32
+            )
+        except Exception as e:
+            self._logger.error(f"Error embedding messages for relevance: {e}")
+            return {}
+        if vectors.ndim != 2 or len(vectors) != len(missing):
+            self._logger.error("Error embedding messages for relevance")
+            return {}
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        embedded = dict(zip(missing, vectors))
+        with self._lock:
+            self._embeddings.update(embedded)
+            while len(self._embeddings) > self.max_size:
+                self._embeddings.popitem(last=False)
+        return embedded
+
+
+def create_packing_strategy(
+    config: ConfigurationManager,
+    vector_store: Optional[ChromaVectorStore] = None,
+    logger: Optional[Logger] = None,
+) -> PackingStrategy:
+    """
+    Create the packing strategy set by `app.session.packing.strategy`.
+
+    The strategies are "fifo" (default), "last_pairs", which keeps the last
+    `app.session.packing.pairs` exchanges, and "relevance", which keeps the
+    messages most relevant to the incoming message along with the last
+    `app.session.packing.keep_last` messages.
+
+    Args:
+        config (ConfigurationManager): The configuration manager for accessing settings and configurations.
+        vector_store (Optional[ChromaVectorStore]): The vector store used to score relevance, if any.
+        logger (Optional[Logger]): Optional logger for error-handling.
+
+    Returns:
+        PackingStrategy: The packing strategy.
+
+    Raises:
+        ValueError: If the strategy is not supported.
+    """
+    logger = logger or get_default_logger("create_packing_strategy")
+    strategy = config.get_value("app.session.packing.strategy", "fifo")
+
+    if strategy == "fifo":
+        return FIFOPacking()
+    if strategy == "last_pairs":
+        return LastPairsPacking(config.get_value("app.session.packing.pairs", 4))
+    if strategy == "relevance":
+        if vector_store is None:
+            logger.warning("Relevance packing requires a vector store, using fifo")
+            return FIFOPacking()
+        relevance = VectorStoreRelevance(vector_store, logger=logger)
+        return RelevancePacking(
+            relevance,
+            keep_last=config.get_value("app.session.packing.keep_last", 2),
+            prefetch=relevance.prefetch,
+        )
+
+    raise ValueError(f"Unsupported packing strategy: {strategy}")
@@ -0,0 +1,93 @@
+"""
+pygptprompt/model/sequence/paged_sequence.py
+"""
+from collections import OrderedDict
+from typing import Callable, Iterator, List, Sequence, Union
+
+from pygptprompt.model.sequence.message import Message
+
+# Loads `limit` stored messages starting at `offset`, oldest first.
+PageLoader = Callable[[int, int], List[Message]]
+
+
+class PagedSequence(Sequence[Message]):
+    """
+    A read-only view of stored messages followed by the messages held in memory.
+
+    The stored messages are paged in from disk on demand and the most recently
+    used pages are kept in memory, so random access and iteration never require
+    reading the whole history at once.
+
+    Args:
+        stored_length (int): The number of stored messages.
+        load_page (PageLoader): Loads `limit` stored messages starting at `offset`.
+        tail (List[Message]): The messages held in memory, following the stored messages.
+        page_size (int): The number of messages per page. Default is 256.
+        max_pages (int): The maximum number of pages kept in memory. Default is 4.
+
+    Methods:
+        invalidate(): Drop the pages kept in memory.
+    """
+
+    def __init__(
+        self,
+        stored_length: int,
+        load_page: PageLoader,
+        tail: List[Message],
+        page_size: int = 256,
+        max_pages: int = 4,
+    ):
+        self.stored_length = stored_length
+        self.page_size = max(1, page_size)
+        self.max_pages = max(1, max_pages)
+        self._load_page = load_page
+        self._tail = tail
+        self._pages: OrderedDict[int, List[Message]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Get the number of stored and in-memory messages."""
+        return self.stored_length + len(self._tail)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Message, List[Message]]:
+        """Get the message at the specified index, or a list of messages for a slice."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        index = range(len(self))[index]
+        if index >= self.stored_length:
+            return self._tail[index - self.stored_length]
+
+        page = self._get_page(index // self.page_size)
+        return page[index % self.page_size]
+
+    def __iter__(self) -> Iterator[Message]:
+        """Iterate over the stored messages page by page, then the in-memory messages."""
+        for number in range(0, -(-self.stored_length // self.page_size)):
+            yield from self._get_page(number)
+        yield from self._tail
+
+    def _get_page(self, number: int) -> List[Message]:
+        """
+        Get a page of stored messages, loading it from disk if needed.
+
+        Args:
+            number (int): The page number, starting at 0.
+
+        Returns:
+            List[Message]: The messages of the page.
+        """
+        page = self._pages.get(number)
+        if page is None:
+            offset = number * self.page_size
+            limit = min(self.page_size, self.stored_length - offset)
+            page = self._load_page(offset, limit)
+            self._pages[number] = page
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(number)
+        return page
+
+    def invalidate(self) -> None:
+        """Drop the pages kept in memory, e.g. after a stored message changed."""
+        self._pages.clear()
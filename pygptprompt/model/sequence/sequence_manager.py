@@ -2,11 +2,16 @@
 pygptprompt/model/sequence/manager.py
 """
 
-from typing import Iterator, List, Protocol, Union
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Union
 
 from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.json.lines import JSONLinesTemplate
 from pygptprompt.json.list import JSONListTemplate
 from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.message import Message
 from pygptprompt.model.sequence.token_manager import TokenManager
 
 
@@ -18,6 +23,22 @@ class SequenceManager(Protocol):
     of ChatModelResponse objects, including loading and saving from JSON, appending,
     dequeuing, and other common sequence operations.
 
+    Messages are held as compact Message records caching their token counts.
+    A Message is a read-only mapping, and is converted back into a dict with
+    `Message.to_dict()` before it is handed to a model.
+
+    The storage format is set by `app.session.storage`:
+
+    - "json" (default): The whole sequence is rewritten to `file_path` on save.
+    - "jsonl": The sequence is stored as a JSON Lines snapshot with a log of the
+      operations applied since the snapshot. A save only appends what changed;
+      messages appended to an unmodified snapshot are appended to the snapshot
+      itself. The log is compacted into a new snapshot once it holds more than
+      `app.session.compact_threshold` operations or more operations than the
+      sequence holds messages. Appends are fsynced at most once every
+      `app.session.fsync_interval` seconds, while snapshots are always fsynced.
+    - "sqlite": The sequence is stored in an SQLite table by SQLiteSequenceManager.
+
     Args:
         file_path (str): The file path to the JSON file used to store chat completion data.
         provider (str): The provider or source of chat completions.
@@ -28,7 +49,8 @@ class SequenceManager(Protocol):
         logger (Logger): The logger instance for logging messages.
         list_template (JSONListTemplate): The template for working with JSON lists.
         token_manager (ContextWindowTokenManager): The token manager for handling chat tokens.
-        sequence (List[ChatModelResponse]): The list of ChatModelResponse objects.
+        sequence (List[Message]): The list of message records.
+        token_counts (List[int]): The cached token count of each message in the sequence.
 
     Properties:
         system_message (ChatModelResponse): The system message at the beginning of the sequence.
@@ -60,31 +82,56 @@ class SequenceManager(Protocol):
             key="general", logger_name=self.__class__.__name__
         )
 
-        self._sequence = []
+        self._provider = provider
+
+        # NOTE: Each message caches its token count and the total is kept in
+        # step with the sequence, so it never requires re-tokenizing the messages.
+        self._sequence: List[Message] = []
+        self._token_total: int = 0
 
         self._token_manager = TokenManager(
             provider=provider, config=config, chat_model=chat_model
         )
 
+        self._storage = config.get_value("app.session.storage", "json")
+        self._compact_threshold = config.get_value("app.session.compact_threshold", 256)
+        self._fsync_interval = config.get_value("app.session.fsync_interval", 1.0)
+        self._fsynced_at = 0.0
+
+        # NOTE: Operations applied since the last save, used by the jsonl storage.
+        self._pending: List[Dict[str, Any]] = []
+        self._log_length = 0
+        self._snapshot_id: Optional[str] = None
+
         self._list_template = JSONListTemplate(file_path=file_path, logger=self.logger)
+        self._snapshot_template = JSONLinesTemplate(
+            file_path=Path(file_path).with_suffix(".jsonl"), logger=self.logger
+        )
+        self._log_template = JSONLinesTemplate(
+            file_path=Path(file_path).with_suffix(".log.jsonl"), logger=self.logger
+        )
 
     def __len__(self) -> int:
         """Get the length of the sequence."""
         return len(self._sequence)
 
-    def __getitem__(self, index) -> ChatModelResponse:
-        """Get a ChatModelResponse at the specified index."""
+    def __getitem__(self, index) -> Message:
+        """Get a Message at the specified index."""
         return self._sequence[index]
 
     def __setitem__(self, index: int, value: ChatModelResponse):
         """Set a ChatModelResponse at the specified index."""
-        self._sequence[index] = value
+        index = range(len(self._sequence))[index]
+        message = self._to_message(value)
+        self._token_total += message.token_count - self._sequence[index].token_count
+        self._sequence[index] = message
+        self._pending.append({"op": "set", "index": index, "message": message})
 
     def __delitem__(self, index: int):
         """Delete a ChatModelResponse at the specified index."""
-        del self._sequence[index]
+        self._pop_message(index)
 
-    def __iter__(self) -> Iterator[ChatModelResponse]:
+    def __iter__(self) -> Iterator[Message]:
         """Get an iterator for the sequence."""
         return iter(self._sequence)
 
@@ -93,12 +140,12 @@ class SequenceManager(Protocol):
         return item in self._sequence
 
     @property
-    def sequence(self) -> List[ChatModelResponse]:
+    def sequence(self) -> List[Message]:
         """
-        Get the sequence of ChatModelResponse objects.
+        Get the sequence of message records.
 
         Returns:
-            List[ChatModelResponse]: The sequence of chat responses.
+            List[Message]: The sequence of chat responses.
 
         NOTE:
             A sequence is expected to only ever contain a single system message, and the system message should be the first element. Any other form is considered undefined behavior.
@@ -115,6 +162,16 @@ class SequenceManager(Protocol):
         """
         return self._token_manager
 
+    @property
+    def token_counts(self) -> List[int]:
+        """
+        Get the cached token count of each message in the sequence.
+
+        Returns:
+            List[int]: The token counts, index aligned with the sequence.
+        """
+        return [message.token_count for message in self._sequence]
+
     @property
     def token_count(self) -> int:
         """
@@ -122,18 +179,21 @@ class SequenceManager(Protocol):
 
         Returns:
             int: The total number of tokens.
+
+        NOTE:
+            The total is maintained incrementally and is read in constant time.
         """
-        return self._token_manager.calculate_chat_sequence_length(self._sequence)
+        return self._token_total
 
     @property
-    def system_message(self) -> ChatModelResponse:
+    def system_message(self) -> Union[Message, ChatModelResponse]:
         """
         Get the system message at the beginning of the sequence.
 
         Returns:
-            ChatModelResponse: The system message, or an empty message if no system prompt is found.
+            Union[Message, ChatModelResponse]: The system message, or an empty message if no system prompt is found.
         """
-        if self._sequence and self._sequence[0]["role"] == "system":
+        if self._sequence and self._sequence[0].role == "system":
             return self._sequence[0]
 
         # If no system prompt is found, return an empty message
@@ -149,44 +209,336 @@ class SequenceManager(Protocol):
         """
         if len(self._sequence) > 0:
             # Check the role of the first message
-            if self._sequence[0]["role"] == "system":
+            if self._sequence[0].role == "system":
                 # Replace the existing system message
-                self._sequence[0] = value
+                self[0] = value
             else:
                 # Insert a new system message at the beginning
-                self._sequence.insert(0, value)
+                self._insert_message(0, value)
         else:
             # If the sequence is empty, add the system message
-            self._sequence.append(value)
+            self._insert_message(0, value)
+
+    def _to_message(self, message: ChatModelResponse) -> Message:
+        """
+        Convert a ChatModelResponse into a Message, counting its tokens if needed.
+
+        Args:
+            message (ChatModelResponse): The message to convert.
+
+        Returns:
+            Message: The message record with its token count.
+        """
+        message = Message.from_dict(message)
+        if message.token_count is None:
+            message.token_count = self._token_manager.calculate_chat_message_length(
+                message
+            )
+        return message
+
+    def _insert_message(self, index: int, message: ChatModelResponse) -> None:
+        """
+        Insert a ChatModelResponse at the specified index.
+
+        Args:
+            index (int): The position to insert the message at.
+            message (ChatModelResponse): The message to insert. A Message keeps its cached token count.
+        """
+        message = self._to_message(message)
+        index = slice(index, None).indices(len(self._sequence))[0]
+        self._sequence.insert(index, message)
+        self._token_total += message.token_count
+        self._pending.append({"op": "insert", "index": index, "message": message})
+
+    def _pop_message(self, index: int = -1) -> Message:
+        """
+        Remove and return the Message at the specified index.
+
+        Args:
+            index (int): The position of the message to remove. Defaults to the last message.
+
+        Returns:
+            Message: The removed message.
+        """
+        index = range(len(self._sequence))[index]
+        return self._pop_messages(index, index + 1)[0]
+
+    def _pop_messages(self, start: int, stop: int) -> List[Message]:
+        """
+        Remove and return the Message objects within the given range.
+
+        The range is removed with a single slice deletion, so the remaining
+        messages are shifted once regardless of how many are removed.
+
+        Args:
+            start (int): The position of the first message to remove.
+            stop (int): The position after the last message to remove.
+
+        Returns:
+            List[Message]: The removed messages in their original order.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self._sequence))
+        messages = self._sequence[start:stop]
+        self._token_total -= sum(message.token_count for message in messages)
+        del self._sequence[start:stop]
+        if messages:
+            self._pending.append({"op": "delete", "start": start, "stop": stop})
+        return messages
+
+    def _pop_indices(self, indices: Iterable[int]) -> List[Message]:
+        """
+        Remove and return the Message objects at the given positions.
+
+        Each contiguous run of positions is removed with a single slice deletion,
+        starting with the last run so the positions of the others are unchanged.
+
+        Args:
+            indices (Iterable[int]): The positions of the messages to remove.
+
+        Returns:
+            List[Message]: The removed messages in their original order.
+        """
+        runs: List[List[int]] = []
+        for index in sorted(set(indices)):
+            if runs and runs[-1][1] == index:
+                runs[-1][1] += 1
+            else:
+                runs.append([index, index + 1])
+
+        messages: List[Message] = []
+        for start, stop in reversed(runs):
+            messages.extend(reversed(self._pop_messages(start, stop)))
+        messages.reverse()
+        return messages
+
+    def _to_record(self, message: Message) -> Dict[str, Any]:
+        """
+        Convert a Message into a record for storage.
+
+        Each message is stored with its token count keyed by provider, e.g.
+        `"token_count": {"llama_cpp": 42}`.
+
+        Args:
+            message (Message): The message to convert.
+
+        Returns:
+            Dict[str, Any]: The stored record.
+        """
+        return dict(message, token_count={self._provider: message.token_count})
+
+    def _from_records(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Replace the sequence with the messages from the given stored records.
+
+        Token counts stored alongside each message are reused when they were
+        recorded for the current provider; otherwise the messages are re-tokenized
+        as a single batch.
+
+        Args:
+            records (List[Dict[str, Any]]): The stored records.
+        """
+        self._sequence = [self._from_record(record) for record in records]
+        self._count_missing_tokens()
+
+    def _from_record(self, record: Dict[str, Any]) -> Message:
+        """
+        Convert a stored record into a Message.
+
+        Args:
+            record (Dict[str, Any]): The stored record.
+
+        Returns:
+            Message: The message, with its token count if it was recorded for the
+                current provider.
+        """
+        fields = {key: value for key, value in record.items() if key != "token_count"}
+        token_count = record.get("token_count")
+        if isinstance(token_count, dict):
+            token_count = token_count.get(self._provider)
+        else:
+            token_count = None  # NOTE: Unknown tokenizer, count again
+        return Message(token_count=token_count, **fields)
+
+    def _count_missing_tokens(self) -> None:
+        """Count the tokens of every message without a token count as one batch."""
+        missing = [message for message in self._sequence if message.token_count is None]
+        counts = self._token_manager.calculate_chat_message_lengths(missing)
+        for message, token_count in zip(missing, counts):
+            message.token_count = token_count
+
+        self._token_total = sum(message.token_count for message in self._sequence)
 
     def load_to_chat_completions(self) -> bool:
         """
         Load data from JSON into the sequence.
 
+        Token counts stored alongside each message are reused when they were
+        recorded for the current provider; otherwise the messages are re-tokenized
+        as a single batch.
+
         Returns:
             bool: True if loading was successful, False on error.
         """
-        if self._list_template.load_json():
-            self._sequence = [
-                ChatModelResponse(**message) for message in self._list_template.data
-            ]
-            return True
-        return False
+        if self._storage == "jsonl":
+            loaded = self._load_from_jsonl()
+        elif self._list_template.load_json():
+            self._from_records(self._list_template.data)
+            loaded = True
+        else:
+            loaded = False
+
+        if loaded:
+            self._pending = []
+        return loaded
+
+    def _load_from_jsonl(self) -> bool:
+        """
+        Load the JSON Lines snapshot and replay the operation log on top of it.
+
+        The first line of the snapshot identifies it, and the first line of the log
+        names the snapshot it applies to. A log left behind by an interrupted
+        compaction is therefore ignored instead of being replayed twice, and
+        truncated so the next save starts a new log.
+
+        Returns:
+            bool: True if loading was successful, False on error.
+        """
+        if not self._snapshot_template.load_jsonl():
+            return False
+
+        records = self._snapshot_template.data
+        self._snapshot_id = None
+        self._log_length = 0
+
+        if records and "snapshot" in records[0]:
+            self._snapshot_id = records.pop(0)["snapshot"]
+
+        if self._log_template.exists() and self._log_template.load_jsonl():
+            operations = self._log_template.data
+
+            if operations and operations[0].get("snapshot") != self._snapshot_id:
+                self.logger.warning(
+                    f"Ignoring stale operation log {self._log_template.file_path}"
+                )
+                self._log_template.save_jsonl([])
+                operations = []
+
+            for operation in operations[1:]:
+                if operation["op"] == "insert":
+                    records.insert(operation["index"], operation["message"])
+                elif operation["op"] == "set":
+                    records[operation["index"]] = operation["message"]
+                elif operation["op"] == "delete":
+                    del records[operation["start"] : operation["stop"]]
+                self._log_length += 1
+
+        self._from_records(records)
+        return True
 
     def save_from_chat_completions(self) -> bool:
         """
         Save the sequence to JSON.
 
+        Each message is stored with its token count keyed by provider, e.g.
+        `"token_count": {"llama_cpp": 42}`.
+
         Returns:
             bool: True if saving was successful, False on error.
         """
-        if self._sequence:
-            data: List[ChatModelResponse] = [
-                dict(message) for message in self._sequence
+        if not self._sequence:
+            return False
+
+        if self._storage == "jsonl":
+            saved = self._save_to_jsonl()
+        else:
+            data: List[Dict[str, Any]] = [
+                self._to_record(message) for message in self._sequence
             ]
-            return self._list_template.save_json(data)
+            saved = self._list_template.save_json(data)
+
+        if saved:
+            self._pending = []
+        return saved
+
+    def _save_to_jsonl(self) -> bool:
+        """
+        Save the pending operations as JSON Lines.
+
+        Returns:
+            bool: True if saving was successful, False on error.
+        """
+        log_length = self._log_length + len(self._pending)
+
+        if self._snapshot_id is None or log_length > max(
+            self._compact_threshold, len(self._sequence)
+        ):
+            return self._compact_jsonl()
+
+        if not self._pending:
+            return True
+
+        now = time.monotonic()
+        fsync = now - self._fsynced_at >= self._fsync_interval
+        if fsync:
+            self._fsynced_at = now
+
+        start = len(self._sequence) - len(self._pending)
+        appends_only = all(
+            operation["op"] == "insert" and operation["index"] == start + offset
+            for offset, operation in enumerate(self._pending)
+        )
+
+        # NOTE: Appending to an unmodified snapshot keeps it append-only.
+        if self._log_length == 0 and appends_only:
+            records = [
+                self._to_record(operation["message"]) for operation in self._pending
+            ]
+            return self._snapshot_template.append_jsonl(records, fsync=fsync)
+
+        records = []
+        if self._log_length == 0:
+            records.append({"snapshot": self._snapshot_id})
+        for operation in self._pending:
+            record = dict(operation)
+            if "message" in operation:
+                record["message"] = self._to_record(operation["message"])
+            records.append(record)
+
+        # NOTE: The first segment replaces any log naming another snapshot.
+        if self._log_length == 0:
+            saved = self._log_template.save_jsonl(records, fsync=fsync)
+        else:
+            saved = self._log_template.append_jsonl(records, fsync=fsync)
+        if saved:
+            self._log_length = log_length
+            return True
         return False
 
+    def _compact_jsonl(self) -> bool:
+        """
+        Write a new JSON Lines snapshot of the sequence and truncate the operation log.
+
+        Returns:
+            bool: True if compacting was successful, False on error.
+        """
+        snapshot_id = uuid.uuid4().hex
+        records = [{"snapshot": snapshot_id}] + [
+            self._to_record(message) for message in self._sequence
+        ]
+
+        if not self._snapshot_template.save_jsonl(records):
+            return False
+
+        self._snapshot_id = snapshot_id
+        self._log_length = 0
+        self._fsynced_at = time.monotonic()
+        self.logger.debug(f"Compacted {self._snapshot_template.file_path}")
+
+        # NOTE: The log now names a stale snapshot and is ignored if this fails.
+        if self._log_template.exists():
+            return self._log_template.save_jsonl([])
+        return True
+
     def _append_single_message(self, message: ChatModelResponse) -> None:
         """
         Append a single ChatModelResponse to the sequence.
@@ -194,7 +546,7 @@ class SequenceManager(Protocol):
         Args:
             message (ChatModelResponse): The ChatModelResponse to append.
         """
-        self._sequence.append(message)
+        self._insert_message(len(self._sequence), message)
 
     def _append_multiple_messages(self, messages: List[ChatModelResponse]) -> None:
         """
@@ -204,7 +556,7 @@ class SequenceManager(Protocol):
             messages (List[ChatModelResponse]): The list of ChatModelResponse objects to append.
         """
         for message in messages:
-            self.append_single_message(message)
+            self._append_single_message(message)
 
     def enqueue(
         self, message: Union[ChatModelResponse, List[ChatModelResponse]]
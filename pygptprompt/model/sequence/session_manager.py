@@ -10,6 +10,10 @@ from rich.panel import Panel
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import ChatModel, ChatModelResponse
 from pygptprompt.model.sequence.context_manager import ContextWindowManager
+from pygptprompt.model.sequence.sqlite_manager import (
+    SQLiteContextWindowManager,
+    SQLiteTranscriptManager,
+)
 from pygptprompt.model.sequence.transcript_manager import TranscriptManager
 from pygptprompt.storage.chroma import ChromaVectorStore
 
@@ -42,7 +46,14 @@ class SessionManager:
     ) -> Tuple[ContextWindowManager, TranscriptManager]:
         file_path = f"{config.evaluate_path('app.cache')}/{session_name}_{{}}.json"
 
-        context_window = ContextWindowManager(
+        if config.get_value("app.session.storage", "json") == "sqlite":
+            context_class = SQLiteContextWindowManager
+            transcript_class = SQLiteTranscriptManager
+        else:
+            context_class = ContextWindowManager
+            transcript_class = TranscriptManager
+
+        context_window = context_class(
             file_path=file_path.format("context"),
             provider=provider,
             config=config,
@@ -50,7 +61,7 @@ class SessionManager:
             vector_store=vector_store,
         )
 
-        transcript = TranscriptManager(
+        transcript = transcript_class(
             file_path=file_path.format("transcript"),
             provider=provider,
             config=config,
@@ -97,6 +108,12 @@ class SessionManager:
         self._initialize_managers(system_prompt=system_prompt)
 
     def save(self) -> bool:
+        # NOTE: Evicted messages are embedded in the background and
+        # must be persisted along with the context and transcript.
+        self.context_window.flush_embeddings()
+        # NOTE: Lets the model resume the context without evaluating it again.
+        if self.chat_model.save_prompt_state(self.session_name):
+            self.logger.debug(f"Saved prompt state for session {self.session_name}")
         return (
             self.context_window.save_from_chat_completions()
             and self.transcript.save_from_chat_completions()
@@ -113,9 +130,10 @@ class SessionManager:
         sequence = []
         if roles is None:
             roles = ["system", "user", "assistant", "function"]
+        # NOTE: Messages are converted into dicts at the model API boundary.
         for message in self.context_window:
-            if message["role"] in roles:
-                sequence.append(message)
+            if message.role in roles:
+                sequence.append(message.to_dict())
         return sequence
 
     def print(
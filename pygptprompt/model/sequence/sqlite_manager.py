@@ -0,0 +1,585 @@
+"""
+pygptprompt/model/sequence/sqlite_manager.py
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from peewee import Model, chunked, fn
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.context_manager import ContextWindowManager
+from pygptprompt.model.sequence.message import Message
+from pygptprompt.model.sequence.paged_sequence import PagedSequence
+from pygptprompt.model.sequence.sequence_manager import SequenceManager
+from pygptprompt.model.sequence.transcript_manager import TranscriptManager
+from pygptprompt.storage.sqlite import SQLiteMemoryStore
+
+
+class SQLiteSequenceManager(SequenceManager):
+    """
+    A SequenceManager persisting its messages to an SQLite `sequence_` table.
+
+    Each sequence is stored in the table `sequence_{name}` of the SQLite database
+    set by `app.database.sqlite`, where `name` is the stem of `file_path`, e.g.
+    `default_context`. A save only writes the operations applied since the last
+    save: appended messages are bulk inserted, evicted messages are deleted by
+    row id, and all of it is committed as a single transaction.
+
+    Rows are read in pages of `app.session.page_size` messages, so the stored
+    history may be read page by page without loading it into the sequence.
+
+    Args:
+        file_path (str): The file path naming the sequence table.
+        provider (str): The provider or source of chat completions.
+        config (ConfigurationManager): The configuration manager for accessing settings and configurations.
+        chat_model (ChatModel): The chat model used for managing chat completions.
+
+    Attributes:
+        memory_store (SQLiteMemoryStore): The SQLite store holding the sequence table.
+        table_name (str): The name of the sequence, without the `sequence_` prefix.
+        page_size (int): The number of rows read per page.
+
+    Methods:
+        load_to_chat_completions(): Load the stored messages into the sequence.
+        save_from_chat_completions(): Save the pending operations to the sequence table.
+        get_page(page, page_size): Get a page of stored messages.
+        iter_pages(page_size): Iterate over the stored messages page by page.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        provider: str,
+        config: ConfigurationManager,
+        chat_model: ChatModel,
+        **kwargs,
+    ):
+        super().__init__(file_path, provider, config, chat_model, **kwargs)
+
+        self.memory_store = SQLiteMemoryStore(config)
+        self.table_name = Path(file_path).stem
+        self.page_size = config.get_value("app.session.page_size", 256)
+
+        # NOTE: The row id of each stored message, index aligned with the
+        # sequence as of the last load or save.
+        self._row_ids: List[int] = []
+        self._model: Optional[Model] = None
+
+    @property
+    def model(self) -> Model:
+        """
+        Get the Peewee Model of the sequence table, creating the table if needed.
+
+        Returns:
+            Model: The Peewee Model for the sequence table.
+        """
+        if self._model is None:
+            self._model = self.memory_store.get_model("sequence", self.table_name)
+        return self._model
+
+    def _to_row(self, message: Message) -> Dict[str, Any]:
+        """
+        Convert a Message into a row of the sequence table.
+
+        Args:
+            message (Message): The message to convert.
+
+        Returns:
+            Dict[str, Any]: The row.
+        """
+        function_call = message.get("function_call") or {}
+        return {
+            "role": message["role"],
+            "content": message.get("content"),
+            "function_call": function_call.get("name"),
+            "function_args": function_call.get("arguments"),
+            "name": message.get("name"),
+            "user": message.get("user"),
+            "provider": self._provider,
+            "token_count": message.token_count,
+            "timestamp": datetime.now(),
+        }
+
+    def _from_row(self, row: Model) -> Message:
+        """
+        Convert a row of the sequence table into a Message.
+
+        Args:
+            row (Model): The row.
+
+        Returns:
+            Message: The message, with its token count if it was recorded for the
+                current provider.
+        """
+        fields = {"content": row.content}
+        if row.function_call is not None:
+            fields["function_call"] = {
+                "name": row.function_call,
+                "arguments": row.function_args or "",
+            }
+        if row.name is not None:
+            fields["name"] = row.name
+        if row.user is not None:
+            fields["user"] = row.user
+
+        token_count = row.token_count if row.provider == self._provider else None
+        return Message(row.role, token_count=token_count, **fields)
+
+    def _iter_rows(self, page_size: Optional[int] = None) -> Iterator[List[Model]]:
+        """
+        Iterate over the rows of the sequence table page by page, oldest first.
+
+        Pages are selected by row id rather than by offset, so each page is read
+        with a single index seek.
+
+        Args:
+            page_size (Optional[int]): The number of rows per page. Defaults to `page_size`.
+
+        Yields:
+            List[Model]: The rows of the next page.
+        """
+        model = self.model
+        page_size = page_size or self.page_size
+        last_id = 0
+
+        while True:
+            rows = list(
+                model.select()
+                .where(model.id > last_id)
+                .order_by(model.id)
+                .limit(page_size)
+            )
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].id
+
+    def get_page(self, page: int, page_size: Optional[int] = None) -> List[Message]:
+        """
+        Get a page of stored messages, oldest first.
+
+        Args:
+            page (int): The page number, starting at 1.
+            page_size (Optional[int]): The number of messages per page. Defaults to `page_size`.
+
+        Returns:
+            List[Message]: The messages of the page.
+        """
+        model = self.model
+        query = model.select().order_by(model.id)
+        return [
+            self._from_row(row)
+            for row in query.paginate(page, page_size or self.page_size)
+        ]
+
+    def iter_pages(self, page_size: Optional[int] = None) -> Iterator[List[Message]]:
+        """
+        Iterate over the stored messages page by page, oldest first.
+
+        Only a single page is held in memory at a time.
+
+        Args:
+            page_size (Optional[int]): The number of messages per page. Defaults to `page_size`.
+
+        Yields:
+            List[Message]: The messages of the next page.
+        """
+        for rows in self._iter_rows(page_size):
+            yield [self._from_row(row) for row in rows]
+
+    def load_to_chat_completions(self) -> bool:
+        """
+        Load the stored messages into the sequence.
+
+        Token counts stored alongside each message are reused when they were
+        recorded for the current provider; otherwise the messages are re-tokenized
+        as a single batch.
+
+        Returns:
+            bool: True if loading was successful, False if no messages are stored.
+        """
+        self._sequence = []
+        self._row_ids = []
+
+        for rows in self._iter_rows():
+            for row in rows:
+                self._sequence.append(self._from_row(row))
+                self._row_ids.append(row.id)
+
+        self._count_missing_tokens()
+        self._pending = []
+        return bool(self._sequence)
+
+    def save_from_chat_completions(self) -> bool:
+        """
+        Save the pending operations to the sequence table as a single transaction.
+
+        Returns:
+            bool: True if saving was successful, False on error.
+        """
+        if not len(self):
+            return False
+
+        if not self._pending:
+            return True
+
+        try:
+            with self.memory_store.db.atomic():
+                row_ids = self._apply_pending()
+        except Exception as e:
+            self.logger.error(f"Error saving sequence {self.table_name}: {e}")
+            return False
+
+        self._row_ids = row_ids
+        self._pending = []
+        return True
+
+    def _apply_pending(self) -> List[int]:
+        """
+        Apply the pending operations to the sequence table. Requires a transaction.
+
+        Consecutive appends are bulk inserted and an "update" operation replaces
+        the row with the given row id. An insert before the end of the stored
+        sequence cannot be expressed by row order, so the table is rewritten.
+
+        Returns:
+            List[int]: The row ids of the stored sequence.
+        """
+        model = self.model
+        row_ids = list(self._row_ids)
+        appended: List[Dict[str, Any]] = []
+
+        for operation in self._pending:
+            if operation["op"] == "insert" and operation["index"] == len(row_ids) + len(
+                appended
+            ):
+                appended.append(self._to_row(operation["message"]))
+                continue
+
+            row_ids.extend(self._insert_rows(appended))
+            appended = []
+
+            if operation["op"] == "insert":
+                return self._rewrite_rows()
+            elif operation["op"] == "set":
+                row = self._to_row(operation["message"])
+                model.update(**row).where(
+                    model.id == row_ids[operation["index"]]
+                ).execute()
+            elif operation["op"] == "update":
+                row = self._to_row(operation["message"])
+                model.update(**row).where(model.id == operation["row_id"]).execute()
+            elif operation["op"] == "delete":
+                stop = operation["stop"]
+                for ids in chunked(row_ids[operation["start"] : stop], 256):
+                    model.delete().where(model.id.in_(ids)).execute()
+                del row_ids[operation["start"] : stop]
+
+        row_ids.extend(self._insert_rows(appended))
+        return row_ids
+
+    def _insert_rows(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Bulk insert rows into the sequence table. Requires a transaction.
+
+        Args:
+            rows (List[Dict[str, Any]]): The rows to insert.
+
+        Returns:
+            List[int]: The row ids of the inserted rows, in order.
+        """
+        row_ids = []
+        # NOTE: SQLite assigns consecutive row ids within a single insert.
+        for batch in chunked(rows, 64):
+            last_id = self.model.insert_many(batch).execute()
+            row_ids.extend(range(last_id - len(batch) + 1, last_id + 1))
+        return row_ids
+
+    def _rewrite_rows(self) -> List[int]:
+        """
+        Replace every row of the sequence table with the sequence. Requires a transaction.
+
+        Returns:
+            List[int]: The row ids of the stored sequence.
+        """
+        self.model.delete().execute()
+        return self._insert_rows([self._to_row(message) for message in self._sequence])
+
+
+class SQLiteContextWindowManager(SQLiteSequenceManager, ContextWindowManager):
+    """
+    A ContextWindowManager persisting its messages to an SQLite `sequence_` table.
+
+    See SQLiteSequenceManager and ContextWindowManager.
+    """
+
+
+class SQLiteTranscriptManager(SQLiteSequenceManager, TranscriptManager):
+    """
+    A TranscriptManager persisting its messages to an SQLite `sequence_` table.
+
+    The transcript is loaded lazily. Loading only reads the number of stored
+    messages and their total token count from the table, and the stored messages
+    are paged in from disk when they are accessed. Messages enqueued after
+    loading are held in memory as usual. Operations that cannot be applied to
+    the stored messages in place, such as inserting a system message before them,
+    load the whole transcript first.
+
+    See SQLiteSequenceManager and TranscriptManager.
+
+    Properties:
+        sequence (PagedSequence): A view of the stored and in-memory messages.
+        token_count (int): The total count of tokens in the transcript, read from the stored token counts.
+
+    NOTE:
+        `token_counts` only holds the token counts of the in-memory messages.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        provider: str,
+        config: ConfigurationManager,
+        chat_model: ChatModel,
+        **kwargs,
+    ):
+        super().__init__(file_path, provider, config, chat_model, **kwargs)
+
+        self.max_pages = config.get_value("app.session.max_pages", 4)
+
+        self._stored_length = 0
+        self._stored_token_total = 0
+        # NOTE: Pending changes to stored messages, keyed by row id, which are
+        # overlaid on the pages read from disk until they are saved.
+        self._stored_updates: Dict[int, Message] = {}
+        self._view = self._create_view()
+
+    def __len__(self) -> int:
+        """Get the length of the transcript."""
+        return self._stored_length + len(self._sequence)
+
+    def __getitem__(self, index) -> Message:
+        """Get a Message at the specified index."""
+        return self.sequence[index]
+
+    def __setitem__(self, index: int, value: ChatModelResponse):
+        """Set a ChatModelResponse at the specified index."""
+        index = range(len(self))[index]
+        if index >= self._stored_length:
+            super().__setitem__(index - self._stored_length, value)
+            return
+
+        row = self._select_rows(index, 1)[0]
+        previous = self._stored_updates.get(row.id) or self._from_row(row)
+
+        message = self._to_message(value)
+        self._stored_token_total += message.token_count - previous.token_count
+        self._stored_updates[row.id] = message
+        self._pending.append({"op": "update", "row_id": row.id, "message": message})
+        self._view.invalidate()
+
+    def __delitem__(self, index: int):
+        """Delete a ChatModelResponse at the specified index."""
+        self._load_stored_messages()
+        super().__delitem__(index)
+
+    def __iter__(self) -> Iterator[Message]:
+        """Get an iterator for the transcript, paging in the stored messages."""
+        return iter(self.sequence)
+
+    def __contains__(self, item: ChatModelResponse):
+        """Check if a ChatModelResponse is in the transcript."""
+        return item in self.sequence
+
+    @property
+    def sequence(self) -> PagedSequence:
+        """
+        Get a view of the stored and in-memory messages.
+
+        Returns:
+            PagedSequence: The transcript, paging in the stored messages on demand.
+        """
+        if self._view._tail is not self._sequence:
+            self._view = self._create_view()
+        return self._view
+
+    @property
+    def token_count(self) -> int:
+        """
+        Get the total count of tokens in the transcript.
+
+        Returns:
+            int: The total number of tokens.
+        """
+        return self._stored_token_total + self._token_total
+
+    @property
+    def system_message(self) -> Union[Message, ChatModelResponse]:
+        """
+        Get the system message at the beginning of the transcript.
+
+        Returns:
+            Union[Message, ChatModelResponse]: The system message, or an empty message if no system prompt is found.
+        """
+        if len(self) and self[0]["role"] == "system":
+            return self[0]
+        return ChatModelResponse(role="", content="")
+
+    @system_message.setter
+    def system_message(self, value: ChatModelResponse) -> None:
+        """
+        Set or modify the system message.
+
+        Args:
+            value (ChatModelResponse): The new system message.
+        """
+        if self.system_message["role"] == "system":
+            self[0] = value
+        else:
+            self._load_stored_messages()
+            self._insert_message(0, value)
+
+    def _create_view(self) -> PagedSequence:
+        """Create a view of the stored messages followed by the in-memory messages."""
+        return PagedSequence(
+            stored_length=self._stored_length,
+            load_page=self._load_stored_page,
+            tail=self._sequence,
+            page_size=self.page_size,
+            max_pages=self.max_pages,
+        )
+
+    def _select_rows(self, offset: int, limit: int) -> List[Model]:
+        """
+        Select stored rows by position.
+
+        Args:
+            offset (int): The position of the first row.
+            limit (int): The number of rows.
+
+        Returns:
+            List[Model]: The rows, oldest first.
+        """
+        model = self.model
+        return list(model.select().order_by(model.id).offset(offset).limit(limit))
+
+    def _load_stored_page(self, offset: int, limit: int) -> List[Message]:
+        """
+        Load stored messages by position, including their pending changes.
+
+        Args:
+            offset (int): The position of the first message.
+            limit (int): The number of messages.
+
+        Returns:
+            List[Message]: The messages, oldest first.
+        """
+        return [
+            self._stored_updates.get(row.id) or self._from_row(row)
+            for row in self._select_rows(offset, limit)
+        ]
+
+    def _load_stored_messages(self) -> None:
+        """
+        Load every stored message into memory, ahead of the in-memory messages.
+
+        The positions of the pending operations are shifted accordingly.
+        """
+        if not self._stored_length:
+            return
+
+        messages, row_ids = [], []
+        for rows in self._iter_rows():
+            for row in rows:
+                messages.append(self._stored_updates.get(row.id) or self._from_row(row))
+                row_ids.append(row.id)
+
+        offset = self._stored_length
+        for operation in self._pending:
+            for key in ("index", "start", "stop"):
+                if key in operation:
+                    operation[key] += offset
+
+        # NOTE: The lists are extended in place to keep the view attached.
+        self._sequence[:0] = messages
+        self._row_ids[:0] = row_ids
+        self._token_total += self._stored_token_total
+        self._stored_length = 0
+        self._stored_token_total = 0
+        self._stored_updates = {}
+        self._view = self._create_view()
+
+    def _count_stored_tokens(self) -> None:
+        """
+        Count the tokens of every stored message without a token count for the current provider.
+
+        The messages are counted as batches of `page_size` and their counts are
+        stored, so subsequent loads are served from the table alone.
+        """
+        model = self.model
+        missing = (
+            (model.provider != self._provider)
+            | model.provider.is_null()
+            | model.token_count.is_null()
+        )
+        last_id = 0
+
+        while True:
+            rows = list(
+                model.select()
+                .where(missing & (model.id > last_id))
+                .order_by(model.id)
+                .limit(self.page_size)
+            )
+            if not rows:
+                return
+
+            token_counts = self._token_manager.calculate_chat_message_lengths(
+                [self._from_row(row) for row in rows]
+            )
+            with self.memory_store.db.atomic():
+                for row, token_count in zip(rows, token_counts):
+                    model.update(
+                        provider=self._provider, token_count=token_count
+                    ).where(model.id == row.id).execute()
+            last_id = rows[-1].id
+
+    def load_to_chat_completions(self) -> bool:
+        """
+        Load the length and total token count of the stored transcript.
+
+        The stored messages themselves are paged in from disk when accessed.
+
+        Returns:
+            bool: True if loading was successful, False if no messages are stored.
+        """
+        self._count_stored_tokens()
+
+        model = self.model
+        length, token_total = model.select(
+            fn.COUNT(model.id), fn.COALESCE(fn.SUM(model.token_count), 0)
+        ).scalar(as_tuple=True)
+
+        self._sequence = []
+        self._token_total = 0
+        self._row_ids = []
+        self._pending = []
+        self._stored_length = length
+        self._stored_token_total = token_total
+        self._stored_updates = {}
+        self._view = self._create_view()
+        return bool(length)
+
+    def save_from_chat_completions(self) -> bool:
+        """
+        Save the pending operations to the sequence table as a single transaction.
+
+        Returns:
+            bool: True if saving was successful, False on error.
+        """
+        saved = super().save_from_chat_completions()
+        if saved:
+            self._stored_updates = {}
+        return saved
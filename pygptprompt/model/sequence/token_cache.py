@@ -0,0 +1,115 @@
+"""
+pygptprompt/model/sequence/token_cache.py
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from pygptprompt.pattern.singleton import Singleton
+
+# A cache key is the tokenizer identity and the digest of the serialized message.
+TokenCacheKey = Tuple[str, bytes]
+
+
+class TokenCountCache(Singleton):
+    """
+    A process-wide, content-addressed LRU cache of token counts.
+
+    Token counts are keyed by the identity of the tokenizer and a digest of the
+    serialized message, so identical messages are tokenized once regardless of
+    which TokenManager, session, or provider requests them.
+
+    Args:
+        max_size (int): The maximum number of cached token counts. Default is 65536.
+
+    Attributes:
+        max_size (int): The maximum number of cached token counts.
+        hits (int): The number of lookups served from the cache.
+        misses (int): The number of lookups that required tokenization.
+
+    NOTE:
+        This class is a singleton. Arguments given after the first instantiation are ignored.
+    """
+
+    def __init__(self, max_size: int = 65536):
+        super(TokenCountCache, self).__init__()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[TokenCacheKey, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get the number of cached token counts."""
+        return len(self._cache)
+
+    @staticmethod
+    def make_key(encoding_id: str, text: str) -> TokenCacheKey:
+        """
+        Create the cache key for a serialized message.
+
+        Args:
+            encoding_id (str): The identity of the tokenizer.
+            text (str): The serialized message.
+
+        Returns:
+            TokenCacheKey (Tuple[str, bytes]): The cache key.
+        """
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        return encoding_id, digest
+
+    def get(self, key: TokenCacheKey) -> Optional[int]:
+        """
+        Get a cached token count and mark it as recently used.
+
+        Args:
+            key (TokenCacheKey): The cache key.
+
+        Returns:
+            Optional[int]: The token count, or None if it is not cached.
+        """
+        with self._lock:
+            token_count = self._cache.get(key)
+            if token_count is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache.move_to_end(key)
+            return token_count
+
+    def put(self, key: TokenCacheKey, token_count: int) -> None:
+        """
+        Cache a token count, evicting the least recently used entry when full.
+
+        Args:
+            key (TokenCacheKey): The cache key.
+            token_count (int): The token count.
+        """
+        with self._lock:
+            self._cache[key] = token_count
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        """Clear the cached token counts and reset the counters."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        """
+        Get the cache statistics.
+
+        Returns:
+            Dict[str, int]: The hits, misses, current size, and maximum size.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "max_size": self.max_size,
+            }
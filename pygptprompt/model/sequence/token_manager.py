@@ -2,10 +2,11 @@
 pygptprompt/model/token_manager.py
 """
 import json
-from typing import List
+from typing import Dict, List
 
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.token_cache import TokenCacheKey, TokenCountCache
 
 
 class TokenManager:
@@ -16,6 +17,7 @@ class TokenManager:
         _provider (str): The provider or source of the chat session.
         _config (ConfigurationManager): The configuration manager for chat settings.
         _model (ChatModel): The chat model used for processing messages.
+        _cache (TokenCountCache): The process-wide cache of message token counts.
     """
 
     def __init__(
@@ -35,6 +37,7 @@ class TokenManager:
         self._provider = provider
         self._config = config
         self._model = chat_model
+        self._cache = TokenCountCache()
 
     @property
     def reserve(self) -> float:
@@ -136,15 +139,15 @@ class TokenManager:
         """
         return len(self._model.get_encoding(text=text))
 
-    def calculate_chat_message_length(self, message: ChatModelResponse) -> int:
+    def serialize_chat_message(self, message: ChatModelResponse) -> str:
         """
-        Returns the number of tokens in a given message.
+        Returns the text representation of a given message used for counting tokens.
 
         Args:
             message (ChatModelResponse): The message to process.
 
         Returns:
-            int: The number of tokens in the message.
+            str: The serialized message.
         """
         sequence: str = ""
 
@@ -156,7 +159,71 @@ class TokenManager:
                     value_str = str(value)
                 sequence += " " + key + " " + value_str
 
-        return self.calculate_text_sequence_length(sequence.strip())
+        return sequence.strip()
+
+    def calculate_chat_message_length(self, message: ChatModelResponse) -> int:
+        """
+        Returns the number of tokens in a given message.
+
+        Args:
+            message (ChatModelResponse): The message to process.
+
+        Returns:
+            int: The number of tokens in the message.
+
+        NOTE:
+            Token counts are shared with every TokenManager using the same tokenizer.
+        """
+        text = self.serialize_chat_message(message)
+        key = self._cache.make_key(self._model.encoding_id, text)
+        token_count = self._cache.get(key)
+
+        if token_count is None:
+            token_count = self.calculate_text_sequence_length(text)
+            self._cache.put(key, token_count)
+
+        return token_count
+
+    def calculate_chat_message_lengths(
+        self,
+        messages: List[ChatModelResponse],
+    ) -> List[int]:
+        """
+        Returns the number of tokens in each message of a list of chat messages.
+
+        Messages missing from the token count cache are encoded as a single batch.
+
+        Args:
+            messages (List[ChatModelResponse]): The list of messages.
+
+        Returns:
+            List[int]: The number of tokens in each message, in order.
+        """
+        encoding_id = self._model.encoding_id
+        token_counts: List[int] = []
+        misses: Dict[TokenCacheKey, List[int]] = {}
+        texts: List[str] = []
+
+        for index, message in enumerate(messages):
+            text = self.serialize_chat_message(message)
+            key = self._cache.make_key(encoding_id, text)
+            token_count = self._cache.get(key)
+            token_counts.append(token_count)
+
+            if token_count is None:
+                if key not in misses:
+                    misses[key] = []
+                    texts.append(text)
+                misses[key].append(index)
+
+        if texts:
+            encodings = self._model.get_encodings(texts=texts)
+            for (key, indices), encoding in zip(misses.items(), encodings):
+                self._cache.put(key, len(encoding))
+                for index in indices:
+                    token_counts[index] = len(encoding)
+
+        return token_counts
 
     def calculate_chat_sequence_length(
         self,
@@ -171,12 +238,7 @@ class TokenManager:
         Returns:
             int: The total number of tokens in the list of messages.
         """
-        total_tokens: int = 0
-
-        for message in messages:
-            total_tokens += self.calculate_chat_message_length(message)
-
-        return total_tokens
+        return sum(self.calculate_chat_message_lengths(messages))
 
     def causes_chat_sequence_overflow(
         self,
@@ -196,5 +258,30 @@ class TokenManager:
         new_message_token_count = self.calculate_chat_message_length(new_message)
         messages_total_token_count = self.calculate_chat_sequence_length(messages)
         token_count = new_message_token_count + messages_total_token_count
-        total_token_count = self.offset + token_count
-        return total_token_count >= self.upper_bound
+        return self.causes_token_count_overflow(token_count)
+
+    def causes_token_count_overflow(self, token_count: int) -> bool:
+        """
+        Check if a precomputed number of tokens will cause the sequence to overflow.
+
+        Args:
+            token_count (int): The number of tokens the sequence would consume.
+
+        Returns:
+            bool: True if the sequence will overflow, False otherwise.
+        """
+        return self.offset + token_count >= self.upper_bound
+
+    def calculate_token_budget(self, token_count: int) -> int:
+        """
+        Calculate the number of tokens that may be added to a sequence without an overflow.
+
+        Args:
+            token_count (int): The number of tokens the sequence already consumes.
+
+        Returns:
+            int: The number of tokens that still fit, which is negative if the sequence
+                already overflows.
+        """
+        # NOTE: An overflow occurs when offset + tokens >= upper_bound.
+        return self.upper_bound - self.offset - token_count - 1
@@ -9,6 +9,7 @@ from chromadb.api.types import Include, OneOrMany, QueryResult, Where, WhereDocu
 
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import ChatModel, ChatModelDocument, ChatModelDocuments
+from pygptprompt.storage.embedding_cache import get_embedding_cache
 from pygptprompt.storage.function import VectorStoreEmbeddingFunction
 
 
@@ -52,6 +53,7 @@ class ChromaVectorStore:
         get_chroma_heartbeat(): Get the Chroma service timestamp.
         get_collection_count(): Get the total number of embeddings in the collection.
         add_message_to_collection(message: dict): Add a message to the collection.
+        add_messages_to_collection(messages: List[dict]): Add a batch of messages to the collection.
         upsert_to_collection(ids, metadatas, documents): Upsert documents to the collection.
         query_from_collection(query_texts, n_results, where, where_document, include): Query the collection for documents.
     """
@@ -81,9 +83,27 @@ class ChromaVectorStore:
         self._get_or_create_collection()  # avoid cascades
 
     def _initialize_components(self):
+        # Initialize embedding cache, persisted next to the session files
+        embedding_cache = None
+        if not self.config.get_value("app.embedding_cache.disabled", False):
+            embedding_cache = get_embedding_cache(
+                directory=self.config.evaluate_path("app.cache"),
+                embedding_id=self.chat_model.embedding_id,
+                max_entries=self.config.get_value(
+                    "app.embedding_cache.max_entries", 65536
+                ),
+                save_interval=self.config.get_value(
+                    "app.embedding_cache.save_interval", 256
+                ),
+                logger=self.logger,
+            )
+
         # Initialize embedding function
         self.embedding_function = VectorStoreEmbeddingFunction(
-            chat_model=self.chat_model, logger=self.logger
+            chat_model=self.chat_model,
+            logger=self.logger,
+            cache=embedding_cache,
+            dtype=self.config.get_value("app.embedding.dtype", "float32"),
         )
 
         # Initialize Chroma client
@@ -99,17 +119,32 @@ class ChromaVectorStore:
             # Attempt to get the collection by name
             self.collection = self.chroma_client.get_collection(
                 name=self.collection_name,
-                embedding_function=self.embedding_function,
+                embedding_function=None,
             )
             self.logger.debug(f"Loaded collection {self.collection_name}")
         except ValueError:
             # If the collection doesn't exist, create it
             self.collection = self.chroma_client.create_collection(
                 name=self.collection_name,
-                embedding_function=self.embedding_function,
+                embedding_function=None,
             )
             self.logger.debug(f"Created collection {self.collection_name}")
 
+    def _embed(self, documents: ChatModelDocuments) -> List[List[float]]:
+        """
+        Embed documents for the Chroma client.
+
+        Embeddings stay arrays up to this point. They are converted to lists
+        here, at once, since the Chroma client validates embeddings as lists.
+
+        Args:
+            documents (ChatModelDocuments): The documents to embed.
+
+        Returns:
+            List[List[float]]: The embedding of each document.
+        """
+        return self.embedding_function(documents).tolist()
+
     def get_chroma_heartbeat(self) -> int:
         """
         Get the Chroma service timestamp.
@@ -141,6 +176,7 @@ class ChromaVectorStore:
         self.collection.add(
             ids=[unique_id],
             documents=[message["content"]],
+            embeddings=self._embed([message["content"]]),
             metadatas=[{"role": message["role"]}],
         )
 
@@ -148,6 +184,38 @@ class ChromaVectorStore:
             f"Added message to collection {self.collection_name} with ID {unique_id}"
         )
 
+    def add_messages_to_collection(self, messages: List[dict]):
+        """
+        Add a batch of messages to the collection with a single request.
+
+        Messages without content, e.g. function calls, are skipped.
+
+        Args:
+            messages (List[dict]): The messages to be added to the collection.
+        """
+        messages = [message for message in messages if message.get("content")]
+
+        if not messages:
+            return
+
+        timestamp = datetime.utcnow().isoformat()
+        unique_ids = [
+            f"{self.collection_name}_{timestamp}_{index}"
+            for index in range(len(messages))
+        ]
+
+        documents = [message["content"] for message in messages]
+        self.collection.add(
+            ids=unique_ids,
+            documents=documents,
+            embeddings=self._embed(documents),
+            metadatas=[{"role": message["role"]} for message in messages],
+        )
+
+        self.logger.debug(
+            f"Added {len(messages)} messages to collection {self.collection_name}"
+        )
+
     def upsert_to_collection(
         self,
         ids: Union[str, List[str]],
@@ -164,10 +232,14 @@ class ChromaVectorStore:
             metadatas (Union[Dict[str, str], List[Dict[str, str]]]): The metadata of the documents.
             documents (Union[ChatModelDocument, ChatModelDocuments]): The documents to upsert.
         """
+        if isinstance(documents, str):
+            documents = [documents]
+
         self.collection.upsert(
             ids=ids,
             metadatas=metadatas,
             documents=documents,
+            embeddings=self._embed(documents),
         )
 
         self.logger.debug(
@@ -195,8 +267,11 @@ class ChromaVectorStore:
         Returns:
             QueryResult: The query result.
         """
+        if isinstance(query_texts, str):
+            query_texts = [query_texts]
+
         return self.collection.query(
-            query_texts=query_texts,
+            query_embeddings=self._embed(query_texts) if query_texts else None,
             n_results=n_results,
             where=where,
             where_document=where_document,
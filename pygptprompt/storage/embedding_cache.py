@@ -0,0 +1,500 @@
+"""
+pygptprompt/storage/embedding_cache.py
+"""
+import atexit
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from logging import Logger
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from pygptprompt.model.base import ChatModelDocuments, ChatModelEmbedding
+from pygptprompt.pattern.logger import get_default_logger
+
+try:
+    import fcntl
+except ImportError:  # NOTE: The cache files are only locked on POSIX systems.
+    fcntl = None
+
+
+class EmbeddingCache:
+    """
+    A persistent LRU cache of embeddings, keyed by embedding model and text digest.
+
+    The embeddings of one model are rows of a float32 matrix memory-mapped from
+    `embeddings_{model}.f32`, and the index of text digests to rows is kept in
+    `embeddings_{model}.npz` in least recently used order. Once `max_entries`
+    embeddings are cached, the least recently used one is evicted for each new
+    embedding.
+
+    The index is saved every `save_interval` stored embeddings and at exit,
+    not on every store. Until then, the rows of evicted embeddings that the
+    saved index still references are not reused, so the saved index never
+    maps a text to another text's embedding. The matrix therefore grows by
+    doubling up to `max_entries + save_interval` rows.
+
+    The files may be shared by several processes. Every access holds a lock on
+    `embeddings_{model}.lock`, which also counts the saves of the index. An
+    instance reloads the index before using its rows once another one saved
+    or reset the cache, dropping its own unsaved embeddings, and only reuses
+    rows that no other instance may hold. Within a process, the instances are
+    shared through `get_embedding_cache`.
+
+    Args:
+        directory (str): The directory holding the cache files.
+        embedding_id (str): The identifier of the embedding model, see `ChatModel.embedding_id`.
+        max_entries (int): The maximum number of cached embeddings. Default is 65536.
+        save_interval (int): The number of stored embeddings between saves of the index. Default is 256.
+        logger (Optional[Logger]): Optional logger for error-handling.
+
+    Attributes:
+        hits (int): The number of texts found in the cache.
+        misses (int): The number of texts not found in the cache.
+
+    Methods:
+        lookup(texts): Get the cached embedding of each text, or None.
+        store(texts, embeddings): Cache the embeddings of the texts.
+        load(): Load the cache from disk.
+        save(): Save the index of the cache to disk.
+    """
+
+    # NOTE: The initial number of rows of the matrix.
+    INITIAL_CAPACITY = 1024
+
+    def __init__(
+        self,
+        directory: str,
+        embedding_id: str,
+        max_entries: int = 65536,
+        save_interval: int = 256,
+        logger: Optional[Logger] = None,
+    ):
+        self.embedding_id = embedding_id
+        self.max_entries = max(1, max_entries)
+        self.save_interval = max(1, save_interval)
+        self.hits = 0
+        self.misses = 0
+
+        digest = hashlib.blake2b(embedding_id.encode("utf-8"), digest_size=8)
+        stem = Path(directory) / f"embeddings_{digest.hexdigest()}"
+        self._matrix_path = stem.with_suffix(".f32")
+        self._index_path = stem.with_suffix(".npz")
+        self._lock_path = stem.with_suffix(".lock")
+
+        self._index: OrderedDict[bytes, int] = OrderedDict()
+        self._matrix: Optional[np.memmap] = None
+        self._dimensions = 0
+        self._lock = threading.Lock()
+        # NOTE: Rows referenced by the saved index are only reused after the next save.
+        self._free: List[int] = []
+        self._retired: List[int] = []
+        self._saved_rows: Set[int] = set()
+        self._unsaved = 0
+        # NOTE: The number of saves of the index the cache was last loaded from.
+        self._generation = 0
+        self._lock_file: Optional[int] = None
+        self._matrix_inode: Optional[int] = None
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+        if fcntl is not None:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            self._lock_file = os.open(self._lock_path, os.O_RDWR | os.O_CREAT)
+
+        self.load()
+        atexit.register(self.save)
+
+    def __len__(self) -> int:
+        """Get the number of cached embeddings."""
+        return len(self._index)
+
+    def __contains__(self, text: str) -> bool:
+        """Check whether the embedding of a text is cached."""
+        return self.make_key(text) in self._index
+
+    @staticmethod
+    def make_key(text: str) -> bytes:
+        """
+        Create the cache key for a text.
+
+        Args:
+            text (str): The embedded text.
+
+        Returns:
+            bytes: The digest of the text.
+        """
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    @property
+    def capacity(self) -> int:
+        """Get the number of rows of the matrix."""
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def lookup(self, texts: ChatModelDocuments) -> List[Optional[np.ndarray]]:
+        """
+        Get the cached embedding of each text.
+
+        Args:
+            texts (ChatModelDocuments): The texts to look up.
+
+        Returns:
+            List[Optional[np.ndarray]]: A copy of each cached embedding, or None for each miss.
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        positions, rows = [], []
+        with self._lock, self._file_lock(shared=True):
+            self._sync()
+            for position, text in enumerate(texts):
+                key = self.make_key(text)
+                row = self._index.get(key)
+                if row is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._index.move_to_end(key)
+                    positions.append(position)
+                    rows.append(row)
+            # NOTE: The hits are copied out of the matrix at once.
+            vectors = self._matrix[rows] if rows else []
+        for position, vector in zip(positions, vectors):
+            embeddings[position] = vector
+        return embeddings
+
+    def store(self, texts: ChatModelDocuments, embeddings: ChatModelEmbedding) -> None:
+        """
+        Cache the embeddings of the texts, evicting the least recently used ones if full.
+
+        Args:
+            texts (ChatModelDocuments): The embedded texts.
+            embeddings (ChatModelEmbedding): The embedding of each text.
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError("Expected one embedding vector per text")
+
+        with self._lock, self._file_lock():
+            self._sync()
+            if self._dimensions != vectors.shape[1]:
+                if self._index:
+                    self._logger.warning(
+                        "Embedding dimensions of %s changed, clearing the cache",
+                        self.embedding_id,
+                    )
+                self._reset(vectors.shape[1])
+
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(text)
+                row = self._index.get(key)
+                if row is None:
+                    row = self._allocate_row()
+                    self._unsaved += 1
+                self._index[key] = row
+                self._index.move_to_end(key)
+                self._matrix[row] = vector
+
+            if self._unsaved >= self.save_interval:
+                self._save_index()
+
+    def _allocate_row(self) -> int:
+        """
+        Get a free row, evicting the least recently used embedding if the cache is full.
+
+        Returns:
+            int: The row index.
+        """
+        if len(self._index) >= self.max_entries:
+            _, row = self._index.popitem(last=False)
+            if row in self._saved_rows:
+                self._retired.append(row)
+            else:
+                self._free.append(row)
+        if not self._free:
+            limit = self.max_entries + self.save_interval
+            if self.capacity < limit:
+                self._resize(min(limit, max(1, self.capacity) * 2))
+            elif not (self._save_index() and self._free):
+                # NOTE: Growing past the limit never reuses a referenced row.
+                self._resize(self.capacity + self.save_interval)
+        return self._free.pop()
+
+    def _reset(self, dimensions: int) -> None:
+        """
+        Discard every cached embedding and start a matrix of the given dimensions.
+
+        Args:
+            dimensions (int): The number of dimensions of each embedding.
+        """
+        self._index.clear()
+        self._matrix = None
+        self._dimensions = dimensions
+        self._free, self._retired, self._saved_rows = [], [], set()
+        # NOTE: Other instances keep their mappings of the unlinked files until they reload.
+        self._index_path.unlink(missing_ok=True)
+        self._matrix_path.unlink(missing_ok=True)
+        self._write_generation(self._generation + 1)
+        self._resize(min(self.max_entries, self.INITIAL_CAPACITY))
+
+    def _resize(self, rows: int) -> None:
+        """
+        Grow the matrix file, map it again and free its new rows.
+
+        Rows appended to the file by other instances are mapped but never freed.
+
+        Args:
+            rows (int): The number of rows of the matrix, if no other instance grew it.
+        """
+        row_size = self._dimensions * 4
+        try:
+            start = max(self.capacity, self._matrix_path.stat().st_size // row_size)
+        except FileNotFoundError:
+            start = self.capacity
+        stop = start + rows - self.capacity
+        # NOTE: The lowest rows are handed out first.
+        self._free.extend(reversed(range(start, stop)))
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._matrix_path, "ab") as file:
+            file.truncate(stop * row_size)
+        self._matrix = np.memmap(
+            self._matrix_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(stop, self._dimensions),
+        )
+        self._matrix_inode = self._stat_inode()
+
+    def load(self) -> bool:
+        """
+        Load the cache from disk.
+
+        Rows the index does not reference are only reused if no other instance
+        has the cache open, since they may hold unsaved embeddings.
+
+        Returns:
+            bool: True if a cache was loaded, False otherwise.
+        """
+        with self._lock, self._file_lock():
+            return self._read(reclaim=self._open_exclusively())
+
+    def _read(self, reclaim: bool) -> bool:
+        """
+        Replace the cache with the one on disk, with the locks held.
+
+        Args:
+            reclaim (bool): Whether the rows the index does not reference are freed.
+
+        Returns:
+            bool: True if a cache was loaded, False otherwise.
+        """
+        self._generation = self._read_generation()
+        self._index = OrderedDict()
+        self._matrix = None
+        self._dimensions = 0
+        self._free, self._retired, self._saved_rows = [], [], set()
+        self._unsaved = 0
+        if not (self._index_path.exists() and self._matrix_path.exists()):
+            return False
+
+        try:
+            with np.load(self._index_path) as data:
+                dimensions = int(data["dimensions"])
+                keys, rows = data["keys"], data["rows"]
+            capacity = self._matrix_path.stat().st_size // (dimensions * 4)
+            if keys.dtype != np.uint8 or keys.shape != (len(rows), 16):
+                raise ValueError("The index keys are not 16 byte digests")
+            if len(rows) and rows.max() >= capacity:
+                raise ValueError("The index does not match the matrix")
+        except (OSError, KeyError, ValueError, ZeroDivisionError) as e:
+            self._logger.error(f"Error loading embedding cache {self._index_path}: {e}")
+            return False
+
+        self._dimensions = dimensions
+        self._matrix = np.memmap(
+            self._matrix_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, dimensions),
+        )
+        self._matrix_inode = self._stat_inode()
+        self._index = OrderedDict(
+            (key.tobytes(), int(row)) for key, row in zip(keys, rows)
+        )
+        self._saved_rows = set(self._index.values())
+        if reclaim:
+            self._free = [
+                row for row in reversed(range(capacity)) if row not in self._saved_rows
+            ]
+        return True
+
+    def _sync(self) -> None:
+        """
+        Reload the cache, with the locks held, if another instance saved or reset it.
+
+        The free rows and the rows of unsaved embeddings were never visible to
+        other instances, so they stay free unless the matrix file was replaced.
+        """
+        if self._read_generation() == self._generation:
+            return
+        self._logger.debug("Reloading embedding cache %s", self._index_path)
+        private = []
+        if self._matrix is not None and self._matrix_inode == self._stat_inode():
+            private = self._free + [
+                row for row in self._index.values() if row not in self._saved_rows
+            ]
+        self._read(reclaim=False)
+        if self._matrix is not None:
+            self._free = sorted(set(private) - self._saved_rows, reverse=True)
+
+    def _stat_inode(self) -> Optional[int]:
+        """Get the inode of the matrix file, or None if it does not exist."""
+        try:
+            return self._matrix_path.stat().st_ino
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False) -> Iterator[None]:
+        """
+        Lock the cache files against other processes.
+
+        Args:
+            shared (bool): Whether the files are only read. Default is False.
+        """
+        if self._lock_file is None:
+            yield
+            return
+        fcntl.lockf(self._lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX, 1)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1)
+
+    def _open_exclusively(self) -> bool:
+        """
+        Mark the cache as open by this process for its lifetime.
+
+        Returns:
+            bool: True if no other process has the cache open, False otherwise.
+        """
+        if self._lock_file is None:
+            return True
+        # NOTE: The second byte of the lock file is shared by every open cache.
+        try:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, 1)
+            exclusive = True
+        except OSError:
+            exclusive = False
+        fcntl.lockf(self._lock_file, fcntl.LOCK_SH, 1, 1)
+        return exclusive
+
+    def _read_generation(self) -> int:
+        """Get the number of saves of the index on disk."""
+        if self._lock_file is None:
+            return self._generation
+        return int.from_bytes(os.pread(self._lock_file, 8, 0), "little")
+
+    def _write_generation(self, generation: int) -> None:
+        """Set the number of saves of the index on disk, with the locks held."""
+        self._generation = generation
+        if self._lock_file is not None:
+            os.pwrite(self._lock_file, generation.to_bytes(8, "little"), 0)
+
+    def save(self) -> bool:
+        """
+        Flush the matrix and save the index of the cache to disk, if it changed.
+
+        Returns:
+            bool: True if the cache is saved, False otherwise.
+        """
+        with self._lock, self._file_lock():
+            self._sync()
+            if self._matrix is None:
+                return False
+            if not self._unsaved and not self._retired and self._index_path.exists():
+                return True
+            return self._save_index()
+
+    def _save_index(self) -> bool:
+        """
+        Flush the matrix and save the index, with the lock held.
+
+        The index is written to a unique temporary file and renamed into place,
+        after which the rows it no longer references may be reused.
+
+        Returns:
+            bool: True if the index was saved, False otherwise.
+        """
+        # NOTE: Digests are stored as bytes, since "S16" strips trailing null bytes.
+        keys = np.frombuffer(b"".join(self._index.keys()), dtype=np.uint8)
+        keys = keys.reshape(-1, 16)
+        rows = np.fromiter(self._index.values(), dtype=np.int64, count=len(self))
+        self._matrix.flush()
+
+        descriptor, temporary = tempfile.mkstemp(
+            prefix=f"{self._index_path.stem}.",
+            suffix=".tmp",
+            dir=self._index_path.parent,
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.savez(file, keys=keys, rows=rows, dimensions=self._dimensions)
+            os.replace(temporary, self._index_path)
+            self._write_generation(self._generation + 1)
+        except OSError as e:
+            Path(temporary).unlink(missing_ok=True)
+            self._logger.error(f"Error saving embedding cache {self._index_path}: {e}")
+            return False
+
+        self._saved_rows = set(self._index.values())
+        self._free.extend(self._retired)
+        self._retired = []
+        self._unsaved = 0
+        return True
+
+
+# NOTE: Instances sharing files must share their row allocation, see `EmbeddingCache`.
+_caches: Dict[Tuple[Path, str], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(
+    directory: str,
+    embedding_id: str,
+    max_entries: int = 65536,
+    save_interval: int = 256,
+    logger: Optional[Logger] = None,
+) -> EmbeddingCache:
+    """
+    Get the embedding cache of a model in a directory, shared within the process.
+
+    The arguments of the first caller create the cache; later callers get the same instance.
+
+    Args:
+        directory (str): The directory holding the cache files.
+        embedding_id (str): The identifier of the embedding model, see `ChatModel.embedding_id`.
+        max_entries (int): The maximum number of cached embeddings. Default is 65536.
+        save_interval (int): The number of stored embeddings between saves of the index. Default is 256.
+        logger (Optional[Logger]): Optional logger for error-handling.
+
+    Returns:
+        EmbeddingCache: The shared cache.
+    """
+    key = (Path(directory).resolve(), embedding_id)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(
+                directory, embedding_id, max_entries, save_interval, logger
+            )
+            _caches[key] = cache
+        return cache
@@ -2,7 +2,10 @@
 pygptprompt/storage/function.py
 """
 from logging import Logger
-from typing import Optional, Union
+from typing import Optional
+
+import numpy as np
+from numpy.typing import DTypeLike
 
 from pygptprompt.model.base import (
     ChatModel,
@@ -12,6 +15,7 @@ from pygptprompt.model.base import (
     EmbeddingFunction,
 )
 from pygptprompt.pattern.logger import get_default_logger
+from pygptprompt.storage.embedding_cache import EmbeddingCache
 
 
 class VectorStoreEmbeddingFunction(EmbeddingFunction[Embeddable]):
@@ -19,20 +23,30 @@ class VectorStoreEmbeddingFunction(EmbeddingFunction[Embeddable]):
         self,
         chat_model: ChatModel,
         logger: Optional[Logger] = None,
+        cache: Optional[EmbeddingCache] = None,
+        dtype: DTypeLike = np.float32,
     ):
         """
         Initialize the ChatModelEmbeddingFunction.
 
         Args:
             chat_model (ChatModel): The chat model instance, e.g. OpenAIModel or LlamaCppModel API.
+            logger (Optional[Logger]): Optional logger for error-handling.
+            cache (Optional[EmbeddingCache]): Optional cache of the model's embeddings. Only texts missing from it are embedded by the model.
+            dtype (DTypeLike): The dtype of the returned embeddings, either float32 or float16. Default is float32.
         """
         self._model = chat_model
+        self._cache = cache
+        self._dtype = np.dtype(dtype)
 
         if logger:
             self._logger = logger
         else:
             self._logger = get_default_logger(self.__class__.__name__)
 
+        if self._dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported embedding dtype {self._dtype}")
+
         # Test for initialization data
         self._logger.debug("Successfully initialized chat model embedding function.")
 
@@ -43,16 +57,60 @@ class VectorStoreEmbeddingFunction(EmbeddingFunction[Embeddable]):
         """
         Generate embeddings using the chat model.
 
+        If a cache is set, only the distinct texts missing from it are embedded by the model.
+
         Args:
             input (Union[ChatModelDocuments, Images]): The input data for which embeddings need to be generated.
 
         Returns:
-            ChatModelEmbedding (List[List[float]]): The list of embeddings generated by the chat model.
+            ChatModelEmbedding (np.ndarray): The embedding of each input, one row per input.
+        """
+        if isinstance(input, str):
+            input = [input]
+
+        # NOTE: Only the counts are logged, the inputs may be large batches.
+        if self._cache is None or not all(isinstance(data, str) for data in input):
+            self._logger.debug("Generating %d embeddings", len(input))
+            return self._convert(self._model.get_embedding(input=input))
+
+        embeddings = self._cache.lookup(input)
+        missing = list(
+            dict.fromkeys(
+                text for text, embedding in zip(input, embeddings) if embedding is None
+            )
+        )
+        self._logger.debug(
+            "Generating %d embeddings, %d cached",
+            len(input),
+            len(input) - len(missing),
+        )
+
+        if missing:
+            # Get embeddings from the chat model API
+            generated = self._model.get_embedding(input=missing)
+            if len(generated) != len(missing):
+                # NOTE: The model failed and logged the error.
+                return self._convert(generated)
+            # NOTE: The cache saves its index periodically, not on every call.
+            self._cache.store(missing, generated)
+            vectors = dict(zip(missing, generated))
+            embeddings = [
+                vectors[text] if embedding is None else embedding
+                for text, embedding in zip(input, embeddings)
+            ]
+
+        if not embeddings:
+            return np.empty((0, 0), dtype=self._dtype)
+        return np.stack(embeddings).astype(self._dtype, copy=False)
+
+    def _convert(self, embeddings: ChatModelEmbedding) -> ChatModelEmbedding:
         """
-        self._logger.debug("Generating embeddings")
+        Convert the embeddings of the chat model to the configured dtype.
 
-        for data in input:
-            self._logger.debug(f"{data}")
+        Args:
+            embeddings (ChatModelEmbedding): The embeddings of the chat model.
 
-        # Get embeddings from the chat model API
-        return self._model.get_embedding(input=input)
+        Returns:
+            ChatModelEmbedding (np.ndarray): The embeddings, copied only if their dtype differs.
+        """
+        return np.asarray(embeddings, dtype=self._dtype)
@@ -0,0 +1,152 @@
+"""
+pygptprompt/storage/queue.py
+"""
+import atexit
+import threading
+import time
+from logging import Logger
+from typing import List, Optional
+
+from pygptprompt.pattern.logger import get_default_logger
+from pygptprompt.storage.chroma import ChromaVectorStore
+
+
+class EmbeddingQueue:
+    """
+    A background queue for embedding messages into the Chroma vector store.
+
+    Messages are buffered and written to the vector store in batches by a worker
+    thread, either once the buffer holds `batch_size` messages or once the oldest
+    buffered message has waited `flush_interval` seconds. Embedding therefore no
+    longer happens on the chat hot path.
+
+    Args:
+        vector_store (ChromaVectorStore): The vector store receiving the messages.
+        batch_size (int): The number of buffered messages that triggers a flush. Default is 32.
+        flush_interval (float): The maximum number of seconds a message is buffered. Default is 5.0.
+        logger (Optional[Logger]): Optional logger for error-handling.
+
+    Methods:
+        put(messages): Buffer messages for embedding.
+        flush(): Block until every buffered message is written to the vector store.
+        close(): Flush the buffer and stop the worker thread.
+    """
+
+    def __init__(
+        self,
+        vector_store: ChromaVectorStore,
+        batch_size: int = 32,
+        flush_interval: float = 5.0,
+        logger: Optional[Logger] = None,
+    ):
+        self.vector_store = vector_store
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+
+        if logger:
+            self._logger = logger
+        else:
+            self._logger = get_default_logger(self.__class__.__name__)
+
+        self._buffer: List[dict] = []
+        self._buffered_at: Optional[float] = None
+        self._in_flight: int = 0
+        self._flush_requested: bool = False
+        self._closed: bool = False
+        self._condition = threading.Condition()
+
+        self._worker = threading.Thread(
+            target=self._run, name=self.__class__.__name__, daemon=True
+        )
+        self._worker.start()
+
+        # NOTE: Buffered messages are drained at shutdown.
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        """Get the number of messages waiting to be written."""
+        with self._condition:
+            return len(self._buffer) + self._in_flight
+
+    def put(self, messages: List[dict]) -> None:
+        """
+        Buffer messages for embedding.
+
+        Args:
+            messages (List[dict]): The messages to embed.
+
+        Raises:
+            RuntimeError: If the queue is closed.
+        """
+        if not messages:
+            return
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot put messages into a closed EmbeddingQueue")
+            if not self._buffer:
+                self._buffered_at = time.monotonic()
+            self._buffer.extend(messages)
+            self._condition.notify_all()
+
+    def flush(self) -> None:
+        """
+        Block until every buffered message is written to the vector store.
+        """
+        with self._condition:
+            if not self._worker.is_alive():
+                return
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._buffer or self._in_flight:
+                self._condition.wait()
+            self._flush_requested = False
+
+    def close(self) -> None:
+        """
+        Flush the buffer and stop the worker thread.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join()
+        atexit.unregister(self.close)
+
+    def _is_due(self) -> bool:
+        """Check if the buffered messages should be written. Requires the lock."""
+        if not self._buffer:
+            return False
+        if self._closed or self._flush_requested:
+            return True
+        if len(self._buffer) >= self.batch_size:
+            return True
+        return time.monotonic() - self._buffered_at >= self.flush_interval
+
+    def _run(self) -> None:
+        """Write batches to the vector store until the queue is closed."""
+        while True:
+            with self._condition:
+                while not self._is_due():
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._buffer:
+                        elapsed = time.monotonic() - self._buffered_at
+                        timeout = max(0.0, self.flush_interval - elapsed)
+                    self._condition.wait(timeout)
+
+                batch = self._buffer[: self.batch_size]
+                del self._buffer[: self.batch_size]
+                self._buffered_at = time.monotonic() if self._buffer else None
+                self._in_flight = len(batch)
+
+            try:
+                self.vector_store.add_messages_to_collection(batch)
+            except Exception as e:
+                self._logger.error(f"Error embedding {len(batch)} messages: {e}")
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
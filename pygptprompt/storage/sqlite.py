@@ -8,6 +8,7 @@ from typing import List
 from peewee import (
     CharField,
     DateTimeField,
+    IntegerField,
     Model,
     OperationalError,
     SqliteDatabase,
@@ -71,7 +72,11 @@ class SQLiteMemoryStore:
 
         """
         self.db_name = config.evaluate_path("app.database.sqlite")
-        self.db = SqliteDatabase(self.db_name)
+        # NOTE: WAL lets readers proceed while a session is being written.
+        self.db = SqliteDatabase(
+            self.db_name,
+            pragmas={"journal_mode": "wal", "synchronous": "normal"},
+        )
         self._logger = config.get_logger("general", self.__class__.__name__)
 
     def connect(self) -> bool:
@@ -115,7 +120,11 @@ class SQLiteMemoryStore:
             content = TextField(null=True)
             function_call = TextField(null=True)
             function_args = TextField(null=True)
+            name = CharField(null=True)
             user = CharField(null=True)
+            # NOTE: The token count is only valid for the provider that counted it
+            provider = CharField(null=True)
+            token_count = IntegerField(null=True)
             timestamp = DateTimeField(index=True)
 
             class Meta:
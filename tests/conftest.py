@@ -5,13 +5,20 @@ import json
 import os
 from typing import List, Union
 
+import numpy as np
 import pytest
 
 from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.json.base import JSONBaseTemplate
 from pygptprompt.json.list import JSONListTemplate
 from pygptprompt.json.mapping import JSONMappingTemplate
-from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.base import (
+    ChatModel,
+    ChatModelEmbedding,
+    ChatModelEncoding,
+    ChatModelResponse,
+    ChatModelTextCompletion,
+)
 from pygptprompt.model.factory import ChatModelFactory
 from pygptprompt.model.llama_cpp import LlamaCppModel
 from pygptprompt.model.openai import OpenAIModel
@@ -255,6 +262,38 @@ def chat_model(chat_model_factory: ChatModelFactory) -> ChatModel:
     return chat_model_factory.create_model(provider="llama_cpp")
 
 
+class WhitespaceChatModel(ChatModel):
+    """
+    A deterministic, offline chat model where every whitespace separated word is a token.
+    """
+
+    def __init__(self, config: ConfigurationManager):
+        self.config = config
+        self.encoding_calls = 0
+
+    def get_completion(self, prompt: str) -> ChatModelTextCompletion:
+        return prompt
+
+    def get_chat_completion(
+        self, messages: List[ChatModelResponse], headless: bool = False
+    ) -> ChatModelResponse:
+        return ChatModelResponse(role="assistant", content=messages[-1]["content"])
+
+    def get_embedding(self, input: Union[str, List[str]]) -> ChatModelEmbedding:
+        if isinstance(input, str):
+            input = [input]
+        return np.array([[len(text)] for text in input], dtype=np.float32)
+
+    def get_encoding(self, text: str) -> ChatModelEncoding:
+        self.encoding_calls += 1
+        return [len(word) for word in text.split()]
+
+
+@pytest.fixture
+def whitespace_chat_model(config: ConfigurationManager) -> WhitespaceChatModel:
+    return WhitespaceChatModel(config)
+
+
 # @pytest.fixture(scope="module")
 # def token_manager(
 #     config: ConfigurationManager, chat_model: ChatModel
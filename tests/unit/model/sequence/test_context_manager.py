@@ -0,0 +1,63 @@
+"""
+tests/unit/model/sequence/test_context_manager.py
+"""
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.context_manager import ContextWindowManager
+
+
+class TestContextWindowEviction:
+    def test_enqueue_evicts_oldest_messages_in_bulk(
+        self,
+        tmp_path,
+        config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+    ):
+        context_window = ContextWindowManager(
+            str(tmp_path / "context.json"), "llama_cpp", config, whitespace_chat_model
+        )
+        token_manager = context_window.token_manager
+        limit = token_manager.upper_bound - token_manager.offset
+
+        system_message = ChatModelResponse(role="system", content="Be brief.")
+        context_window.enqueue(system_message)
+        for index in range(4):
+            context_window.enqueue(
+                ChatModelResponse(role="user", content=f"{index} " * (limit // 5))
+            )
+
+        # A large injection must evict several messages in one append.
+        injection = ChatModelResponse(role="user", content="x " * (limit // 2))
+        context_window.enqueue(injection)
+
+        assert context_window.system_message == system_message
+        assert context_window[-1] == injection
+        assert len(context_window) == 4  # system, two remaining, injection
+        assert not token_manager.causes_token_count_overflow(context_window.token_count)
+
+    def test_enqueue_without_eviction_skips_the_evictable_range(
+        self,
+        tmp_path,
+        config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+    ):
+        context_window = ContextWindowManager(
+            str(tmp_path / "context.json"), "llama_cpp", config, whitespace_chat_model
+        )
+        context_window.enqueue(ChatModelResponse(role="system", content="Be brief."))
+        context_window.enqueue(ChatModelResponse(role="user", content="Hello"))
+
+        class SlicingList(list):
+            slices = 0
+
+            def __getitem__(self, index):
+                if isinstance(index, slice):
+                    SlicingList.slices += 1
+                return super().__getitem__(index)
+
+        context_window._sequence = SlicingList(context_window._sequence)
+        context_window.enqueue(ChatModelResponse(role="assistant", content="Hi"))
+
+        # NOTE: The running token total is enough when nothing is evicted.
+        assert SlicingList.slices == 0
+        assert len(context_window) == 3
@@ -0,0 +1,35 @@
+"""
+tests/unit/model/sequence/test_message.py
+"""
+import pytest
+
+from pygptprompt.model.base import ChatModelResponse, FunctionCall
+from pygptprompt.model.sequence.message import Message
+
+
+class TestMessage:
+    def test_round_trip(self):
+        response = ChatModelResponse(
+            role="assistant",
+            content=None,
+            function_call=FunctionCall(name="get_weather", arguments="{}"),
+        )
+        message = Message.from_dict(response, token_count=7)
+
+        assert message == response
+        assert dict(message) == response
+        assert message.to_dict() == response
+        assert type(message.to_dict()) is dict
+        assert message.token_count == 7
+        assert "name" not in message
+
+    def test_compact_record(self):
+        first = Message(role="".join(["us", "er"]), content="Hello")
+        second = Message.from_dict({"role": "user", "content": "World"})
+
+        assert first.role is second.role
+        assert not hasattr(first, "__dict__")
+        with pytest.raises(AttributeError):
+            first.content = "Goodbye"
+        with pytest.raises(TypeError):
+            Message(role="user", unknown="field")
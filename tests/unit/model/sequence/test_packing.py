@@ -0,0 +1,120 @@
+"""
+tests/unit/model/sequence/test_packing.py
+"""
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.context_manager import ContextWindowManager
+from pygptprompt.model.sequence.message import Message
+from pygptprompt.model.sequence.packing import (
+    FIFOPacking,
+    LastPairsPacking,
+    RelevancePacking,
+    VectorStoreRelevance,
+)
+
+
+@pytest.fixture
+def conversation() -> List[Message]:
+    roles = ["user", "assistant"] * 3
+    return [
+        Message(role, token_count=10, content=f"{role} {index}")
+        for index, role in enumerate(roles)
+    ]
+
+
+class TestPackingStrategy:
+    def test_fifo_keeps_newest_messages(self, conversation: List[Message]):
+        query = Message("user", token_count=10, content="next")
+        assert FIFOPacking().select(conversation, 35, query) == [3, 4, 5]
+        assert FIFOPacking().select(conversation, 5, query) == []
+
+    def test_last_pairs(self, conversation: List[Message]):
+        query = Message("user", token_count=10, content="next")
+        # NOTE: The query opens the second exchange
+        assert LastPairsPacking(pairs=2).select(conversation, 100, query) == [4, 5]
+        assert LastPairsPacking(pairs=2).select(conversation, 15, query) == [5]
+
+    def test_relevance_knapsack(self, conversation: List[Message]):
+        query = Message("user", token_count=10, content="next")
+        relevance = {"user 0": 0.9, "assistant 1": 0.1, "user 2": 0.5}
+
+        def score(query: Message, messages: List[Message]) -> List[float]:
+            return [relevance.get(message["content"], 0.0) for message in messages]
+
+        strategy = RelevancePacking(score, keep_last=2)
+        assert strategy.select(conversation, 40, query) == [0, 2, 4, 5]
+        assert strategy.select(conversation, 30, query) == [0, 4, 5]
+
+    def test_relevance_scores_prefetched_embeddings(self):
+        vectors = {"cats": [1.0, 0.0], "dogs": [0.0, 1.0], "kittens": [0.9, 0.1]}
+        calls = []
+
+        def embedding_function(texts: List[str]) -> List[List[float]]:
+            calls.append(list(texts))
+            return [vectors[text] for text in texts]
+
+        relevance = VectorStoreRelevance(
+            SimpleNamespace(embedding_function=embedding_function)
+        )
+        messages = [
+            Message("user", token_count=10, content=content)
+            for content in ("cats", "dogs")
+        ]
+        query = Message("user", token_count=10, content="kittens")
+
+        # NOTE: Scoring never waits for the embedding function
+        assert relevance(query, messages) == [0.0, 0.0]
+        assert calls == []
+
+        relevance.prefetch(messages + [query])
+        relevance._executor.shutdown(wait=True)
+        scores = relevance(query, messages)
+        assert calls == [["cats", "dogs", "kittens"]]
+        assert scores[0] > scores[1]
+
+        # NOTE: The newest ready message stands in for an unembedded query
+        birds = Message("user", token_count=10, content="birds")
+        assert relevance(birds, messages) == scores
+        assert len(calls) == 1
+
+    def test_relevance_falls_back_to_fifo(self, conversation: List[Message]):
+        query = Message("user", token_count=10, content="next")
+
+        def score(query: Message, messages: List[Message]) -> List[float]:
+            return [0.0] * len(messages)
+
+        strategy = RelevancePacking(score, keep_last=2)
+        assert strategy.select(conversation, 40, query) == [2, 3, 4, 5]
+
+    def test_context_window_uses_strategy(
+        self,
+        tmp_path,
+        config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+    ):
+        context_window = ContextWindowManager(
+            str(tmp_path / "context.json"),
+            "llama_cpp",
+            config,
+            whitespace_chat_model,
+            packing_strategy=LastPairsPacking(pairs=1),
+        )
+        token_manager = context_window.token_manager
+        limit = token_manager.upper_bound - token_manager.offset
+
+        context_window.enqueue(ChatModelResponse(role="system", content="Be brief."))
+        for index in range(4):
+            context_window.enqueue(
+                ChatModelResponse(role="user", content=f"{index} " * (limit // 5))
+            )
+        injection = ChatModelResponse(role="user", content="x " * (limit // 2))
+        context_window.enqueue(injection)
+
+        # NOTE: Only the system message and the newest exchange remain
+        assert len(context_window) == 2
+        assert context_window[-1] == injection
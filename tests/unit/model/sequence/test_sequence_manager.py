@@ -0,0 +1,87 @@
+"""
+tests/unit/model/sequence/test_sequence_manager.py
+"""
+import json
+from typing import List
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.transcript_manager import TranscriptManager
+
+
+class TestSequenceManagerTokenCache:
+    def test_token_count_tracks_mutations(
+        self,
+        tmp_path,
+        config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        transcript = TranscriptManager(
+            str(tmp_path / "transcript.json"),
+            "llama_cpp",
+            config,
+            whitespace_chat_model,
+        )
+        token_manager = transcript.token_manager
+
+        transcript.enqueue(messages)
+        assert transcript.token_count == token_manager.calculate_chat_sequence_length(
+            transcript.sequence
+        )
+
+        transcript[1] = ChatModelResponse(role="user", content="Hello")
+        del transcript[2]
+        transcript.system_message = ChatModelResponse(
+            role="system", content="Be brief."
+        )
+
+        assert len(transcript.token_counts) == len(transcript)
+        assert transcript.token_count == token_manager.calculate_chat_sequence_length(
+            transcript.sequence
+        )
+
+    def test_token_counts_survive_save_and_load(
+        self,
+        tmp_path,
+        config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = str(tmp_path / "transcript.json")
+        transcript = TranscriptManager(
+            file_path, "llama_cpp", config, whitespace_chat_model
+        )
+        transcript.enqueue(messages)
+        assert transcript.save_from_chat_completions()
+
+        reloaded = TranscriptManager(
+            file_path, "llama_cpp", config, whitespace_chat_model
+        )
+        calls = whitespace_chat_model.encoding_calls
+        assert reloaded.load_to_chat_completions()
+
+        # NOTE: Stored counts are reused and never leak into the messages.
+        assert whitespace_chat_model.encoding_calls == calls
+        assert reloaded.sequence == messages
+        assert reloaded.token_count == transcript.token_count
+
+    def test_token_counts_without_stored_counts_are_batched(
+        self,
+        tmp_path,
+        config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = tmp_path / "transcript.json"
+        file_path.write_text(json.dumps(messages))
+
+        transcript = TranscriptManager(
+            str(file_path), "llama_cpp", config, whitespace_chat_model
+        )
+        assert transcript.load_to_chat_completions()
+
+        token_manager = transcript.token_manager
+        assert transcript.token_counts == [
+            token_manager.calculate_chat_message_length(message) for message in messages
+        ]
@@ -0,0 +1,133 @@
+"""
+tests/unit/model/sequence/test_sequence_storage.py
+"""
+from typing import List
+
+import pytest
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.json.lines import JSONLinesTemplate
+from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.context_manager import ContextWindowManager
+from pygptprompt.model.sequence.transcript_manager import TranscriptManager
+
+
+@pytest.fixture
+def jsonl_config(config: ConfigurationManager, monkeypatch) -> ConfigurationManager:
+    get_value = config.get_value
+    overrides = {
+        "app.session.storage": "jsonl",
+        "app.session.compact_threshold": 4,
+    }
+    monkeypatch.setattr(
+        config,
+        "get_value",
+        lambda key, default=None: overrides.get(key, get_value(key, default)),
+    )
+    return config
+
+
+class TestJSONLinesSequenceStorage:
+    def test_transcript_appends_to_snapshot(
+        self,
+        tmp_path,
+        jsonl_config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = str(tmp_path / "transcript.json")
+        transcript = TranscriptManager(
+            file_path, "llama_cpp", jsonl_config, whitespace_chat_model
+        )
+        transcript.enqueue(messages[:2])
+        assert transcript.save_from_chat_completions()
+        transcript.enqueue(messages[2:])
+        assert transcript.save_from_chat_completions()
+
+        snapshot = JSONLinesTemplate(tmp_path / "transcript.jsonl")
+        assert snapshot.load_jsonl()
+        assert len(snapshot.data) == len(messages) + 1  # NOTE: Includes the header
+        assert not (tmp_path / "transcript.log.jsonl").exists()
+
+        reloaded = TranscriptManager(
+            file_path, "llama_cpp", jsonl_config, whitespace_chat_model
+        )
+        assert reloaded.load_to_chat_completions()
+        assert reloaded.sequence == messages
+        assert reloaded.token_count == transcript.token_count
+
+    def test_context_window_replays_log_and_compacts(
+        self,
+        tmp_path,
+        jsonl_config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = str(tmp_path / "context.json")
+        context_window = ContextWindowManager(
+            file_path, "llama_cpp", jsonl_config, whitespace_chat_model
+        )
+        context_window.enqueue(messages)
+        assert context_window.save_from_chat_completions()
+
+        context_window.dequeue()
+        context_window.enqueue(ChatModelResponse(role="user", content="Thanks!"))
+        assert context_window.save_from_chat_completions()
+
+        log = JSONLinesTemplate(tmp_path / "context.log.jsonl")
+        assert log.load_jsonl()
+        assert len(log.data) == 3  # NOTE: The header, a delete, and an insert
+
+        reloaded = ContextWindowManager(
+            file_path, "llama_cpp", jsonl_config, whitespace_chat_model
+        )
+        assert reloaded.load_to_chat_completions()
+        assert reloaded.sequence == context_window.sequence
+        assert reloaded.token_count == context_window.token_count
+
+        # Exceeding the compact threshold writes a new snapshot.
+        for index in range(4):
+            reloaded.dequeue()
+            reloaded.enqueue(ChatModelResponse(role="user", content=f"{index}"))
+        assert reloaded.save_from_chat_completions()
+        assert log.load_jsonl()
+        assert log.data == []
+
+    def test_stale_log_is_ignored(
+        self,
+        tmp_path,
+        jsonl_config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = str(tmp_path / "context.json")
+        context_window = ContextWindowManager(
+            file_path, "llama_cpp", jsonl_config, whitespace_chat_model
+        )
+        context_window.enqueue(messages)
+        assert context_window.save_from_chat_completions()
+        context_window.dequeue()
+        assert context_window.save_from_chat_completions()
+
+        # Simulate a crash between writing a snapshot and truncating the log.
+        log_path = tmp_path / "context.log.jsonl"
+        stale_log = log_path.read_text()
+        assert context_window._compact_jsonl()
+        log_path.write_text(stale_log)
+
+        reloaded = ContextWindowManager(
+            file_path, "llama_cpp", jsonl_config, whitespace_chat_model
+        )
+        assert reloaded.load_to_chat_completions()
+        assert reloaded.sequence == context_window.sequence
+
+        # Saving after the stale log is ignored starts a new log for the snapshot.
+        reloaded.dequeue()
+        reloaded.enqueue(ChatModelResponse(role="user", content="Thanks!"))
+        assert reloaded.save_from_chat_completions()
+
+        resumed = ContextWindowManager(
+            file_path, "llama_cpp", jsonl_config, whitespace_chat_model
+        )
+        assert resumed.load_to_chat_completions()
+        assert resumed.sequence == reloaded.sequence
@@ -0,0 +1,144 @@
+"""
+tests/unit/model/sequence/test_sqlite_manager.py
+"""
+from typing import List
+
+import pytest
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.sqlite_manager import (
+    SQLiteContextWindowManager,
+    SQLiteTranscriptManager,
+)
+
+
+@pytest.fixture
+def sqlite_config(
+    tmp_path, config: ConfigurationManager, monkeypatch
+) -> ConfigurationManager:
+    get_value = config.get_value
+    overrides = {
+        "app.database.sqlite": {
+            "path": str(tmp_path / "sequence.sqlite3"),
+            "type": "file",
+        },
+        "app.session.storage": "sqlite",
+        "app.session.page_size": 2,
+    }
+    monkeypatch.setattr(
+        config,
+        "get_value",
+        lambda key, default=None: overrides.get(key, get_value(key, default)),
+    )
+    return config
+
+
+class TestSQLiteSequenceManager:
+    def test_transcript_pages(
+        self,
+        tmp_path,
+        sqlite_config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = str(tmp_path / "default_transcript.json")
+        transcript = SQLiteTranscriptManager(
+            file_path, "llama_cpp", sqlite_config, whitespace_chat_model
+        )
+        assert not transcript.load_to_chat_completions()
+
+        transcript.enqueue(messages[:2])
+        assert transcript.save_from_chat_completions()
+        transcript.enqueue(messages[2:])
+        assert transcript.save_from_chat_completions()
+
+        pages = list(transcript.iter_pages())
+        assert [len(page) for page in pages] == [2, 1]
+        assert [message for page in pages for message in page] == messages
+        assert transcript.get_page(2) == messages[2:]
+
+        reloaded = SQLiteTranscriptManager(
+            file_path, "llama_cpp", sqlite_config, whitespace_chat_model
+        )
+        encoding_calls = whitespace_chat_model.encoding_calls
+        assert reloaded.load_to_chat_completions()
+        assert whitespace_chat_model.encoding_calls == encoding_calls
+        assert reloaded.token_count == transcript.token_count
+        assert len(reloaded) == len(messages)
+        assert reloaded[-1] == messages[-1]
+        assert list(reloaded) == messages
+
+    def test_transcript_updates_stored_messages(
+        self,
+        tmp_path,
+        sqlite_config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = str(tmp_path / "default_transcript.json")
+        transcript = SQLiteTranscriptManager(
+            file_path, "llama_cpp", sqlite_config, whitespace_chat_model
+        )
+        transcript.enqueue(messages)
+        assert transcript.save_from_chat_completions()
+
+        reloaded = SQLiteTranscriptManager(
+            file_path, "llama_cpp", sqlite_config, whitespace_chat_model
+        )
+        assert reloaded.load_to_chat_completions()
+        system_message = ChatModelResponse(role="system", content="Be brief.")
+        reloaded.system_message = system_message
+        message = ChatModelResponse(role="user", content="Hello again.")
+        reloaded.enqueue(message)
+        assert reloaded.system_message == system_message
+        length = reloaded.token_manager.calculate_chat_message_length
+        assert reloaded.token_count == (
+            transcript.token_count
+            - length(messages[0])
+            + length(system_message)
+            + length(message)
+        )
+        assert reloaded.save_from_chat_completions()
+
+        expected = [system_message] + messages[1:] + [message]
+        assert list(reloaded) == expected
+
+        # NOTE: Token counts stored by another provider are counted once
+        other = SQLiteTranscriptManager(
+            file_path, "openai", sqlite_config, whitespace_chat_model
+        )
+        assert other.load_to_chat_completions()
+        assert other.token_count == reloaded.token_count
+        assert list(other.iter_pages()) == [expected[:2], expected[2:]]
+
+    def test_context_window_persists_evictions(
+        self,
+        tmp_path,
+        sqlite_config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        file_path = str(tmp_path / "default_context.json")
+        context_window = SQLiteContextWindowManager(
+            file_path, "llama_cpp", sqlite_config, whitespace_chat_model
+        )
+        context_window.enqueue(messages[1:])
+        assert context_window.save_from_chat_completions()
+
+        # NOTE: Inserting before the stored messages rewrites the table
+        context_window.system_message = messages[0]
+        context_window.enqueue(messages[1:])
+        context_window.evict(2)
+        context_window.system_message = ChatModelResponse(
+            role="system", content="A new system message."
+        )
+        context_window.enqueue(ChatModelResponse(role="user", content="Hello again."))
+        assert context_window.save_from_chat_completions()
+
+        reloaded = SQLiteContextWindowManager(
+            file_path, "llama_cpp", sqlite_config, whitespace_chat_model
+        )
+        assert reloaded.load_to_chat_completions()
+        assert reloaded.sequence == context_window.sequence
+        assert reloaded.token_counts == context_window.token_counts
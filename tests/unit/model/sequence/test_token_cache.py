@@ -0,0 +1,55 @@
+"""
+tests/unit/model/sequence/test_token_cache.py
+"""
+from typing import List
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.base import ChatModel, ChatModelResponse
+from pygptprompt.model.sequence.token_cache import TokenCountCache
+from pygptprompt.model.sequence.token_manager import TokenManager
+
+
+class TestTokenCountCache:
+    def test_cache_is_shared_across_token_managers(
+        self,
+        config: ConfigurationManager,
+        whitespace_chat_model: ChatModel,
+        messages: List[ChatModelResponse],
+    ):
+        cache = TokenCountCache()
+        cache.clear()
+
+        context = TokenManager("llama_cpp", config, whitespace_chat_model)
+        transcript = TokenManager("llama_cpp", config, whitespace_chat_model)
+
+        expected = context.calculate_chat_message_lengths(messages)
+        calls = whitespace_chat_model.encoding_calls
+
+        assert transcript.calculate_chat_message_lengths(messages) == expected
+        assert transcript.calculate_chat_message_length(messages[0]) == expected[0]
+        assert whitespace_chat_model.encoding_calls == calls
+        assert cache.info()["hits"] == len(messages) + 1
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = TokenCountCache()
+        cache.clear()
+        max_size = cache.max_size
+
+        try:
+            cache.max_size = 2
+            first = cache.make_key("test", "first")
+            second = cache.make_key("test", "second")
+            third = cache.make_key("test", "third")
+
+            cache.put(first, 1)
+            cache.put(second, 2)
+            assert cache.get(first) == 1  # NOTE: second is now the oldest
+            cache.put(third, 3)
+
+            assert cache.get(second) is None
+            assert cache.get(first) == 1
+            assert cache.get(third) == 3
+            assert len(cache) == 2
+        finally:
+            cache.max_size = max_size
+            cache.clear()
@@ -0,0 +1,34 @@
+"""
+tests/unit/model/test_embedding.py
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from pygptprompt.model.embedding import EmbeddingScheduler
+
+
+class TestEmbeddingScheduler:
+    def test_plan_packs_by_length(self):
+        scheduler = EmbeddingScheduler(max_batch_size=2, max_batch_tokens=10)
+        # NOTE: The oversized input is sent in a batch of its own.
+        assert scheduler.plan([3, 12, 5, 1, 4]) == [[1], [2, 4], [0, 3]]
+
+    def test_run_keeps_input_order(self):
+        scheduler = EmbeddingScheduler(max_batch_size=2, workers=3)
+        texts = ["a", "bbbb", "cc", "ddd", "eeeee"]
+        # NOTE: Each of the three batches waits for the others to start.
+        barrier = threading.Barrier(3, timeout=5)
+
+        def embed(batch):
+            barrier.wait()
+            return [[float(len(text)), 0.0] for text in batch]
+
+        embeddings = scheduler.run(texts, [len(text) for text in texts], embed)
+        assert embeddings.dtype == np.float32
+        assert embeddings[:, 0].tolist() == [1.0, 4.0, 2.0, 3.0, 5.0]
+
+    def test_assemble_rejects_missing_vectors(self):
+        with pytest.raises(ValueError):
+            EmbeddingScheduler.assemble([[0, 1]], [[[1.0]]], 2)
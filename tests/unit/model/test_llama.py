@@ -0,0 +1,315 @@
+"""
+tests/unit/model/test_llama.py
+"""
+import json
+import math
+from types import SimpleNamespace
+
+import pytest
+import torch
+import torch.nn.functional as F
+from fairscale.nn.model_parallel.initialize import (
+    initialize_model_parallel,
+    model_parallel_is_initialized,
+)
+
+from pygptprompt.model.llama.generation import Llama
+from pygptprompt.model.llama.model import (
+    Attention,
+    ModelArgs,
+    Transformer,
+    apply_rotary_emb,
+    causal_mask,
+    precompute_freqs_cis,
+)
+from pygptprompt.model.llama.quantize import (
+    QuantizedLinear,
+    quantize_checkpoint,
+    quantize_model,
+)
+from pygptprompt.model.llama.scheduler import ContinuousBatchScheduler
+
+
+@pytest.fixture(scope="module", autouse=True)
+def model_parallel(tmp_path_factory):
+    if not torch.distributed.is_initialized():
+        store = tmp_path_factory.mktemp("distributed") / "store"
+        torch.distributed.init_process_group(
+            "gloo", init_method=f"file://{store}", rank=0, world_size=1
+        )
+    if not model_parallel_is_initialized():
+        initialize_model_parallel(1)
+
+
+def create_transformer(
+    seed: int, n_layers: int = 2, std: float = 0.5, **kwargs
+) -> Transformer:
+    torch.manual_seed(seed)
+    args = ModelArgs(
+        dim=32,
+        n_layers=n_layers,
+        n_heads=4,
+        n_kv_heads=2,
+        vocab_size=64,
+        multiple_of=16,
+        max_batch_size=2,
+        max_seq_len=64,
+        **kwargs,
+    )
+    model = Transformer(args)
+    # NOTE: The parallel layers are left uninitialized without a checkpoint.
+    for parameter in model.parameters():
+        if parameter.ndim > 1:
+            torch.nn.init.normal_(parameter, std=std)
+    return model
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    ckpt_dir = tmp_path / "float"
+    ckpt_dir.mkdir()
+    torch.save(
+        create_transformer(seed=0).state_dict(), ckpt_dir / "consolidated.00.pth"
+    )
+    params = {"dim": 32, "n_layers": 2, "n_heads": 4, "n_kv_heads": 2}
+    (ckpt_dir / "params.json").write_text(json.dumps({**params, "multiple_of": 16}))
+    return ckpt_dir
+
+
+def load_transformer(ckpt_dir, **kwargs) -> Transformer:
+    return Llama._load_transformer(ckpt_dir, 1, 64, 64, 2, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    # NOTE: An unreachable eos keeps every generation at max_gen_len.
+    return SimpleNamespace(eos_id=-2, pad_id=-1)
+
+
+def repeat_kv(x: torch.Tensor, n_rep: int) -> torch.Tensor:
+    bs, slen, n_kv_heads, head_dim = x.shape
+    return (
+        x[:, :, :, None, :]
+        .expand(bs, slen, n_kv_heads, n_rep, head_dim)
+        .reshape(bs, slen, n_kv_heads * n_rep, head_dim)
+    )
+
+
+def reference_attention(
+    attention: Attention, x: torch.Tensor, freqs_cis: torch.Tensor
+) -> torch.Tensor:
+    # causal attention over the whole sequence with the k/v heads repeated
+    bsz, seqlen, _ = x.shape
+    n_kv_heads, head_dim = attention.n_local_kv_heads, attention.head_dim
+    xq = attention.wq(x).view(bsz, seqlen, attention.n_local_heads, head_dim)
+    xk = attention.wk(x).view(bsz, seqlen, n_kv_heads, head_dim)
+    xv = attention.wv(x).view(bsz, seqlen, n_kv_heads, head_dim)
+    xq, xk = apply_rotary_emb(xq, xk, freqs_cis=freqs_cis)
+
+    xq = xq.transpose(1, 2)
+    keys = repeat_kv(xk, attention.n_rep).transpose(1, 2)
+    values = repeat_kv(xv, attention.n_rep).transpose(1, 2)
+    scores = torch.matmul(xq, keys.transpose(2, 3)) / math.sqrt(head_dim)
+    scores = scores + torch.full((seqlen, seqlen), float("-inf")).triu(1)
+    output = torch.matmul(F.softmax(scores.float(), dim=-1).type_as(xq), values)
+    return attention.wo(output.transpose(1, 2).reshape(bsz, seqlen, -1))
+
+
+class TestGroupedAttention:
+    @torch.no_grad()
+    def test_matches_repeated_kv(self):
+        torch.manual_seed(0)
+        args = ModelArgs(
+            dim=32, n_heads=8, n_kv_heads=2, max_batch_size=2, max_seq_len=8
+        )
+        attention = Attention(args)
+        for parameter in attention.parameters():
+            torch.nn.init.normal_(parameter, std=0.5)
+        freqs_cis = precompute_freqs_cis(attention.head_dim, args.max_seq_len)
+        # NOTE: Distinct k/v head and group counts catch a transposed grouping
+        assert attention.n_rep == 4
+
+        x = torch.randn(2, 8, 32)
+        expected = reference_attention(attention, x, freqs_cis)
+
+        # NOTE: A prefill from 0, a prefill from a cached prefix, then a decode
+        for start_pos, end_pos in [(0, 3), (3, 7), (7, 8)]:
+            seqlen = end_pos - start_pos
+            mask = None
+            if seqlen > 1:
+                mask = causal_mask(seqlen, start_pos, attention.n_rep)
+            output = attention(
+                x[:, start_pos:end_pos],
+                start_pos,
+                freqs_cis[start_pos:end_pos],
+                mask,
+            )
+            torch.testing.assert_close(
+                output, expected[:, start_pos:end_pos], rtol=1e-4, atol=1e-4
+            )
+
+
+class TestSpeculativeDecoding:
+    def test_greedy_output_matches_target(self, tokenizer):
+        target = create_transformer(seed=0)
+        prompts = [[1, 5, 9], [2, 4, 6, 8, 10]]
+
+        expected, _ = Llama(target, tokenizer).generate(
+            prompts, max_gen_len=12, temperature=0
+        )
+        llama = Llama(target, tokenizer, draft_model=create_transformer(seed=1))
+        tokens, _ = llama.generate(prompts, max_gen_len=12, temperature=0)
+
+        assert tokens == expected
+        stats = llama.speculative_stats
+        assert stats["generated"] == 24
+        assert 0 <= stats["accepted"] <= stats["drafted"]
+
+    def test_identical_draft_is_always_accepted(self, tokenizer):
+        target = create_transformer(seed=0)
+        llama = Llama(target, tokenizer, draft_model=create_transformer(seed=0))
+        tokens, stats = llama.speculative_generate([[1, 2, 3]], 10, temperature=0)
+
+        assert len(tokens[0]) == 10
+        assert stats["acceptance_rate"] == 1.0
+        assert stats["tokens_per_second"] > 0
+
+
+class TestContinuousBatchScheduler:
+    def test_requests_join_and_retire_individually(self, tokenizer):
+        llama = Llama(create_transformer(seed=0), tokenizer)
+        prompts = [[1, 5, 9], [2, 4, 6, 8, 10, 12, 14], [3], [7, 7]]
+        max_gen_lens = [3, 9, 6, 4]
+        expected = [
+            llama.generate([prompt], max_gen_len=max_gen_len, temperature=0)[0][0]
+            for prompt, max_gen_len in zip(prompts, max_gen_lens)
+        ]
+
+        scheduler = ContinuousBatchScheduler(llama)
+        requests = [
+            scheduler.submit(prompt, max_gen_len, temperature=0)
+            for prompt, max_gen_len in zip(prompts[:3], max_gen_lens[:3])
+        ]
+        streamed = {request.request_id: [] for request in requests}
+        for request, token in scheduler.stream():
+            streamed.setdefault(request.request_id, []).append(token)
+            # NOTE: The last request joins while the first ones are in flight.
+            if len(requests) == 3 and requests[0].finished:
+                requests.append(scheduler.submit(prompts[3], max_gen_lens[3], 0))
+
+        assert [request.tokens for request in requests] == expected
+        assert [streamed[request.request_id] for request in requests] == expected
+        assert scheduler.stats["generated"] == sum(max_gen_lens)
+        assert scheduler.stats["requests"] == 4
+
+
+class TestPagedKVCache:
+    def test_generate_matches_contiguous_cache(self, tokenizer):
+        prompts = [[1, 5, 9], [2, 4, 6, 8, 10, 12, 14]]
+        expected, _ = Llama(create_transformer(seed=0), tokenizer).generate(
+            prompts, max_gen_len=10, temperature=0
+        )
+        model = create_transformer(seed=0, kv_block_size=4)
+        tokens, _ = Llama(model, tokenizer).generate(
+            prompts, max_gen_len=10, temperature=0
+        )
+
+        assert tokens == expected
+        assert model.kv_cache.used_blocks == 0
+        # NOTE: 16 positions of 2 sequences, instead of 2 slots of 64 positions.
+        assert model.kv_cache.num_blocks == 8
+
+    def test_cache_follows_model_dtype(self, tokenizer):
+        prompts = [[1, 5, 9], [2, 4, 6, 8, 10, 12, 14]]
+        resident_bytes = {}
+        for dtype in (torch.float32, torch.bfloat16):
+            model = create_transformer(seed=0, kv_block_size=4).to(dtype)
+            Llama(model, tokenizer).generate(prompts, max_gen_len=10, temperature=0)
+            resident_bytes[dtype] = model.kv_cache.resident_bytes
+
+        assert resident_bytes[torch.bfloat16] * 2 == resident_bytes[torch.float32]
+
+    def test_prompts_share_prefix_blocks(self, tokenizer):
+        prefix = [3, 1, 4, 1, 5, 9, 2, 6]
+        prompts = [prefix + [5, 3], prefix + [5, 8]]
+        contiguous = Llama(create_transformer(seed=0), tokenizer)
+        expected = [
+            contiguous.generate([prompt], max_gen_len=5, temperature=0)[0][0]
+            for prompt in prompts
+        ]
+
+        model = create_transformer(seed=0, kv_block_size=4)
+        scheduler = ContinuousBatchScheduler(Llama(model, tokenizer))
+        requests = [scheduler.submit(prompt, 5, temperature=0) for prompt in prompts]
+        scheduler.step()
+        # NOTE: The two full prefix blocks are shared, each prompt owns its last block.
+        assert model.kv_cache.used_blocks == 4
+        list(scheduler.stream())
+
+        assert [request.tokens for request in requests] == expected
+        assert model.kv_cache.used_blocks == 0
+
+
+class TestQuantization:
+    @staticmethod
+    def perplexity(model: Transformer, tokens: torch.Tensor) -> float:
+        with torch.inference_mode():
+            logits = model.forward(tokens, 0)[:, :-1]
+        loss = F.cross_entropy(logits.flatten(0, 1), tokens[:, 1:].flatten())
+        return float(torch.exp(loss))
+
+    def test_perplexity_delta(self, tokenizer):
+        # NOTE: The text is sampled from the float model, so its perplexity is meaningful.
+        torch.manual_seed(7)
+        prompts = [[1, 2], [3, 4]]
+        generated, _ = Llama(create_transformer(seed=0, std=0.2), tokenizer).generate(
+            prompts, max_gen_len=40, temperature=1.0, top_p=1.0
+        )
+        tokens = torch.tensor([p + g for p, g in zip(prompts, generated)])
+
+        expected = self.perplexity(create_transformer(seed=0, std=0.2), tokens)
+        int8 = quantize_model(create_transformer(seed=0, std=0.2), bits=8)
+        int4 = quantize_model(create_transformer(seed=0, std=0.2), 4, group_size=32)
+
+        assert abs(self.perplexity(int8, tokens) / expected - 1) < 0.01
+        assert abs(self.perplexity(int4, tokens) / expected - 1) < 0.1
+
+    def test_load_quantized_checkpoint(self, checkpoint, tmp_path):
+        model = create_transformer(seed=0)
+        assert quantize_checkpoint(checkpoint, tmp_path / "int4", 4, group_size=32)
+
+        quantized = load_transformer(tmp_path / "int4")
+        tokens = torch.tensor([[1, 5, 9, 2]])
+        with torch.inference_mode():
+            expected = quantize_model(model, 4, group_size=32).forward(tokens, 0)
+            logits = quantized.forward(tokens, 0)
+            # NOTE: Quantizing while loading gives the same model.
+            loaded = load_transformer(checkpoint, quantize_bits=4, group_size=32)
+            loaded = loaded.forward(tokens, 0)
+        assert torch.equal(logits, expected)
+        assert torch.equal(loaded, expected)
+
+        layers = [m for m in quantized.modules() if isinstance(m, QuantizedLinear)]
+        assert len(layers) == 2 * 7 + 1
+        float_bytes = sum(
+            layer.in_features * layer.out_features * 4 for layer in layers
+        )
+        quantized_bytes = sum(
+            tensor.numel() * tensor.element_size()
+            for layer in layers
+            for tensor in layer.buffers()
+        )
+        # NOTE: Half a byte per weight, plus 4 bytes of scale and zero point per 32 weights.
+        assert quantized_bytes / float_bytes < 0.16
+
+
+class TestSingleProcess:
+    def test_load_matches_model_parallel(self, checkpoint):
+        expected = load_transformer(checkpoint)
+        model = load_transformer(checkpoint, single_process=True)
+
+        assert isinstance(model.tok_embeddings, torch.nn.Embedding)
+        assert isinstance(model.layers[0].attention.wq, torch.nn.Linear)
+        tokens = torch.tensor([[1, 5, 9, 2], [3, 3, 7, 1]])
+        with torch.inference_mode():
+            assert torch.equal(model.forward(tokens, 0), expected.forward(tokens, 0))
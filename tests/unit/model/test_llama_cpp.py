@@ -1,8 +1,14 @@
 """
 tests/unit/model/test_llama_cpp.py
 """
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
 import pytest
 
+from pygptprompt.config.manager import ConfigurationManager
 from pygptprompt.model.base import (
     ChatModel,
     ChatModelEmbedding,
@@ -40,16 +46,17 @@ class TestLlamaCppAPI:
             input=embedding_input
         )
 
-        assert isinstance(embedding, list)
-        assert len(embedding) > 0  # Ensure the List is not empty
+        assert isinstance(embedding, np.ndarray)
+        assert embedding.dtype == np.float32
+        assert len(embedding) > 0  # Ensure the array is not empty
 
         for sub_embedding in embedding:
-            assert isinstance(sub_embedding, list)
+            assert isinstance(sub_embedding, np.ndarray)
 
             assert len(sub_embedding) > 0  # Ensure sub-list is not empty
 
             for value in sub_embedding:
-                assert isinstance(value, float)
+                assert isinstance(value, np.float32)
 
     @pytest.mark.slow
     def test_get_encoding(
@@ -84,3 +91,74 @@ class TestLlamaCppAPI:
             ValueError, match="'input' argument cannot be empty or None"
         ):
             llama_cpp_model.get_embedding(input="")
+
+
+class FakeLlama:
+    """An evaluation context recording whether two threads ever use it at once."""
+
+    def __init__(self):
+        self.active = 0
+        self.overlaps = 0
+        self.lock = threading.Lock()
+
+    def tokenize(self, text: bytes) -> List[int]:
+        return list(text)
+
+    def create_embedding(self, input: List[str]) -> Dict[str, Any]:
+        with self.lock:
+            self.active += 1
+            self.overlaps += self.active > 1
+        time.sleep(0.002)
+        with self.lock:
+            self.active -= 1
+        return {
+            "data": [
+                {"index": index, "embedding": [float(len(text))]}
+                for index, text in enumerate(input)
+            ]
+        }
+
+
+@pytest.fixture
+def pooled_model(config: ConfigurationManager, monkeypatch) -> LlamaCppModel:
+    get_value = config.get_value
+    overrides = {
+        "llama_cpp.batch.workers": 2,
+        "llama_cpp.cache.disabled": True,
+        "llama_cpp.embedding.max_batch_size": 1,
+    }
+    monkeypatch.setattr(
+        config,
+        "get_value",
+        lambda key, default=None: overrides.get(key, get_value(key, default)),
+    )
+    monkeypatch.setattr(LlamaCppModel, "_discover_model", lambda self: "fake.gguf")
+    monkeypatch.setattr(LlamaCppModel, "_create_llama", lambda self: FakeLlama())
+    return LlamaCppModel(config=config)
+
+
+class TestLlamaCppContextPool:
+    def test_concurrent_batches_share_one_pool(self, pooled_model: LlamaCppModel):
+        texts = [f"text {index}" for index in range(8)]
+        results = []
+
+        def embed():
+            for _ in range(5):
+                results.append(pooled_model.get_embedding(texts))
+
+        threads = [threading.Thread(target=embed) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        contexts = [pooled_model._model] + pooled_model._batch_contexts
+        assert len(contexts) == 2
+        assert [context.overlaps for context in contexts] == [0, 0]
+        assert all(result.tolist() == [[6.0]] * 8 for result in results)
+
+    def test_unload_waits_for_checked_out_contexts(self, pooled_model: LlamaCppModel):
+        with pooled_model._checkout_context():
+            assert not pooled_model.unload()
+        assert pooled_model.unload()
+        assert not pooled_model.loaded
@@ -4,6 +4,7 @@ tests/unit/model/test_openai.py
 import json
 from typing import List
 
+import numpy as np
 import pytest
 
 from pygptprompt.model.base import (
@@ -78,16 +79,17 @@ class TestOpenAI:
         )
         print(embedding)
 
-        assert isinstance(embedding, list)
-        assert len(embedding) > 0  # Ensure the List is not empty
+        assert isinstance(embedding, np.ndarray)
+        assert embedding.dtype == np.float32
+        assert len(embedding) > 0  # Ensure the array is not empty
 
         for sub_embedding in embedding:
-            assert isinstance(sub_embedding, list)
+            assert isinstance(sub_embedding, np.ndarray)
 
             assert len(sub_embedding) > 0  # Ensure sub-list is not empty
 
             for value in sub_embedding:
-                assert isinstance(value, float)
+                assert isinstance(value, np.float32)
 
     @pytest.mark.private
     def test_get_encoding(
@@ -103,6 +105,19 @@ class TestOpenAI:
         for value in encoding:
             assert isinstance(value, int)
 
+    @pytest.mark.private
+    def test_get_encodings(
+        self,
+        openai_model: OpenAIModel,
+        encoding_input: str,
+    ):
+        texts = [encoding_input, "Another test sentence."]
+        encodings: List[ChatModelEncoding] = openai_model.get_encodings(texts=texts)
+
+        assert len(encodings) == len(texts)
+        for text, encoding in zip(texts, encodings):
+            assert encoding == openai_model.get_encoding(text=text)
+
     @pytest.mark.private
     def test_get_chat_completion_with_empty_messages(
         self,
@@ -0,0 +1,181 @@
+"""
+tests/unit/model/test_openai_async.py
+"""
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.openai import OpenAIModel
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Serves streamed chat completions and embeddings, tracking requests in flight."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(0.05)
+            if self.path.endswith("/chat/completions"):
+                self._stream_chat_completion(body)
+            else:
+                self._send_embeddings(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _stream_chat_completion(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        # NOTE: Echo the last message back in two chunks
+        text = body["messages"][-1]["content"]
+        for content, finish_reason in ((text[:2], None), (text[2:], "stop")):
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": content},
+                        "finish_reason": finish_reason,
+                    }
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send_embeddings(self, body):
+        def encode(text):
+            vector = np.array([len(text)], dtype=np.float32)
+            if body.get("encoding_format") == "base64":
+                return base64.b64encode(vector.tobytes()).decode()
+            return vector.tolist()
+
+        # NOTE: Reverse the order to check that embeddings are sorted by index
+        data = [
+            {"object": "embedding", "index": index, "embedding": encode(text)}
+            for index, text in enumerate(body["input"])
+        ][::-1]
+        payload = json.dumps(
+            {
+                "object": "list",
+                "data": data,
+                "model": body["model"],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    server.lock = threading.Lock()
+    server.active = 0
+    server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def async_openai_model(
+    monkeypatch, config: ConfigurationManager, stub_server
+) -> OpenAIModel:
+    overrides = {
+        "openai.base_url": f"http://127.0.0.1:{stub_server.server_port}/v1",
+        "openai.concurrency.max_requests": 2,
+        "openai.embedding.max_batch_size": 2,
+    }
+    get_value = config.get_value
+    monkeypatch.setattr(
+        config,
+        "get_value",
+        lambda key, default=None: overrides.get(key) or get_value(key, default),
+    )
+    monkeypatch.setattr(config, "get_environment", lambda *args: "sk-stub")
+    model = OpenAIModel(config=config)
+    # NOTE: The tiktoken encodings are downloaded on first use.
+    monkeypatch.setattr(
+        model, "_count_embedding_tokens", lambda texts: [len(t) for t in texts]
+    )
+    return model
+
+
+class TestOpenAIModelAsync:
+    def test_concurrent_chat_completions(self, async_openai_model, stub_server):
+        prompts = [f"prompt {index}" for index in range(6)]
+
+        async def complete():
+            return await asyncio.gather(
+                *[
+                    async_openai_model.aget_chat_completion(
+                        [{"role": "user", "content": prompt}]
+                    )
+                    for prompt in prompts
+                ]
+            )
+
+        responses = asyncio.run(complete())
+
+        assert [response["content"] for response in responses] == prompts
+        assert stub_server.max_active == 2
+
+    def test_stream_chat_completion(self, async_openai_model):
+        async def stream():
+            messages = [{"role": "user", "content": "Hello"}]
+            return [
+                delta.content
+                async for delta in async_openai_model.astream_chat_completion(messages)
+            ]
+
+        assert asyncio.run(stream()) == ["He", "llo"]
+
+    def test_embedding(self, async_openai_model):
+        texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+        expected = [[float(len(text))] for text in texts]
+
+        embeddings = asyncio.run(async_openai_model.aget_embedding(texts))
+        assert embeddings.dtype == np.float32
+        assert embeddings.tolist() == expected
+        # NOTE: The batches of the sync path are requested by a thread pool
+        assert async_openai_model.get_embedding(texts).tolist() == expected
+
+    def test_batch_chat_completions(self, async_openai_model, stub_server):
+        batch = [[{"role": "user", "content": f"prompt {index}"}] for index in range(4)]
+        batch.insert(2, [])
+
+        results = async_openai_model.get_chat_completions(batch)
+
+        assert [result["index"] for result in results] == list(range(5))
+        assert results[2]["response"] is None
+        assert "cannot be empty" in results[2]["error"]
+        assert [
+            result["response"]["content"] for result in results if result["response"]
+        ] == [f"prompt {index}" for index in range(4)]
+        assert all(result["elapsed"] > 0 for result in results)
+        assert stub_server.max_active == 2
+        # NOTE: A second batch runs in a new event loop
+        assert not async_openai_model.get_chat_completions(batch[:1])[0]["error"]
@@ -0,0 +1,132 @@
+"""
+tests/unit/model/test_pool.py
+"""
+import threading
+import time
+from typing import List, Union
+
+import numpy as np
+
+from pygptprompt.model.base import (
+    ChatModel,
+    ChatModelEmbedding,
+    ChatModelEncoding,
+    ChatModelResponse,
+    ChatModelTextCompletion,
+)
+from pygptprompt.model.pool import ModelPool
+
+
+class LocalChatModel(ChatModel):
+    """A chat model holding fake weights, loaded on first use."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.weights = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.weights is not None
+
+    @property
+    def resident_bytes(self) -> int:
+        return self.size if self.loaded else 0
+
+    def load(self) -> bool:
+        if not self.loaded:
+            self.weights = bytes(self.size)
+            self.on_event("load", 0.0)
+        return True
+
+    def unload(self) -> bool:
+        if not self.loaded:
+            return False
+        self.weights = None
+        self.on_event("unload", 0.0)
+        return True
+
+    def get_completion(self, prompt: str) -> ChatModelTextCompletion:
+        return prompt
+
+    def get_chat_completion(
+        self, messages: List[ChatModelResponse], headless: bool = False
+    ) -> ChatModelResponse:
+        self.last_used = time.monotonic()
+        self.load()
+        return ChatModelResponse(role="assistant", content=messages[-1]["content"])
+
+    def get_embedding(self, input: Union[str, List[str]]) -> ChatModelEmbedding:
+        return np.empty((0, 0), dtype=np.float32)
+
+    def get_encoding(self, text: str) -> ChatModelEncoding:
+        return []
+
+
+class TestModelPool:
+    def test_shares_models_lazily(self):
+        pool = ModelPool()
+        first = pool.get("local:a", lambda: LocalChatModel(8))
+        second = pool.get("local:a", lambda: LocalChatModel(8))
+
+        assert first is second
+        assert not first.loaded and not pool.events
+
+        first.get_chat_completion([{"role": "user", "content": "Hello"}])
+        assert [event["event"] for event in pool.events] == ["load"]
+        assert pool.events[0]["key"] == "local:a"
+        assert pool.resident_bytes == 8
+
+    def test_creates_models_outside_the_lock(self):
+        pool = ModelPool()
+        started, released = threading.Event(), threading.Event()
+        results = []
+
+        def create_slowly() -> LocalChatModel:
+            started.set()
+            assert released.wait(5)
+            return LocalChatModel(8)
+
+        thread = threading.Thread(
+            target=lambda: results.append(pool.get("local:a", create_slowly))
+        )
+        thread.start()
+        assert started.wait(5)
+
+        # NOTE: Other keys are served while a model is created
+        other = pool.get("local:b", lambda: LocalChatModel(8))
+        first = pool.get("local:a", lambda: LocalChatModel(8))
+        released.set()
+        thread.join(5)
+
+        # NOTE: The model pooled first is shared by both callers
+        assert results == [first]
+        assert other is not first and len(pool) == 2
+
+    def test_memory_cap_unloads_least_recently_used(self):
+        pool = ModelPool(max_resident_bytes=16)
+        events = []
+        pool.listeners.append(events.append)
+        models = [pool.get(f"local:{key}", lambda: LocalChatModel(8)) for key in "abc"]
+        for model in models:
+            model.get_chat_completion([{"role": "user", "content": "Hello"}])
+
+        assert [model.loaded for model in models] == [False, True, True]
+        assert [(event["event"], event["key"]) for event in events] == [
+            ("load", "local:a"),
+            ("load", "local:b"),
+            ("load", "local:c"),
+            ("unload", "local:a"),
+        ]
+        assert pool.resident_bytes == 16
+
+    def test_unload_idle(self):
+        pool = ModelPool(ttl=1000)
+        idle = pool.get("local:idle", lambda: LocalChatModel(8))
+        busy = pool.get("local:busy", lambda: LocalChatModel(8))
+        for model in (idle, busy):
+            model.get_chat_completion([{"role": "user", "content": "Hello"}])
+        idle.last_used -= 2000
+
+        assert pool.unload_idle() == ["local:idle"]
+        assert not idle.loaded and busy.loaded
+        pool.close()
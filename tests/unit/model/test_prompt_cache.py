@@ -0,0 +1,137 @@
+"""
+tests/unit/model/test_prompt_cache.py
+"""
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+import pytest
+from llama_cpp import llama_cpp
+from llama_cpp.llama import Llama, LlamaState
+
+from pygptprompt.model.prompt_cache import (
+    PersistentPrefixStateCache,
+    PrefixStateCache,
+)
+
+
+def make_state(tokens: List[int], size: int = 8, n_ctx: int = 16) -> LlamaState:
+    # NOTE: Llama.save_state copies its whole token buffer of n_ctx tokens
+    input_ids = np.zeros(n_ctx, dtype=np.intc)
+    input_ids[: len(tokens)] = tokens
+    return LlamaState(
+        input_ids=input_ids,
+        scores=np.arange(len(tokens) * 3, dtype=np.single).reshape(-1, 3),
+        n_tokens=len(tokens),
+        llama_state=bytes(size),
+        llama_state_size=size,
+    )
+
+
+class TestPrefixStateCache:
+    def test_longest_prefix_match(self):
+        cache = PrefixStateCache()
+        cache[[1, 2, 3]] = make_state([1, 2, 3])
+        cache[[1, 4]] = make_state([1, 4])
+
+        # NOTE: The system prompt [1] is shared after the first message is evicted
+        assert cache[[1, 2, 9]].n_tokens == 3
+        assert cache[[1, 4, 5]].n_tokens == 2
+        with pytest.raises(KeyError):
+            cache[[7, 8]]
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    def test_drops_dominated_states(self):
+        cache = PrefixStateCache()
+        cache[[1, 2]] = make_state([1, 2])
+        cache[[1, 3]] = make_state([1, 3])
+        cache[[1, 2, 3, 4]] = make_state([1, 2, 3, 4])
+
+        assert list(cache.cache_state) == [(1, 3), (1, 2, 3, 4)]
+
+    def test_capacity_evicts_least_recently_used(self):
+        cache = PrefixStateCache(capacity_bytes=16)
+        cache[[1]] = make_state([1])
+        cache[[2]] = make_state([2])
+        cache[[1, 5]]  # NOTE: Refreshes the first state
+        cache[[3]] = make_state([3])
+
+        assert list(cache.cache_state) == [(1,), (3,)]
+        assert cache.cache_size == 16
+
+
+class TestPersistentPrefixStateCache:
+    def test_resume_from_disk(self, tmp_path):
+        cache = PersistentPrefixStateCache(str(tmp_path))
+        cache[[1, 2]] = make_state([1, 2])
+        assert cache.persist("session")
+        cache[[1, 2, 3]] = make_state([1, 2, 3])
+        assert cache.persist("session")
+
+        # NOTE: The older state of the session is a prefix of the newer one
+        assert len(list(tmp_path.glob("session_state_*.bin"))) == 1
+
+        resumed = PersistentPrefixStateCache(str(tmp_path))
+        state = resumed[[1, 2, 3, 4]]
+        assert state.n_tokens == 3
+        assert state.input_ids.tolist() == [1, 2, 3] + [0] * 13
+        assert bytes(state.llama_state) == bytes(8)
+        assert state.scores.tolist() == [[0, 0, 0], [0, 0, 0], [6, 7, 8]]
+        with pytest.raises(KeyError):
+            resumed[[9]]
+
+    def test_disk_capacity(self, tmp_path):
+        # NOTE: Each state file takes 384 bytes
+        cache = PersistentPrefixStateCache(str(tmp_path), disk_capacity_bytes=800)
+        for index, name in enumerate(("first", "second", "third")):
+            cache[[index]] = make_state([index], size=128)
+            assert cache.persist(name)
+
+        assert sorted(path.name.split("_")[0] for path in tmp_path.iterdir()) == [
+            "second",
+            "third",
+        ]
+
+    def test_restored_state_evaluates_more_tokens(self, tmp_path, monkeypatch):
+        n_ctx, n_vocab = 16, 3
+        path = tmp_path / "session_state_test.bin"
+        PersistentPrefixStateCache.write_state(path, make_state([1, 2, 3], n_ctx=n_ctx))
+        state = PersistentPrefixStateCache.read_state(path)
+
+        # NOTE: Only the llama.cpp context is replaced, it needs model weights
+        monkeypatch.setattr(
+            llama_cpp, "llama_set_state_data", lambda ctx, data: len(data)
+        )
+        context = SimpleNamespace(
+            ctx=object(),
+            kv_cache_seq_rm=lambda *args: None,
+            decode=lambda batch: None,
+            get_logits=lambda: np.ones(n_vocab, dtype=np.single),
+        )
+        model = SimpleNamespace(
+            _ctx=context,
+            _batch=SimpleNamespace(batch=object(), set_batch=lambda **kwargs: None),
+            _n_vocab=n_vocab,
+            n_batch=8,
+            context_params=SimpleNamespace(logits_all=False),
+            scores=np.zeros((n_ctx, n_vocab), dtype=np.single),
+            input_ids=np.zeros(n_ctx, dtype=np.intc),
+            n_tokens=0,
+        )
+        Llama.load_state(model, state)
+        Llama.eval(model, [4, 5])
+
+        assert model.n_tokens == 5
+        assert model.input_ids[:5].tolist() == [1, 2, 3, 4, 5]
+        assert model.scores[4].tolist() == [1, 1, 1]
+
+    def test_skips_files_without_context_size(self, tmp_path):
+        path = tmp_path / "session_state_test.bin"
+        PersistentPrefixStateCache.write_state(path, make_state([1, 2]))
+        data = path.read_bytes().replace(b'"n_ctx": 16, ', b" " * 13)
+        path.write_bytes(data)
+
+        with pytest.raises(ValueError):
+            PersistentPrefixStateCache.read_state(path)
+        with pytest.raises(KeyError):
+            PersistentPrefixStateCache(str(tmp_path))[[1, 2, 3]]
@@ -0,0 +1,51 @@
+"""
+tests/unit/model/test_render.py
+"""
+import io
+
+import pytest
+from rich.console import Console
+
+from pygptprompt.config.manager import ConfigurationManager
+from pygptprompt.model.render import StreamRenderer
+
+
+@pytest.fixture
+def console() -> Console:
+    return Console(file=io.StringIO(), force_terminal=False)
+
+
+class TestStreamRenderer:
+    def test_coalesces_chunks(
+        self, config: ConfigurationManager, console: Console, monkeypatch
+    ):
+        get_value = config.get_value
+        monkeypatch.setattr(
+            config,
+            "get_value",
+            lambda key, default=None: (
+                0.1
+                if key == "app.ui.stream.refresh_per_second"
+                else get_value(key, default)
+            ),
+        )
+
+        content = ""
+        with StreamRenderer(console, "llama_cpp", config) as renderer:
+            for token in ["Hello", ",", " world", "!"] * 25:
+                content += token
+                renderer.update(content)
+
+        # NOTE: The first chunk and the complete content are drawn
+        assert renderer.chunk_count == 100
+        assert renderer.render_count == 2
+        assert "world!" in console.file.getvalue()
+
+    def test_headless(self, config: ConfigurationManager, console: Console):
+        with StreamRenderer(console, "llama_cpp", config, headless=True) as renderer:
+            renderer.update("Hello, world!")
+
+        assert renderer.chunk_count == 1
+        assert renderer.render_count == 0
+        assert renderer.chunks_per_second > 0
+        assert console.file.getvalue() == ""
@@ -0,0 +1,154 @@
+"""
+tests/unit/storage/test_embedding_cache.py
+"""
+import threading
+from typing import List, Union
+
+import numpy as np
+
+from pygptprompt.model.base import ChatModelEmbedding
+from pygptprompt.storage.embedding_cache import EmbeddingCache, get_embedding_cache
+from pygptprompt.storage.function import VectorStoreEmbeddingFunction
+
+
+class CountingEmbeddingModel:
+    embedding_id = "counting"
+
+    def __init__(self):
+        self.inputs: List[List[str]] = []
+
+    def get_embedding(self, input: Union[str, List[str]]) -> ChatModelEmbedding:
+        self.inputs.append(list(input))
+        return np.array([[len(text), 1.0] for text in input], dtype=np.float32)
+
+
+class TestEmbeddingCache:
+    def test_persists_across_instances(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), "model")
+        cache.store(["a", "bb"], [[1.0, 2.0], [3.0, 4.0]])
+        assert cache.save()
+
+        resumed = EmbeddingCache(str(tmp_path), "model")
+        embeddings = resumed.lookup(["bb", "c", "a"])
+        assert [None if e is None else e.tolist() for e in embeddings] == [
+            [3.0, 4.0],
+            None,
+            [1.0, 2.0],
+        ]
+        assert (resumed.hits, resumed.misses) == (2, 1)
+        assert len(EmbeddingCache(str(tmp_path), "other model")) == 0
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), "model", max_entries=2)
+        cache.store(["a", "b"], [[1.0], [2.0]])
+        cache.lookup(["a"])
+        cache.store(["c"], [[3.0]])
+
+        assert "a" in cache and "c" in cache and "b" not in cache
+        assert cache.capacity == 2
+
+    def test_saved_rows_are_not_reused_before_save(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), "model", max_entries=2)
+        cache.store(["a", "b"], [[1.0], [2.0]])
+        assert cache.save()
+        cache.store(["c"], [[3.0]])
+
+        # NOTE: A crash before the next save keeps the saved index consistent.
+        crashed = EmbeddingCache(str(tmp_path), "model")
+        assert [e.tolist() for e in crashed.lookup(["a", "b"])] == [[1.0], [2.0]]
+
+        assert cache.save()
+        resumed = EmbeddingCache(str(tmp_path), "model")
+        assert "a" not in resumed
+        assert [e.tolist() for e in resumed.lookup(["b", "c"])] == [[2.0], [3.0]]
+
+    def test_saves_every_interval(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), "model", save_interval=3)
+        cache.store(["a", "b"], [[1.0], [2.0]])
+        assert len(EmbeddingCache(str(tmp_path), "model")) == 0
+        cache.store(["c"], [[3.0]])
+        assert len(EmbeddingCache(str(tmp_path), "model")) == 3
+
+    def test_concurrent_saves(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), "model", save_interval=1)
+
+        def store(offset: int):
+            for index in range(50):
+                cache.store([f"{offset}-{index}"], [[float(index)]])
+                cache.save()
+
+        threads = [threading.Thread(target=store, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        resumed = EmbeddingCache(str(tmp_path), "model")
+        assert len(resumed) == 200
+        assert resumed.lookup(["3-49"])[0].tolist() == [49.0]
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_instances_share_files_safely(self, tmp_path):
+        first = EmbeddingCache(str(tmp_path), "model")
+        second = EmbeddingCache(str(tmp_path), "model")
+        first.store(["gamma"], [[1.0]])
+        assert first.save()
+        second.store(["delta"], [[2.0]])
+
+        # NOTE: The second instance reloaded the index and never took gamma's row.
+        assert first.lookup(["gamma"])[0].tolist() == [1.0]
+        assert second.save()
+        embeddings = first.lookup(["gamma", "delta"])
+        assert [e.tolist() for e in embeddings] == [[1.0], [2.0]]
+
+    def test_reset_by_another_instance(self, tmp_path):
+        first = EmbeddingCache(str(tmp_path), "model")
+        second = EmbeddingCache(str(tmp_path), "model")
+        first.store(["gamma"], [[1.0]])
+        second.store(["delta"], [[2.0, 3.0]])
+
+        # NOTE: The unsaved embedding is dropped with the files it was written to.
+        assert first.lookup(["gamma", "delta"]) == [None, None]
+
+    def test_keys_with_trailing_null_bytes(self, tmp_path):
+        text = next(
+            text
+            for text in (f"text {index}" for index in range(10000))
+            if EmbeddingCache.make_key(text).endswith(b"\0")
+        )
+        cache = EmbeddingCache(str(tmp_path), "model")
+        cache.store([text], [[1.0]])
+        assert cache.save()
+
+        assert text in EmbeddingCache(str(tmp_path), "model")
+
+    def test_shared_per_directory_and_model(self, tmp_path):
+        cache = get_embedding_cache(str(tmp_path), "model")
+        assert get_embedding_cache(str(tmp_path / "."), "model") is cache
+        assert get_embedding_cache(str(tmp_path), "other model") is not cache
+
+
+class TestVectorStoreEmbeddingFunction:
+    def test_only_misses_are_embedded(self, tmp_path):
+        model = CountingEmbeddingModel()
+        cache = EmbeddingCache(str(tmp_path), model.embedding_id)
+        function = VectorStoreEmbeddingFunction(model, cache=cache)
+
+        assert function(["a", "bb", "a"]).tolist() == [
+            [1.0, 1.0],
+            [2.0, 1.0],
+            [1.0, 1.0],
+        ]
+        assert function(["ccc", "bb"]).tolist() == [[3.0, 1.0], [2.0, 1.0]]
+        assert model.inputs == [["a", "bb"], ["ccc"]]
+        # NOTE: The index is not saved on the query path.
+        assert not list(tmp_path.glob("*.npz"))
+
+    def test_half_precision(self):
+        function = VectorStoreEmbeddingFunction(
+            CountingEmbeddingModel(), dtype="float16"
+        )
+        embeddings = function("abc")
+
+        assert embeddings.dtype == np.float16
+        assert embeddings.tolist() == [[3.0, 1.0]]
@@ -0,0 +1,44 @@
+"""
+tests/unit/storage/test_queue.py
+"""
+from typing import List
+
+from pygptprompt.storage.queue import EmbeddingQueue
+
+
+class RecordingVectorStore:
+    def __init__(self):
+        self.batches: List[List[dict]] = []
+
+    def add_messages_to_collection(self, messages: List[dict]):
+        self.batches.append(messages)
+
+
+class TestEmbeddingQueue:
+    def test_flush_on_batch_size(self):
+        vector_store = RecordingVectorStore()
+        queue = EmbeddingQueue(vector_store, batch_size=2, flush_interval=60.0)
+        queue.put([{"role": "user", "content": f"{i}"} for i in range(5)])
+        queue.flush()
+
+        assert [len(batch) for batch in vector_store.batches] == [2, 2, 1]
+        assert len(queue) == 0
+        queue.close()
+
+    def test_flush_on_interval(self):
+        vector_store = RecordingVectorStore()
+        queue = EmbeddingQueue(vector_store, batch_size=32, flush_interval=0.01)
+        queue.put([{"role": "user", "content": "hello"}])
+        queue._worker.join(timeout=0.2)  # NOTE: The worker keeps running
+
+        assert vector_store.batches == [[{"role": "user", "content": "hello"}]]
+        queue.close()
+
+    def test_close_drains_buffer(self):
+        vector_store = RecordingVectorStore()
+        queue = EmbeddingQueue(vector_store, batch_size=32, flush_interval=60.0)
+        queue.put([{"role": "user", "content": "hello"}])
+        queue.close()
+
+        assert len(vector_store.batches) == 1
+        assert not queue._worker.is_alive()